@@ -12,16 +12,28 @@
 import os
 import sys
 import json
-import requests
+import time
+import argparse
+import hashlib
 import logging
+import multiprocessing
+
+# 模块导入计时起点
+_IMPORT_START = time.perf_counter()
+
+import requests
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-import pymysql
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from db_client import DatabaseClient
+from stat_aggregation import EntityCombinationAggregator, iter_feedback_frames
+from startup_timing import log_startup_report, record_step, timed_step
+
 # 加载环境变量
 load_dotenv()
 
@@ -45,6 +57,8 @@ SEEKDB_CONFIG = {
     'password': os.getenv('SEEKDB_PASSWORD', ''),
     'database': os.getenv('SEEKDB_DATABASE', 'feedback_db')
 }
+# 数据库连接池大小
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
 
 # Coze配置
 COZE_API_KEY = os.getenv('COZE_API_KEY', '')
@@ -53,76 +67,132 @@ COZE_INVOKE_URL = f"https://api.coze.com/v1/agent/invoke?agent_id={COZE_AGENT_ID
 
 # 系统配置
 ANALYSIS_DATE = os.getenv('ANALYSIS_DATE', (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d'))
-
-# ---------------------- 数据库客户端类 ----------------------
-class DatabaseClient:
-    def __init__(self, **config):
-        self.config = config
-        self.connection = None
-        self.connect()
-    
-    def connect(self):
-        """建立数据库连接"""
-        try:
-            self.connection = pymysql.connect(
-                host=self.config['host'],
-                port=self.config['port'],
-                user=self.config['user'],
-                password=self.config['password'],
-                database=self.config['database'],
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
-        except Exception as e:
-            raise Exception(f"数据库连接失败: {e}")
-    
-    def query_sql(self, sql, params=None):
-        """执行查询SQL并返回DataFrame"""
-        try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(sql, params)
-                result = cursor.fetchall()
-                return pd.DataFrame(result)
-        except Exception as e:
-            raise Exception(f"查询执行失败: {e}")
-    
-    def execute_sql(self, sql, params=None):
-        """执行SQL语句（更新、删除等）"""
-        try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(sql, params)
-                self.connection.commit()
-                return cursor.rowcount
-        except Exception as e:
-            self.connection.rollback()
-            raise Exception(f"SQL执行失败: {e}")
-    
-    def insert(self, table, data):
-        """插入数据到指定表"""
-        if not data:
-            return 0
-        
-        columns = ', '.join(data.keys())
-        placeholders = ', '.join(['%s'] * len(data))
-        values = list(data.values())
-        
-        sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-        return self.execute_sql(sql, values)
+# 统计查询流式读取时每块行数
+STAT_STREAM_CHUNK_SIZE = int(os.getenv('STAT_STREAM_CHUNK_SIZE', 10000))
+# 统计结果写入时每条多行INSERT包含的行数
+STAT_INSERT_CHUNK_SIZE = int(os.getenv('STAT_INSERT_CHUNK_SIZE', 1000))
+# 增量统计：只重算新增打标关系涉及的反馈，按组合差值维护每天的计数
+STAT_INCREMENTAL_ENABLED = os.getenv('STAT_INCREMENTAL_ENABLED', 'false').lower() == 'true'
+# 增量刷新的水位滞后秒数，避免遗漏尚未提交的打标写入事务
+STAT_WATERMARK_LAG_SECONDS = int(os.getenv('STAT_WATERMARK_LAG_SECONDS', 60))
+STAT_WATERMARK_NAME = 'feedback_stat_combination'
+# 多日回填模式的并行进程数
+STAT_BACKFILL_WORKERS = int(os.getenv('STAT_BACKFILL_WORKERS', 4))
+# 多日回填模式的断点文件，记录已完成的日期，中断后重新运行同一区间时跳过
+STAT_BACKFILL_CHECKPOINT_PATH = os.getenv('STAT_BACKFILL_CHECKPOINT_PATH', 'cache/stat_backfill_checkpoint.json')
 
 # ---------------------- 数据库客户端初始化 ----------------------
-try:
-    db_client = DatabaseClient(**SEEKDB_CONFIG)
-    logger.info("数据库客户端初始化成功")
-except Exception as e:
-    logger.error(f"数据库客户端初始化失败: {e}")
-    sys.exit(1)
+# 首次使用时才建立连接，只导入统计函数的脚本不付出连接代价
+db_client = None
+
+
+def get_db_client():
+    """
+    获取共享数据库客户端，首次调用时建立连接池
+    
+    Returns:
+        DatabaseClient: 数据库客户端
+    """
+    global db_client
+    if db_client is None:
+        with timed_step("数据库连接"):
+            db_client = DatabaseClient(pool_size=DB_POOL_SIZE, **SEEKDB_CONFIG)
+        logger.info("数据库客户端初始化成功")
+    return db_client
+
 
 # ---------------------- 核心函数 ----------------------
 
+# 按反馈聚合实体组合的统计SQL（增量刷新使用），{condition} 为反馈范围条件
+FEEDBACK_COMBINATION_SQL = """
+SELECT 
+    f.feedback_id,
+    MIN(c.create_time) AS feedback_time,
+    JSON_ARRAYAGG(
+        JSON_OBJECT(
+            'entity_type', t.type_name,
+            'entity_value', e.entity_value
+        )
+    ) AS entity_combinations
+FROM 
+    feedback_entity_relation f
+JOIN 
+    entity_vector_lib e ON f.entity_id = e.entity_id
+JOIN 
+    dynamic_entity_type t ON e.type_id = t.type_id
+JOIN 
+    customer_feedback c ON f.feedback_id = c.feedback_id
+WHERE 
+    {condition}
+GROUP BY 
+    f.feedback_id
+"""
+
+
+def day_range(stat_date):
+    """
+    统计日期对应的半开时间区间 [当天0点, 次日0点)，用于可走索引的范围条件
+    
+    Args:
+        stat_date (str): 统计日期，YYYY-MM-DD
+        
+    Returns:
+        tuple: (起始时间, 结束时间) 字符串
+    """
+    day_start = datetime.strptime(stat_date, '%Y-%m-%d')
+    day_end = day_start + timedelta(days=1)
+    return day_start.strftime('%Y-%m-%d %H:%M:%S'), day_end.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def parse_entity_map(entity_combinations):
+    """
+    将JSON_ARRAYAGG返回的实体组合解析为 实体类型 -> 实体值 映射
+    
+    Args:
+        entity_combinations (str): 实体组合JSON
+        
+    Returns:
+        dict: 实体类型到值的映射
+    """
+    entity_map = {}
+    for entity in json.loads(entity_combinations):
+        entity_type = entity.get('entity_type')
+        entity_value = entity.get('entity_value')
+        if entity_type and entity_value:
+            entity_map[entity_type] = entity_value
+    return entity_map
+
+
+def build_statistics_df(combinations, total_feedbacks):
+    """
+    由实体组合计数生成统计结果
+    
+    Args:
+        combinations (list): (实体列表, 反馈数) 列表，实体列表元素为 {'entity_type', 'entity_value'}
+        total_feedbacks (int): 当天已打标反馈总数
+        
+    Returns:
+        DataFrame: 统计结果（entities, feedback_count, ratio），按反馈数降序
+    """
+    final_statistics = []
+    for entities, count in combinations:
+        final_statistics.append({
+            'entities': entities,
+            'feedback_count': int(count),
+            'ratio': round(count / total_feedbacks, 4)
+        })
+    
+    # 转换为DataFrame并排序
+    result_df = pd.DataFrame(final_statistics)
+    result_df = result_df.sort_values('feedback_count', ascending=False)
+    return result_df
+
+
 def generate_statistics(stat_date):
     """
     生成统计结果
     对应架构图中的“统计结果生成”
+    STAT_INCREMENTAL_ENABLED=true 时读取增量维护的组合计数，否则全量重算当天数据
     
     Args:
         stat_date (str): 统计日期
@@ -130,109 +200,258 @@ def generate_statistics(stat_date):
     Returns:
         DataFrame: 统计结果
     """
+    if STAT_INCREMENTAL_ENABLED:
+        return generate_statistics_incremental(stat_date)
+    return generate_statistics_full(stat_date)
+
+
+def generate_statistics_full(stat_date):
+    """
+    全量重算指定日期的统计结果
+    
+    Args:
+        stat_date (str): 统计日期
+        
+    Returns:
+        DataFrame: 统计结果，失败时返回空DataFrame
+    """
     try:
-        # 统计SQL：按反馈聚合，获取每个反馈的实体组合
-        stat_sql = f"""
-        SELECT 
-            f.feedback_id,
-            MAX(c.feedback_text) AS feedback_text,
-            JSON_ARRAYAGG(
-                JSON_OBJECT(
-                    'entity_type', t.type_name,
-                    'entity_value', e.entity_value
-                )
-            ) AS entity_combinations
-        FROM 
-            feedback_entity_relation f
-        JOIN 
-            entity_vector_lib e ON f.entity_id = e.entity_id
-        JOIN 
-            dynamic_entity_type t ON e.type_id = t.type_id
-        JOIN 
-            customer_feedback c ON f.feedback_id = c.feedback_id
-        WHERE 
-            DATE(c.create_time) = '{stat_date}'
-        GROUP BY 
-            f.feedback_id
-        """
+        return compute_statistics_full(stat_date)
+    except Exception as e:
+        logger.error(f"生成统计结果失败: {e}")
+        return pd.DataFrame()
+
+
+def compute_statistics_full(stat_date):
+    """
+    全量重算指定日期的统计结果（出错时抛出异常，供回填模式区分“无数据”与“失败”）
+    关系按 (反馈, 实体类型, 实体值) 展开流式读取，由EntityCombinationAggregator列式聚合
+    
+    Args:
+        stat_date (str): 统计日期
         
-        stat_result = db_client.query_sql(stat_sql)
+    Returns:
+        DataFrame: 统计结果，无数据时返回空DataFrame
+    """
+    # 半开区间范围条件，可使用create_time索引（DATE(create_time)会使索引失效）；
+    # 按反馈排序，保证同一反馈的行在流式读取时连续
+    stat_sql = """
+    SELECT 
+        f.feedback_id,
+        t.type_name AS entity_type,
+        e.entity_value
+    FROM 
+        feedback_entity_relation f
+    JOIN 
+        entity_vector_lib e ON f.entity_id = e.entity_id
+    JOIN 
+        dynamic_entity_type t ON e.type_id = t.type_id
+    JOIN 
+        customer_feedback c ON f.feedback_id = c.feedback_id
+    WHERE 
+        c.create_time >= %s AND c.create_time < %s
+    ORDER BY 
+        f.feedback_id
+    """
+    
+    # 流式遍历结果（服务端游标），只在内存中保留编码词表与组合计数
+    aggregator = EntityCombinationAggregator()
+    row_chunks = get_db_client().stream_rows(stat_sql, params=list(day_range(stat_date)),
+                                             chunk_size=STAT_STREAM_CHUNK_SIZE)
+    for frame in iter_feedback_frames(row_chunks):
+        aggregator.add(frame)
+    
+    if aggregator.total_feedbacks == 0:
+        logger.info(f"日期 {stat_date} 无反馈数据")
+        return pd.DataFrame()
+    
+    combinations = aggregator.combinations()
+    if not combinations:
+        logger.info(f"日期 {stat_date} 无有效实体组合数据")
+        return pd.DataFrame()
+    
+    # 生成最终统计结果
+    result_df = build_statistics_df(combinations, aggregator.total_feedbacks)
+    
+    logger.info(f"成功生成 {len(result_df)} 条统计结果")
+    return result_df
+
+
+# ---------------------- 增量统计 ----------------------
+# feedback_stat_feedback_state 记录每条反馈当前计入的 (统计日期, 组合键)，
+# feedback_stat_combination_state 记录每天每个实体组合的反馈数；
+# 每次刷新只重算水位之后新增了打标关系的反馈，并按新旧组合的差值增减计数
+
+def combination_hash(entity_map):
+    """
+    实体组合的稳定键（与全量统计相同的组合判定，取SHA1以便作为主键）
+    
+    Args:
+        entity_map (dict): 实体类型到值的映射
         
-        if stat_result.empty:
-            logger.info(f"日期 {stat_date} 无反馈数据")
-            return pd.DataFrame()
+    Returns:
+        str: 40位十六进制组合键
+    """
+    return hashlib.sha1(str(sorted(entity_map.items())).encode('utf-8')).hexdigest()
+
+
+def apply_statistics_changes(rows):
+    """
+    在一个事务内把一块变更反馈的最新实体组合合并进增量状态表
+    与已记录的组合相同的反馈不产生变更，同一区间重复刷新结果不变
+    
+    Args:
+        rows (list): FEEDBACK_COMBINATION_SQL返回的行
         
-        # 处理实体组合，生成按实体类型聚合的统计
-        entity_statistics = []
-        total_feedbacks = len(stat_result)
+    Returns:
+        int: 组合发生变化的反馈数
+    """
+    feedback_ids = [row['feedback_id'] for row in rows]
+    placeholders = ', '.join(['%s'] * len(feedback_ids))
+    
+    with get_db_client().transaction() as cursor:
+        cursor.execute(
+            f"SELECT feedback_id, stat_date, combination_key FROM feedback_stat_feedback_state "
+            f"WHERE feedback_id IN ({placeholders}) FOR UPDATE",
+            feedback_ids
+        )
+        previous = {state['feedback_id']: state for state in cursor.fetchall()}
         
-        for _, row in stat_result.iterrows():
+        # (统计日期, 组合键) -> [计数增量, 实体列表JSON]
+        deltas = {}
+        state_rows = []
+        for row in rows:
+            stat_date = row['feedback_time'].strftime('%Y-%m-%d')
             try:
-                # 解析实体组合JSON
-                entity_combinations = json.loads(row['entity_combinations'])
-                
-                # 创建实体类型到值的映射
-                entity_map = {}
-                for entity in entity_combinations:
-                    entity_type = entity.get('entity_type')
-                    entity_value = entity.get('entity_value')
-                    if entity_type and entity_value:
-                        entity_map[entity_type] = entity_value
-                
-                # 添加到统计列表
-                if entity_map:
-                    entity_statistics.append({
-                        'feedback_id': row['feedback_id'],
-                        'feedback_text': row['feedback_text'],
-                        'entity_map': entity_map
-                    })
+                entity_map = parse_entity_map(row['entity_combinations'])
             except Exception as e:
                 logger.warning(f"解析反馈 {row['feedback_id']} 的实体组合失败: {e}")
+                entity_map = {}
+            combination_key = combination_hash(entity_map) if entity_map else None
+            
+            old_state = previous.get(row['feedback_id'])
+            if (old_state is not None and str(old_state['stat_date']) == stat_date
+                    and old_state['combination_key'] == combination_key):
                 continue
+            
+            if old_state is not None and old_state['combination_key']:
+                old_key = (str(old_state['stat_date']), old_state['combination_key'])
+                deltas.setdefault(old_key, [0, '[]'])[0] -= 1
+            if combination_key:
+                entities = [
+                    {'entity_type': entity_type, 'entity_value': entity_value}
+                    for entity_type, entity_value in entity_map.items()
+                ]
+                delta = deltas.setdefault((stat_date, combination_key), [0, '[]'])
+                delta[0] += 1
+                delta[1] = json.dumps(entities, ensure_ascii=False)
+            state_rows.append((row['feedback_id'], stat_date, combination_key))
         
-        if not entity_statistics:
-            logger.info(f"日期 {stat_date} 无有效实体组合数据")
+        if state_rows:
+            cursor.executemany(
+                "INSERT INTO feedback_stat_feedback_state (feedback_id, stat_date, combination_key) "
+                "VALUES (%s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE stat_date = VALUES(stat_date), combination_key = VALUES(combination_key)",
+                state_rows
+            )
+        combination_rows = [
+            (stat_date, combination_key, entities, delta)
+            for (stat_date, combination_key), (delta, entities) in deltas.items() if delta
+        ]
+        if combination_rows:
+            cursor.executemany(
+                "INSERT INTO feedback_stat_combination_state (stat_date, combination_key, entities, feedback_count) "
+                "VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE feedback_count = feedback_count + VALUES(feedback_count)",
+                combination_rows
+            )
+    
+    return len(state_rows)
+
+
+def refresh_statistics_state():
+    """
+    增量刷新统计状态：处理打标关系创建时间在 [水位, 当前时间 - 延迟) 内的反馈，完成后推进水位
+    延迟窗口避免遗漏尚未提交的写入事务；首次运行（无水位）时从头构建全部状态
+    
+    Returns:
+        int: 组合发生变化的反馈数
+    """
+    client = get_db_client()
+    
+    watermark_df = client.query_sql(
+        "SELECT watermark_time FROM feedback_stat_watermark WHERE watermark_name = %s",
+        [STAT_WATERMARK_NAME]
+    )
+    lower = (pd.Timestamp(watermark_df.iloc[0]['watermark_time']).strftime('%Y-%m-%d %H:%M:%S')
+             if not watermark_df.empty else '1970-01-01 00:00:00')
+    upper_df = client.query_sql("SELECT NOW() - INTERVAL %s SECOND AS upper_time", [STAT_WATERMARK_LAG_SECONDS])
+    upper = pd.Timestamp(upper_df.iloc[0]['upper_time']).strftime('%Y-%m-%d %H:%M:%S')
+    if lower >= upper:
+        return 0
+    
+    changed_sql = FEEDBACK_COMBINATION_SQL.format(
+        condition="f.feedback_id IN (SELECT r.feedback_id FROM feedback_entity_relation r "
+                  "WHERE r.create_time >= %s AND r.create_time < %s)"
+    )
+    
+    start = time.perf_counter()
+    scanned = 0
+    changed = 0
+    for rows in client.stream_rows(changed_sql, params=[lower, upper], chunk_size=STAT_STREAM_CHUNK_SIZE):
+        scanned += len(rows)
+        changed += apply_statistics_changes(rows)
+    
+    client.execute_sql(
+        "INSERT INTO feedback_stat_watermark (watermark_name, watermark_time) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE watermark_time = VALUES(watermark_time), update_time = NOW()",
+        [STAT_WATERMARK_NAME, upper],
+        idempotent=True
+    )
+    logger.info(f"统计状态增量刷新 [{lower}, {upper}): 扫描 {scanned} 条反馈, 组合变化 {changed} 条, "
+                f"耗时 {time.perf_counter() - start:.2f}s")
+    return changed
+
+
+def generate_statistics_incremental(stat_date):
+    """
+    先增量刷新统计状态，再读取指定日期的组合计数生成统计结果（与全量重算格式一致）
+    
+    Args:
+        stat_date (str): 统计日期
+        
+    Returns:
+        DataFrame: 统计结果
+    """
+    try:
+        refresh_statistics_state()
+        
+        client = get_db_client()
+        total_df = client.query_sql(
+            "SELECT COUNT(*) AS total FROM feedback_stat_feedback_state WHERE stat_date = %s",
+            [stat_date]
+        )
+        total_feedbacks = int(total_df.iloc[0]['total']) if not total_df.empty else 0
+        if total_feedbacks == 0:
+            logger.info(f"日期 {stat_date} 无反馈数据")
             return pd.DataFrame()
         
-        # 按实体类型和值的组合进行统计
-        combination_counts = {}
-        for item in entity_statistics:
-            entity_map = item['entity_map']
-            # 将实体映射转换为可哈希的格式
-            combination_key = str(sorted(entity_map.items()))
-            if combination_key not in combination_counts:
-                combination_counts[combination_key] = {
-                    'count': 0,
-                    'entity_map': entity_map
-                }
-            combination_counts[combination_key]['count'] += 1
-        
-        # 生成最终统计结果
-        final_statistics = []
-        for combo_info in combination_counts.values():
-            # 创建符合要求格式的统计项
-            stat_item = {
-                'entities': []
-            }
-            
-            # 添加所有实体类型和值
-            for entity_type, entity_value in combo_info['entity_map'].items():
-                stat_item['entities'].append({
-                    'entity_type': entity_type,
-                    'entity_value': entity_value
-                })
-            
-            # 添加统计信息
-            stat_item['feedback_count'] = combo_info['count']
-            stat_item['ratio'] = round(combo_info['count'] / total_feedbacks, 4)
-            
-            final_statistics.append(stat_item)
+        combination_df = client.query_sql(
+            "SELECT entities, feedback_count FROM feedback_stat_combination_state "
+            "WHERE stat_date = %s AND feedback_count > 0",
+            [stat_date]
+        )
+        if combination_df.empty:
+            logger.info(f"日期 {stat_date} 无有效实体组合数据")
+            return pd.DataFrame()
         
-        # 转换为DataFrame并排序
-        result_df = pd.DataFrame(final_statistics)
-        result_df = result_df.sort_values('feedback_count', ascending=False)
+        combinations = [
+            (json.loads(row['entities']), row['feedback_count'])
+            for row in combination_df.to_dict('records')
+        ]
+        result_df = build_statistics_df(combinations, total_feedbacks)
         
-        logger.info(f"成功生成 {len(result_df)} 条统计结果")
+        logger.info(f"成功生成 {len(result_df)} 条统计结果（增量）")
         return result_df
         
     except Exception as e:
@@ -244,34 +463,44 @@ def store_statistics(stat_df, stat_date):
     """
     存储统计结果
     对应架构图中的“统计结果”存储
+    在一个事务内删除当天旧结果并以多行INSERT批量写入新结果，提交前读取方始终看到完整的旧数据；
+    统计结果为空时只删除当天旧结果
     
     Args:
         stat_df (DataFrame): 统计结果
         stat_date (str): 统计日期
+        
+    Returns:
+        int: 写入的行数（可能为0），失败时返回None
     """
     try:
-        # 先删除当天已有的统计结果
-        delete_sql = f"DELETE FROM feedback_stat WHERE stat_date = '{stat_date}'"
-        db_client.execute_sql(delete_sql)
-        
-        # 批量插入新的统计结果
-        inserted_count = 0
-        for _, row in stat_df.iterrows():
-            # 遍历每个实体组合中的实体
-            for entity in row['entities']:
-                db_client.insert("feedback_stat", {
-                    "stat_date": stat_date,
-                    "entity_type": entity['entity_type'],
-                    "entity_value": entity['entity_value'],
-                    "feedback_count": row['feedback_count'],
-                    "ratio": row['ratio']
-                })
-                inserted_count += 1
-        
-        logger.info(f"成功存储 {inserted_count} 条统计结果")
+        # 每个实体组合中的每个实体写入一行
+        stat_rows = [
+            (stat_date, entity['entity_type'], entity['entity_value'], int(record['feedback_count']), float(record['ratio']))
+            for record in stat_df.to_dict('records')
+            for entity in record['entities']
+        ] if not stat_df.empty else []
+        
+        insert_sql = """
+        INSERT INTO feedback_stat (stat_date, entity_type, entity_value, feedback_count, ratio)
+        VALUES (%s, %s, %s, %s, %s)
+        """
+        
+        start = time.perf_counter()
+        with get_db_client().transaction() as cursor:
+            cursor.execute("DELETE FROM feedback_stat WHERE stat_date = %s", [stat_date])
+            # executemany将VALUES合并为多行INSERT，按块执行避免单条语句过大
+            for offset in range(0, len(stat_rows), STAT_INSERT_CHUNK_SIZE):
+                cursor.executemany(insert_sql, stat_rows[offset:offset + STAT_INSERT_CHUNK_SIZE])
+        elapsed = time.perf_counter() - start
+        
+        logger.info(f"成功存储 {len(stat_rows)} 条统计结果, 耗时 {elapsed:.3f}s "
+                    f"({len(stat_rows) / max(elapsed, 1e-9):.0f} 行/秒)")
+        return len(stat_rows)
         
     except Exception as e:
         logger.error(f"存储统计结果失败: {e}")
+        return None
 
 
 def invoke_coze_analysis(stat_data, stat_date):
@@ -332,10 +561,10 @@ def store_analysis_result(analysis_text, stat_date):
     try:
         # 先删除当天已有的分析结果
         delete_sql = f"DELETE FROM ai_analysis_result WHERE stat_date = '{stat_date}'"
-        db_client.execute_sql(delete_sql)
+        get_db_client().execute_sql(delete_sql)
         
         # 插入新的分析结果
-        db_client.insert("ai_analysis_result", {
+        get_db_client().insert("ai_analysis_result", {
             "stat_date": stat_date,
             "analysis_text": analysis_text
         })
@@ -366,6 +595,21 @@ def generate_daily_summary(stat_date):
     # 2. 存储统计结果
     store_statistics(stat_df, stat_date)
     
+    # 3~5. 智能分析并存储
+    summarize_statistics(stat_df, stat_date)
+
+
+def summarize_statistics(stat_df, stat_date):
+    """
+    调用Coze对统计结果做智能分析并存储总结
+    
+    Args:
+        stat_df (DataFrame): 统计结果
+        stat_date (str): 统计日期
+        
+    Returns:
+        bool: 是否生成并存储了分析总结
+    """
     # 3. 转换统计数据为字典格式
     stat_data = []
     for _, row in stat_df.iterrows():
@@ -383,13 +627,15 @@ def generate_daily_summary(stat_date):
         # 5. 存储分析总结结果
         store_analysis_result(analysis_text, stat_date)
         logger.info(f"{stat_date} 分析总结完成")
-    else:
-        logger.warning(f"{stat_date} 分析总结生成失败")
+        return True
+    logger.warning(f"{stat_date} 分析总结生成失败")
+    return False
 
 
 def generate_system_metrics(stat_date):
     """
     生成系统运行指标
+    一条查询完成：按时间索引扫描一次当天反馈，打标与Coze调用按反馈ID走索引关联计数
     
     Args:
         stat_date (str): 统计日期
@@ -398,39 +644,31 @@ def generate_system_metrics(stat_date):
         dict: 系统指标
     """
     try:
-        # 1. 总反馈量
-        total_feedback_sql = f"""
-        SELECT COUNT(*) AS total_count 
-        FROM customer_feedback 
-        WHERE DATE(create_time) = '{stat_date}'
-        """
-        total_feedback = db_client.query_sql(total_feedback_sql).iloc[0]['total_count']
-        
-        # 2. 已打标反馈量
-        tagged_feedback_sql = f"""
-        SELECT COUNT(DISTINCT f.feedback_id) AS tagged_count
-        FROM feedback_entity_relation f
-        JOIN customer_feedback c ON f.feedback_id = c.feedback_id
-        WHERE DATE(c.create_time) = '{stat_date}'
-        """
-        tagged_feedback = db_client.query_sql(tagged_feedback_sql).iloc[0]['tagged_count']
-        
-        # 3. Coze调用量
-        coze_call_sql = f"""
-        SELECT COUNT(*) AS coze_call_count
-        FROM entity_precipitation_log l
-        JOIN customer_feedback c ON l.feedback_id = c.feedback_id
-        WHERE DATE(c.create_time) = '{stat_date}'
+        day_start, day_end = day_range(stat_date)
+        metrics_sql = """
+        SELECT 
+            COUNT(*) AS total_count,
+            COALESCE(SUM(EXISTS (
+                SELECT 1 FROM feedback_entity_relation f WHERE f.feedback_id = c.feedback_id
+            )), 0) AS tagged_count,
+            COALESCE(SUM((
+                SELECT COUNT(*) FROM entity_precipitation_log l WHERE l.feedback_id = c.feedback_id
+            )), 0) AS coze_call_count,
+            (
+                SELECT COUNT(*) FROM entity_vector_lib e
+                WHERE e.create_time >= %s AND e.create_time < %s
+            ) AS new_entity_count
+        FROM 
+            customer_feedback c
+        WHERE 
+            c.create_time >= %s AND c.create_time < %s
         """
-        coze_call = db_client.query_sql(coze_call_sql).iloc[0]['coze_call_count']
+        row = get_db_client().query_sql(metrics_sql, [day_start, day_end, day_start, day_end]).iloc[0]
         
-        # 4. 新实体沉淀量
-        new_entity_sql = f"""
-        SELECT COUNT(*) AS new_entity_count
-        FROM entity_vector_lib
-        WHERE DATE(create_time) = '{stat_date}'
-        """
-        new_entity = db_client.query_sql(new_entity_sql).iloc[0]['new_entity_count']
+        total_feedback = int(row['total_count'])
+        tagged_feedback = int(row['tagged_count'])
+        coze_call = int(row['coze_call_count'])
+        new_entity = int(row['new_entity_count'])
         
         metrics = {
             "stat_date": stat_date,
@@ -450,23 +688,422 @@ def generate_system_metrics(stat_date):
         return {}
 
 
+def store_system_metrics(metrics):
+    """
+    存储系统运行指标到 daily_system_metrics（按日期覆盖写入）
+    
+    Args:
+        metrics (dict): generate_system_metrics 的结果
+        
+    Returns:
+        bool: 是否存储成功
+    """
+    try:
+        upsert_sql = """
+        INSERT INTO daily_system_metrics 
+            (stat_date, total_feedback, tagged_feedback, tag_rate, coze_call_count, coze_call_rate, new_entity_count)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE 
+            total_feedback = VALUES(total_feedback),
+            tagged_feedback = VALUES(tagged_feedback),
+            tag_rate = VALUES(tag_rate),
+            coze_call_count = VALUES(coze_call_count),
+            coze_call_rate = VALUES(coze_call_rate),
+            new_entity_count = VALUES(new_entity_count),
+            update_time = NOW()
+        """
+        get_db_client().execute_sql(upsert_sql, [
+            metrics['stat_date'],
+            metrics['total_feedback'],
+            metrics['tagged_feedback'],
+            metrics['tag_rate'],
+            metrics['coze_call_count'],
+            metrics['coze_call_rate'],
+            metrics['new_entity_count']
+        ], idempotent=True)
+        logger.info(f"系统指标已存储: {metrics['stat_date']}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"存储系统指标失败: {e}")
+        return False
+
+
+def load_system_metrics(start_date, end_date):
+    """
+    读取已存储的每日系统指标（供看板与趋势查询使用，不扫描原始表）
+    
+    Args:
+        start_date (str): 起始日期，YYYY-MM-DD
+        end_date (str): 结束日期，YYYY-MM-DD（含）
+        
+    Returns:
+        DataFrame: 按日期升序的每日系统指标
+    """
+    query_sql = """
+    SELECT stat_date, total_feedback, tagged_feedback, tag_rate, coze_call_count, coze_call_rate, new_entity_count
+    FROM daily_system_metrics
+    WHERE stat_date >= %s AND stat_date <= %s
+    ORDER BY stat_date
+    """
+    return get_db_client().query_sql(query_sql, [start_date, end_date])
+
+
+# ---------------------- 实体趋势汇总立方 ----------------------
+# entity_stat_rollup 按 粒度(hour/day) × 时间桶 × 实体类型 × 实体值 预聚合反馈数（按反馈创建时间归桶），
+# 周、月由天粒度行上卷得到；趋势与TopN查询只读该表，不再关联打标关系原始表
+
+# 支持的查询粒度及其时间桶表达式（基于天粒度行上卷的周、月）
+ROLLUP_GRAIN_BUCKETS = {
+    'hour': ('hour', "bucket_start"),
+    'day': ('day', "bucket_start"),
+    'week': ('day', "DATE_SUB(DATE(bucket_start), INTERVAL WEEKDAY(bucket_start) DAY)"),
+    'month': ('day', "DATE_FORMAT(bucket_start, '%%Y-%%m-01')"),
+}
+
+
+def refresh_entity_rollup(stat_date):
+    """
+    重算指定日期的小时与天粒度汇总行，在一个事务内替换当天旧数据
+    
+    Args:
+        stat_date (str): 统计日期
+        
+    Returns:
+        int: 写入的行数（可能为0），失败时返回None
+    """
+    try:
+        day_start, day_end = day_range(stat_date)
+        hourly_sql = """
+        SELECT 
+            DATE_FORMAT(c.create_time, '%%Y-%%m-%%d %%H:00:00') AS bucket_start,
+            t.type_name AS entity_type,
+            e.entity_value,
+            COUNT(DISTINCT f.feedback_id) AS feedback_count
+        FROM 
+            feedback_entity_relation f
+        JOIN 
+            entity_vector_lib e ON f.entity_id = e.entity_id
+        JOIN 
+            dynamic_entity_type t ON e.type_id = t.type_id
+        JOIN 
+            customer_feedback c ON f.feedback_id = c.feedback_id
+        WHERE 
+            c.create_time >= %s AND c.create_time < %s
+        GROUP BY 
+            DATE_FORMAT(c.create_time, '%%Y-%%m-%%d %%H:00:00'), t.type_name, e.entity_value
+        """
+        hourly_df = get_db_client().query_sql(hourly_sql, [day_start, day_end])
+        
+        rollup_rows = []
+        if not hourly_df.empty:
+            hourly_df['feedback_count'] = hourly_df['feedback_count'].astype(int)
+            rollup_rows = [
+                ('hour', row.bucket_start, row.entity_type, row.entity_value, row.feedback_count)
+                for row in hourly_df.itertuples(index=False)
+            ]
+            # 每条反馈只有一个创建时间，天粒度计数等于各小时计数之和
+            daily_df = hourly_df.groupby(['entity_type', 'entity_value'], as_index=False)['feedback_count'].sum()
+            rollup_rows += [
+                ('day', day_start, row.entity_type, row.entity_value, int(row.feedback_count))
+                for row in daily_df.itertuples(index=False)
+            ]
+        
+        insert_sql = """
+        INSERT INTO entity_stat_rollup (grain, bucket_start, entity_type, entity_value, feedback_count)
+        VALUES (%s, %s, %s, %s, %s)
+        """
+        with get_db_client().transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM entity_stat_rollup WHERE bucket_start >= %s AND bucket_start < %s",
+                [day_start, day_end]
+            )
+            for offset in range(0, len(rollup_rows), STAT_INSERT_CHUNK_SIZE):
+                cursor.executemany(insert_sql, rollup_rows[offset:offset + STAT_INSERT_CHUNK_SIZE])
+        
+        logger.info(f"实体趋势汇总已更新: {stat_date}, {len(rollup_rows)} 行")
+        return len(rollup_rows)
+        
+    except Exception as e:
+        logger.error(f"更新实体趋势汇总失败: {e}")
+        return None
+
+
+def top_entity_values(entity_type, days=30, top_n=10, end_date=None):
+    """
+    查询某实体类型在最近若干天内反馈数最多的实体值
+    
+    Args:
+        entity_type (str): 实体类型，如“问题现象”
+        days (int): 天数（含结束日期）
+        top_n (int): 返回条数
+        end_date (str): 结束日期，YYYY-MM-DD，默认为今天
+        
+    Returns:
+        DataFrame: entity_value, feedback_count，按反馈数降序
+    """
+    end = datetime.strptime(end_date, '%Y-%m-%d') if end_date else datetime.now()
+    start_date = (end - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    query_sql = """
+    SELECT entity_value, SUM(feedback_count) AS feedback_count
+    FROM entity_stat_rollup
+    WHERE grain = 'day' AND entity_type = %s AND bucket_start >= %s AND bucket_start < %s
+    GROUP BY entity_value
+    ORDER BY feedback_count DESC
+    LIMIT %s
+    """
+    end_exclusive = (end + timedelta(days=1)).strftime('%Y-%m-%d')
+    return get_db_client().query_sql(query_sql, [entity_type, start_date, end_exclusive, int(top_n)])
+
+
+def entity_trend(entity_type, start_date, end_date, grain='day', entity_value=None):
+    """
+    查询实体类型（或某个实体值）在时间区间内按粒度汇总的反馈数趋势
+    
+    Args:
+        entity_type (str): 实体类型
+        start_date (str): 起始日期，YYYY-MM-DD
+        end_date (str): 结束日期，YYYY-MM-DD（含）
+        grain (str): 粒度，hour / day / week / month
+        entity_value (str): 实体值，为None时返回该类型下所有实体值
+        
+    Returns:
+        DataFrame: bucket_start, entity_value, feedback_count，按时间升序
+    """
+    if grain not in ROLLUP_GRAIN_BUCKETS:
+        raise ValueError(f"不支持的粒度: {grain}，可选: {', '.join(ROLLUP_GRAIN_BUCKETS)}")
+    source_grain, bucket_expression = ROLLUP_GRAIN_BUCKETS[grain]
+    
+    end_exclusive = (datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    params = [source_grain, entity_type, start_date, end_exclusive]
+    value_condition = ""
+    if entity_value is not None:
+        value_condition = "AND entity_value = %s"
+        params.append(entity_value)
+    
+    query_sql = f"""
+    SELECT {bucket_expression} AS bucket_start, entity_value, SUM(feedback_count) AS feedback_count
+    FROM entity_stat_rollup
+    WHERE grain = %s AND entity_type = %s AND bucket_start >= %s AND bucket_start < %s {value_condition}
+    GROUP BY {bucket_expression}, entity_value
+    ORDER BY bucket_start, feedback_count DESC
+    """
+    return get_db_client().query_sql(query_sql, params)
+
+
+# ---------------------- 多日回填 ----------------------
+
+def iter_dates(start_date, end_date):
+    """
+    按天遍历闭区间内的日期
+    
+    Args:
+        start_date (str): 起始日期，YYYY-MM-DD
+        end_date (str): 结束日期，YYYY-MM-DD
+        
+    Returns:
+        list: 日期字符串列表
+    """
+    current = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    dates = []
+    while current <= end:
+        dates.append(current.strftime('%Y-%m-%d'))
+        current += timedelta(days=1)
+    return dates
+
+
+def load_backfill_checkpoint(start_date, end_date, path=STAT_BACKFILL_CHECKPOINT_PATH):
+    """
+    读取回填断点中已完成的日期；断点属于其他日期区间时视为无断点
+    
+    Args:
+        start_date (str): 起始日期
+        end_date (str): 结束日期
+        path (str): 断点文件路径
+        
+    Returns:
+        set: 已完成的日期
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return set()
+    except (OSError, ValueError) as e:
+        logger.warning(f"回填断点文件读取失败，从头开始: {e}")
+        return set()
+    
+    if checkpoint.get('range') != [start_date, end_date]:
+        logger.info(f"回填断点属于区间 {checkpoint.get('range')}，与本次区间不同，从头开始")
+        return set()
+    return set(checkpoint.get('completed', []))
+
+
+def save_backfill_checkpoint(start_date, end_date, completed, path=STAT_BACKFILL_CHECKPOINT_PATH):
+    """
+    原子写入回填断点（先写临时文件再替换）
+    
+    Args:
+        start_date (str): 起始日期
+        end_date (str): 结束日期
+        completed (set): 已完成的日期
+        path (str): 断点文件路径
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'range': [start_date, end_date], 'completed': sorted(completed)}, f)
+    os.replace(tmp_path, path)
+
+
+def backfill_day(stat_date, with_summary=False):
+    """
+    回填一天：全量重算并存储统计结果、实体趋势汇总与系统指标，可选调用Coze生成分析总结
+    当天没有统计结果时同样删除旧的统计结果与汇总行，避免重算前的数据残留
+    在回填工作进程中执行，失败时抛出异常，该日期不记入断点
+    
+    Args:
+        stat_date (str): 统计日期
+        with_summary (bool): 是否同时生成Coze分析总结
+        
+    Returns:
+        dict: 当天回填结果
+    """
+    start = time.perf_counter()
+    stat_df = compute_statistics_full(stat_date)
+    
+    stored_rows = store_statistics(stat_df, stat_date)
+    if stored_rows is None:
+        raise RuntimeError(f"{stat_date} 统计结果存储失败")
+    if with_summary and not stat_df.empty:
+        summarize_statistics(stat_df, stat_date)
+    
+    rollup_rows = refresh_entity_rollup(stat_date)
+    if rollup_rows is None:
+        raise RuntimeError(f"{stat_date} 实体趋势汇总更新失败")
+    
+    metrics = generate_system_metrics(stat_date)
+    if not metrics or not store_system_metrics(metrics):
+        raise RuntimeError(f"{stat_date} 系统指标生成或存储失败")
+    
+    return {
+        'stat_date': stat_date,
+        'combinations': len(stat_df),
+        'stored_rows': stored_rows,
+        'metrics': metrics,
+        'seconds': round(time.perf_counter() - start, 3)
+    }
+
+
+def run_backfill(start_date, end_date, workers=STAT_BACKFILL_WORKERS, with_summary=False,
+                 checkpoint_path=STAT_BACKFILL_CHECKPOINT_PATH):
+    """
+    多日回填：日期区间按天拆分到进程池并行处理，每完成一天即写入断点
+    中断后以相同区间重新运行，已完成的日期直接跳过
+    
+    Args:
+        start_date (str): 起始日期，YYYY-MM-DD
+        end_date (str): 结束日期，YYYY-MM-DD（含）
+        workers (int): 并行进程数
+        with_summary (bool): 是否同时生成Coze分析总结
+        checkpoint_path (str): 断点文件路径
+        
+    Returns:
+        dict: 回填统计（总天数、本次完成、跳过、失败的日期）
+    """
+    dates = iter_dates(start_date, end_date)
+    completed = load_backfill_checkpoint(start_date, end_date, checkpoint_path)
+    pending = [stat_date for stat_date in dates if stat_date not in completed]
+    logger.info(f"开始回填 {start_date} ~ {end_date}: 共 {len(dates)} 天, 已完成 {len(dates) - len(pending)} 天, "
+                f"待处理 {len(pending)} 天, {workers} 个进程")
+    
+    failed = []
+    start = time.perf_counter()
+    # spawn方式启动工作进程，不继承父进程已建立的数据库连接，各进程在首次查询时建立自己的连接池
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(backfill_day, stat_date, with_summary): stat_date for stat_date in pending}
+        for future in as_completed(futures):
+            stat_date = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed.append(stat_date)
+                logger.error(f"回填 {stat_date} 失败: {e}")
+                continue
+            
+            completed.add(stat_date)
+            save_backfill_checkpoint(start_date, end_date, completed, checkpoint_path)
+            logger.info(f"回填 {stat_date} 完成: {result['combinations']} 个组合, {result['stored_rows']} 行, "
+                        f"耗时 {result['seconds']:.2f}s ({len(completed)}/{len(dates)})")
+    
+    elapsed = time.perf_counter() - start
+    logger.info(f"回填结束: 本次完成 {len(pending) - len(failed)} 天, 失败 {len(failed)} 天, 耗时 {elapsed:.2f}s")
+    if failed:
+        logger.warning(f"回填失败的日期（重新运行同一区间即可重试）: {', '.join(sorted(failed))}")
+    return {
+        'total_days': len(dates),
+        'completed': len(pending) - len(failed),
+        'skipped': len(dates) - len(pending),
+        'failed': sorted(failed)
+    }
+
+
 # ---------------------- 主函数 ----------------------
 
+record_step("模块导入", time.perf_counter() - _IMPORT_START)
+
+
+def parse_args():
+    """
+    解析命令行参数
+    """
+    parser = argparse.ArgumentParser(description="客服反馈分析总结")
+    parser.add_argument('--backfill', nargs=2, metavar=('START', 'END'),
+                        help="多日回填模式：并行重算并存储 START~END（含，YYYY-MM-DD）每天的统计结果与系统指标，"
+                             "中断后以相同区间重新运行即可从断点继续")
+    parser.add_argument('--workers', type=int, default=STAT_BACKFILL_WORKERS,
+                        help="回填模式的并行进程数")
+    parser.add_argument('--with-summary', action='store_true',
+                        help="回填模式下同时为每天调用Coze生成分析总结")
+    return parser.parse_args()
+
+
 def main():
     """
     主函数
     """
+    args = parse_args()
     logger.info("===== 客服反馈分析总结系统启动 =====")
     
     try:
+        get_db_client()
+    except Exception as e:
+        logger.error(f"数据库客户端初始化失败: {e}")
+        sys.exit(1)
+    log_startup_report()
+    
+    try:
+        if args.backfill:
+            start_date, end_date = args.backfill
+            run_backfill(start_date, end_date, workers=args.workers, with_summary=args.with_summary)
+            return
+        
         stat_date = ANALYSIS_DATE
         
         # 生成分析总结
         generate_daily_summary(stat_date)
         
-        # 生成系统运行指标
+        # 更新实体趋势汇总（小时/天粒度）
+        refresh_entity_rollup(stat_date)
+        
+        # 生成并存储系统运行指标
         metrics = generate_system_metrics(stat_date)
         logger.info(f"系统运行指标: {metrics}")
+        if metrics:
+            store_system_metrics(metrics)
         
     except KeyboardInterrupt:
         logger.info("程序被用户中断")
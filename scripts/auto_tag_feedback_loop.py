@@ -14,19 +14,46 @@
 
 import os
 import sys
+import argparse
+import atexit
 import json
-import requests
+import signal
+import socket
+import threading
+import time
+import uuid
 import logging
+
+# 模块导入计时起点（第三方库与本地模块导入计入“模块导入”步骤）
+_IMPORT_START = time.perf_counter()
+
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
-import pymysql
+try:
+    import fcntl
+except ImportError:  # Windows不支持fcntl，守护进程单实例锁不可用
+    fcntl = None
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from coze_cache import CozeResultCache
+from coze_client import TokenBucket, create_pooled_session
+from db_client import DatabaseClient
+from embedding_backend import (EmbeddingServiceError, RemoteEmbeddingBackend, create_embedding_backend,
+                               embedding_model_id)
+from embedding_cache import EmbeddingCache
+from length_bucketing import LengthBucketedBackend
+from metrics import REGISTRY, BatchProfiler, start_metrics_server, timed
+from entity_index import EntityDirectory, EntityIndex
+from relation_writer import BufferedRelationWriter
+from stage_pipeline import PipelineStage, StagedPipeline
+from startup_timing import log_startup_report, record_step, timed_step
+from vector_codec import encode_vector, to_sql_vector, to_vector
+
 # 加载环境变量
 load_dotenv()
 
@@ -50,93 +77,368 @@ SEEKDB_CONFIG = {
     'password': os.getenv('SEEKDB_PASSWORD', ''),
     'database': os.getenv('SEEKDB_DATABASE', 'feedback_db')
 }
+# 数据库连接池大小
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
 
 # Coze配置
 COZE_API_KEY = os.getenv('COZE_API_KEY', '')
 COZE_AGENT_ID = os.getenv('COZE_AGENT_ID', '')
 COZE_INVOKE_URL = f"https://api.coze.com/v1/agent/invoke?agent_id={COZE_AGENT_ID}"
+# 低置信度反馈并发调用Coze的最大并发数
+COZE_MAX_CONCURRENCY = int(os.getenv('COZE_MAX_CONCURRENCY', 8))
+# Coze调用限流：每秒请求数（0表示不限流）与允许的突发请求数
+COZE_RATE_LIMIT = float(os.getenv('COZE_RATE_LIMIT', 5))
+COZE_RATE_BURST = int(os.getenv('COZE_RATE_BURST', COZE_MAX_CONCURRENCY))
+# Coze识别结果缓存配置
+COZE_CACHE_ENABLED = os.getenv('COZE_CACHE_ENABLED', 'true').lower() == 'true'
+COZE_CACHE_PATH = os.getenv('COZE_CACHE_PATH', 'cache/coze_result_cache.db')
+COZE_CACHE_MAX_ENTRIES = int(os.getenv('COZE_CACHE_MAX_ENTRIES', 100000))
+COZE_CACHE_TTL_SECONDS = int(os.getenv('COZE_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+# Coze识别结果缓存版本：Agent提示词或配置变更时修改此值，旧结果不再命中（COZE_AGENT_ID已包含在缓存键中）
+COZE_CACHE_VERSION = os.getenv('COZE_CACHE_VERSION', '')
+# 低置信度反馈近似去重：向量余弦相似度不低于阈值的反馈归为一簇，每簇只调用一次Coze
+COZE_CLUSTER_ENABLED = os.getenv('COZE_CLUSTER_ENABLED', 'true').lower() == 'true'
+COZE_CLUSTER_SIMILARITY = float(os.getenv('COZE_CLUSTER_SIMILARITY', 0.95))
+
+# 打标流水线：每个数据块的反馈数、阶段间队列容量、各阶段工作线程数
+# （智能Agent阶段的并发由COZE_MAX_CONCURRENCY控制）
+PIPELINE_CHUNK_SIZE = int(os.getenv('PIPELINE_CHUNK_SIZE', 200))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 4))
+PIPELINE_EMBED_WORKERS = int(os.getenv('PIPELINE_EMBED_WORKERS', 1))
+PIPELINE_MATCH_WORKERS = int(os.getenv('PIPELINE_MATCH_WORKERS', 1))
+PIPELINE_WRITE_WORKERS = int(os.getenv('PIPELINE_WRITE_WORKERS', 1))
+
+# 打标结果缓冲写入：达到行数或间隔秒数时批量刷新（只在完整的数据块之间刷新）
+RELATION_WRITER_MAX_ROWS = int(os.getenv('RELATION_WRITER_MAX_ROWS', 500))
+RELATION_WRITER_FLUSH_INTERVAL = float(os.getenv('RELATION_WRITER_FLUSH_INTERVAL', 5))
+
+# 积压清理模式的水位文件，记录已扫描到的 (create_time, feedback_id)
+# 水位之前仍未打标的反馈（处理失败、Coze未识别出实体、create_time晚于插入顺序写入的行）由补扫处理
+TAG_WATERMARK_PATH = os.getenv('TAG_WATERMARK_PATH', 'cache/tag_watermark.json')
+# 初始水位：早于所有反馈
+INITIAL_WATERMARK = ('1970-01-01 00:00:00', '')
+
+# 守护进程模式：有积压时立即拉取下一批，空闲时轮询间隔在最小/最大值之间指数退避
+DAEMON_MIN_POLL_INTERVAL = float(os.getenv('DAEMON_MIN_POLL_INTERVAL', 1))
+DAEMON_MAX_POLL_INTERVAL = float(os.getenv('DAEMON_MAX_POLL_INTERVAL', 60))
+DAEMON_LOCK_PATH = os.getenv('DAEMON_LOCK_PATH', 'cache/tag_daemon.lock')
+# 守护进程（水位数据源）补扫水位之前未打标反馈的间隔秒数，覆盖Coze/数据库故障期间越过的反馈
+TAG_RETRY_INTERVAL = float(os.getenv('TAG_RETRY_INTERVAL', 3600))
+
+# 多工作进程模式：通过租约表认领互不重叠的待打标反馈，租约过期后可被其他进程重新认领
+TAG_WORKER_ID = os.getenv('TAG_WORKER_ID', f"{socket.gethostname()}-{os.getpid()}")
+# 租约时长需大于单批处理耗时
+TAG_LEASE_SECONDS = int(os.getenv('TAG_LEASE_SECONDS', 900))
 
 # 系统配置
 CONFIDENCE_THRESHOLD = float(os.getenv('CONFIDENCE_THRESHOLD', 0.8))
 BATCH_SIZE = int(os.getenv('BATCH_SIZE', 1000))
+# 向量相似度下限，低于该值的实体不参与匹配
+VECTOR_MATCH_THRESHOLD = float(os.getenv('VECTOR_MATCH_THRESHOLD', 0.5))
+
+# 实体向量内存索引配置
+ENTITY_INDEX_ENABLED = os.getenv('ENTITY_INDEX_ENABLED', 'true').lower() == 'true'
+# 每条反馈在关键词过滤之后最多保留的匹配实体数（按相似度从高到低），0表示不限制；
+# 截断在关键词过滤之后进行，最高置信度的匹配与SQL检索一致
+ENTITY_INDEX_TOP_K = int(os.getenv('ENTITY_INDEX_TOP_K', 0))
+# 实体向量索引与ID目录增量刷新间隔（秒），加载其他进程沉淀的实体；0表示不刷新
+ENTITY_INDEX_REFRESH_INTERVAL = float(os.getenv('ENTITY_INDEX_REFRESH_INTERVAL', 300))
 
 # 向量生成配置
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
 EMBEDDING_DIMENSION = int(os.getenv('EMBEDDING_DIMENSION', 384))
+# 向量生成后端：torch（sentence-transformers）或 onnx（ONNX Runtime，CPU推理更快）
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch').lower()
+# onnx后端是否使用int8动态量化模型
+EMBEDDING_ONNX_QUANTIZE = os.getenv('EMBEDDING_ONNX_QUANTIZE', 'false').lower() == 'true'
+# onnx后端导出/量化模型的缓存目录
+EMBEDDING_ONNX_DIR = os.getenv('EMBEDDING_ONNX_DIR', 'cache/onnx_models')
+# onnx后端推理线程数，0表示由ONNX Runtime决定
+EMBEDDING_ONNX_THREADS = int(os.getenv('EMBEDDING_ONNX_THREADS', 0))
+# 本地向量服务地址（如 http://127.0.0.1:8765），为空或服务不在线时在进程内加载模型
+EMBEDDING_SERVER_URL = os.getenv('EMBEDDING_SERVER_URL', '')
+# 编码前是否按token长度排序分桶，减少小批次内的填充浪费
+EMBEDDING_LENGTH_BUCKETING = os.getenv('EMBEDDING_LENGTH_BUCKETING', 'true').lower() == 'true'
+# 单条文本最大token数（含特殊token），超出部分按截断策略处理
+EMBEDDING_MAX_TOKENS = int(os.getenv('EMBEDDING_MAX_TOKENS', 256))
+# 截断策略：head（保留开头）或 head_tail（保留开头和结尾）
+EMBEDDING_TRUNCATION = os.getenv('EMBEDDING_TRUNCATION', 'head').lower()
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv('EMBEDDING_SERVER_TIMEOUT', 30))
+# 批量向量化时每次前向计算的文本数
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+# 向量回填时每条多行UPDATE语句包含的行数
+VECTOR_BACKFILL_CHUNK_SIZE = int(os.getenv('VECTOR_BACKFILL_CHUNK_SIZE', 200))
+# 向量记忆化缓存：内存上限（MB）与可选的持久化文件路径（为空则不持久化）
+EMBEDDING_CACHE_MAX_MB = float(os.getenv('EMBEDDING_CACHE_MAX_MB', 64))
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', '')
+# 向量二进制列的存储精度（float32 / float16）
+VECTOR_CODEC_DTYPE = os.getenv('VECTOR_CODEC_DTYPE', 'float32')
 
-# 初始化向量生成模型
-try:
-    embedding_model = SentenceTransformer(EMBEDDING_MODEL)
-    logger.info(f"向量生成模型初始化成功: {EMBEDDING_MODEL}")
-except Exception as e:
-    logger.error(f"向量生成模型初始化失败: {e}")
-    sys.exit(1)
-
-# ---------------------- 数据库客户端类 ----------------------
-class DatabaseClient:
-    def __init__(self, **config):
-        self.config = config
-        self.connection = None
-        self.connect()
-    
-    def connect(self):
-        """建立数据库连接"""
-        try:
-            self.connection = pymysql.connect(
-                host=self.config['host'],
-                port=self.config['port'],
-                user=self.config['user'],
-                password=self.config['password'],
-                database=self.config['database'],
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
-        except Exception as e:
-            raise Exception(f"数据库连接失败: {e}")
+# 本地指标端点（Prometheus文本格式 /metrics，JSON汇总 /metrics.json），端口为0时不启动
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+# 每批次JSON指标汇总的追加输出文件（jsonl），为空时只写日志
+METRICS_SUMMARY_PATH = os.getenv('METRICS_SUMMARY_PATH', '')
+# --profile 模式下每批次剖析报告的输出目录
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'logs/profile')
+
+# ---------------------- 延迟初始化的共享资源 ----------------------
+# 模型、数据库连接、HTTP会话等开销较大的资源在首次使用时才创建，
+# 只导入本模块中的函数（如基准脚本）时不付出启动代价
+_init_lock = threading.RLock()
+
+embedding_model = None
+embedding_cache = None
+db_client = None
+coze_session = None
+coze_cache = None
+_coze_cache_initialized = False
+relation_writer = None
+# --profile 模式下的批次剖析器
+batch_profiler = None
+
+coze_rate_limiter = TokenBucket(COZE_RATE_LIMIT, COZE_RATE_BURST)
+
+
+def get_embedding_model():
+    """
+    获取向量生成模型，首次调用时初始化：
+    配置了EMBEDDING_SERVER_URL、服务在线且模型标识与本进程配置一致时使用本地向量服务，
+    否则按EMBEDDING_BACKEND在进程内加载
     
-    def query_sql(self, sql, params=None):
-        """执行查询SQL并返回DataFrame"""
-        try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(sql, params)
-                result = cursor.fetchall()
-                return pd.DataFrame(result)
-        except Exception as e:
-            raise Exception(f"查询执行失败: {e}")
+    Returns:
+        EmbeddingBackend: 向量生成后端
+    """
+    global embedding_model
+    if embedding_model is None:
+        with _init_lock:
+            if embedding_model is None and EMBEDDING_SERVER_URL:
+                remote = RemoteEmbeddingBackend(EMBEDDING_SERVER_URL, EMBEDDING_SERVER_TIMEOUT,
+                                                model_id=embedding_cache_model_id())
+                if remote.is_available():
+                    embedding_model = remote
+                    logger.info(f"使用本地向量服务: {EMBEDDING_SERVER_URL} ({remote.name})")
+                else:
+                    logger.warning(f"本地向量服务不可用或模型不一致，回退到进程内模型: {EMBEDDING_SERVER_URL}")
+            if embedding_model is None:
+                embedding_model = load_local_embedding_model()
+    return embedding_model
+
+
+def load_local_embedding_model():
+    """
+    按EMBEDDING_BACKEND在进程内加载向量生成模型（torch/onnxruntime也在此时导入）
     
-    def execute_sql(self, sql, params=None):
-        """执行SQL语句（更新、删除等）"""
-        try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(sql, params)
-                self.connection.commit()
-                return cursor.rowcount
-        except Exception as e:
-            self.connection.rollback()
-            raise Exception(f"SQL执行失败: {e}")
+    Returns:
+        EmbeddingBackend: 向量生成后端
+    """
+    try:
+        with timed_step(f"向量生成模型加载（{EMBEDDING_BACKEND}: {EMBEDDING_MODEL}）"):
+            backend = create_embedding_backend(
+                EMBEDDING_BACKEND,
+                EMBEDDING_MODEL,
+                onnx_dir=EMBEDDING_ONNX_DIR,
+                quantize=EMBEDDING_ONNX_QUANTIZE,
+                max_seq_length=EMBEDDING_MAX_TOKENS,
+                num_threads=EMBEDDING_ONNX_THREADS
+            )
+            if EMBEDDING_LENGTH_BUCKETING:
+                backend = LengthBucketedBackend(backend, EMBEDDING_MAX_TOKENS, EMBEDDING_TRUNCATION)
+    except Exception as e:
+        logger.error(f"向量生成模型初始化失败: {e}")
+        raise
+    logger.info(f"向量生成模型初始化成功: {backend.name} / {EMBEDDING_MODEL}")
+    return backend
+
+
+def encode_with_fallback(texts, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    调用当前向量生成后端；本地向量服务中途不可用时切换到进程内模型并重试
     
-    def insert(self, table, data):
-        """插入数据到指定表"""
-        if not data:
-            return 0
-        
-        columns = ', '.join(data.keys())
-        placeholders = ', '.join(['%s'] * len(data))
-        values = list(data.values())
+    Args:
+        texts (list): 输入文本列表
+        batch_size (int): 每次前向计算的文本数
         
-        sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-        return self.execute_sql(sql, values)
+    Returns:
+        ndarray: 向量矩阵
+    """
+    global embedding_model
+    model = get_embedding_model()
+    try:
+        return model.encode(texts, batch_size=batch_size)
+    except EmbeddingServiceError as e:
+        logger.warning(f"{e}，切换到进程内模型")
+        with _init_lock:
+            if embedding_model is model:
+                embedding_model = load_local_embedding_model()
+        return embedding_model.encode(texts, batch_size=batch_size)
 
-# ---------------------- 数据库客户端初始化 ----------------------
-try:
-    db_client = DatabaseClient(**SEEKDB_CONFIG)
-    logger.info("数据库客户端初始化成功")
-except Exception as e:
-    logger.error(f"数据库客户端初始化失败: {e}")
-    sys.exit(1)
+
+def get_embedding_cache():
+    """
+    获取向量记忆化缓存，首次调用时创建（配置了持久化路径时从磁盘加载）
+    
+    Returns:
+        EmbeddingCache: 向量缓存
+    """
+    global embedding_cache
+    if embedding_cache is None:
+        with _init_lock:
+            if embedding_cache is None:
+                with timed_step("向量缓存加载"):
+                    embedding_cache = EmbeddingCache(
+                        max_bytes=int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024),
+                        path=EMBEDDING_CACHE_PATH or None,
+                        model_id=embedding_cache_model_id()
+                    )
+    return embedding_cache
+
+
+def embedding_cache_model_id():
+    """
+    生成本进程配置的模型标识：模型、后端、量化与截断配置任一变化时向量不可复用
+    向量缓存以此为键；本地向量服务报告的标识须与之一致才会被使用，因此不区分服务与进程内模型
+    
+    Returns:
+        str: 模型标识
+    """
+    return embedding_model_id(
+        EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_ONNX_QUANTIZE, EMBEDDING_DIMENSION,
+        max_tokens=EMBEDDING_MAX_TOKENS if EMBEDDING_LENGTH_BUCKETING else None,
+        truncation=EMBEDDING_TRUNCATION
+    )
+
+
+def get_db_client():
+    """
+    获取共享数据库客户端，首次调用时建立连接池
+    
+    Returns:
+        DatabaseClient: 数据库客户端
+    """
+    global db_client
+    if db_client is None:
+        with _init_lock:
+            if db_client is None:
+                with timed_step("数据库连接"):
+                    db_client = DatabaseClient(pool_size=DB_POOL_SIZE, **SEEKDB_CONFIG)
+                logger.info("数据库客户端初始化成功")
+    return db_client
+
+
+def get_http_session():
+    """
+    获取调用Coze的HTTP会话，首次调用时创建连接池
+    
+    Returns:
+        requests.Session: HTTP会话
+    """
+    global coze_session
+    if coze_session is None:
+        with _init_lock:
+            if coze_session is None:
+                with timed_step("HTTP会话创建"):
+                    coze_session = create_pooled_session(pool_size=COZE_MAX_CONCURRENCY)
+    return coze_session
+
+
+def get_coze_cache():
+    """
+    获取Coze识别结果缓存，首次调用时打开缓存文件
+    
+    Returns:
+        CozeResultCache: 结果缓存，未启用或初始化失败时返回None
+    """
+    global coze_cache, _coze_cache_initialized
+    if not _coze_cache_initialized:
+        with _init_lock:
+            if not _coze_cache_initialized:
+                if COZE_CACHE_ENABLED:
+                    try:
+                        with timed_step("Coze识别结果缓存打开"):
+                            coze_cache = CozeResultCache(
+                                COZE_CACHE_PATH, COZE_CACHE_MAX_ENTRIES, COZE_CACHE_TTL_SECONDS,
+                                namespace=f"{COZE_AGENT_ID}|{COZE_CACHE_VERSION}"
+                            )
+                        logger.info(f"Coze识别结果缓存初始化成功: {COZE_CACHE_PATH}")
+                    except Exception as e:
+                        logger.warning(f"Coze识别结果缓存初始化失败，将直接调用Coze: {e}")
+                _coze_cache_initialized = True
+    return coze_cache
+
+
+def get_relation_writer():
+    """
+    获取打标结果缓冲写入器，首次调用时创建并注册退出时刷新
+    
+    Returns:
+        BufferedRelationWriter: 缓冲写入器
+    """
+    global relation_writer
+    if relation_writer is None:
+        with _init_lock:
+            if relation_writer is None:
+                relation_writer = BufferedRelationWriter(
+                    get_db_client(),
+                    max_rows=RELATION_WRITER_MAX_ROWS,
+                    flush_interval=RELATION_WRITER_FLUSH_INTERVAL
+                )
+                # 进程退出时保证缓冲区写入
+                atexit.register(relation_writer.close)
+    return relation_writer
+
+# ---------------------- 实体向量索引 ----------------------
+entity_index = None
+
+# 实体类型/实体值ID目录，启动时预热，写入新实体时同步更新
+entity_directory = EntityDirectory()
+# 上次增量刷新实体索引与目录的时间
+entity_refresh_time = time.monotonic()
+
+
+def get_entity_index():
+    """
+    获取实体向量内存索引，首次调用时从entity_vector_lib加载
+    
+    Returns:
+        EntityIndex: 实体向量索引，未启用或加载失败时返回None
+    """
+    global entity_index
+    if not ENTITY_INDEX_ENABLED:
+        return None
+    if entity_index is None:
+        with _init_lock:
+            if entity_index is None:
+                try:
+                    with timed_step("实体向量索引加载"):
+                        index = EntityIndex(EMBEDDING_DIMENSION)
+                        index.load(get_db_client())
+                    entity_index = index
+                except Exception as e:
+                    logger.error(f"实体向量索引加载失败，回退到SQL检索: {e}")
+                    return None
+    return entity_index
+
+
+def refresh_entity_caches():
+    """
+    到达刷新间隔时，增量加载其他进程（多工作进程、其他机器）沉淀的实体，
+    避免本进程的实体向量索引与ID目录只包含自己写入的实体
+    """
+    global entity_refresh_time
+    if ENTITY_INDEX_REFRESH_INTERVAL <= 0 or time.monotonic() - entity_refresh_time < ENTITY_INDEX_REFRESH_INTERVAL:
+        return
+    entity_refresh_time = time.monotonic()
+    try:
+        if entity_index is not None:
+            entity_index.refresh(get_db_client())
+        entity_directory.refresh(get_db_client())
+    except Exception as e:
+        logger.warning(f"实体索引增量刷新失败，下次批次重试: {e}")
 
 # ---------------------- 核心函数 ----------------------
 
+@timed('invoke_coze_entity_recognize')
 def invoke_coze_entity_recognize(feedback_text):
     """
     调用Coze智能Agent识别动态实体
@@ -161,7 +463,8 @@ def invoke_coze_entity_recognize(feedback_text):
     }
     
     try:
-        response = requests.post(COZE_INVOKE_URL, headers=headers, json=payload, timeout=30)
+        coze_rate_limiter.acquire()
+        response = get_http_session().post(COZE_INVOKE_URL, headers=headers, json=payload, timeout=30)
         response.raise_for_status()
         
         coze_result = response.json()
@@ -184,6 +487,63 @@ def invoke_coze_entity_recognize(feedback_text):
         return []
 
 
+def recognize_entities_cached(feedback_text):
+    """
+    带缓存的Coze实体识别：命中缓存时直接返回，未命中时调用Coze并缓存非空结果
+    
+    Args:
+        feedback_text (str): 反馈文本
+        
+    Returns:
+        list: 识别的实体列表
+    """
+    cache = get_coze_cache()
+    if cache is not None:
+        try:
+            cached_entities = cache.get(feedback_text)
+            if cached_entities is not None:
+                return cached_entities
+        except Exception as e:
+            logger.warning(f"读取Coze识别结果缓存失败: {e}")
+    
+    entities = invoke_coze_entity_recognize(feedback_text)
+    
+    if cache is not None and entities:
+        try:
+            cache.put(feedback_text, entities)
+        except Exception as e:
+            logger.warning(f"写入Coze识别结果缓存失败: {e}")
+    
+    return entities
+
+
+def embed_texts(texts, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    生成文本向量（经过记忆化缓存），只对缓存未命中的文本做一次批量前向计算
+    
+    Args:
+        texts (list): 输入文本列表
+        batch_size (int): 每次前向计算的文本数
+        
+    Returns:
+        list: float32向量列表，与输入顺序一致
+    """
+    cache = get_embedding_cache()
+    vectors = [cache.get(text) for text in texts]
+    missing_positions = [i for i, vector in enumerate(vectors) if vector is None]
+    
+    if missing_positions:
+        missing_texts = [texts[i] for i in missing_positions]
+        embeddings = encode_with_fallback(missing_texts, batch_size=batch_size)
+        for position, text, embedding in zip(missing_positions, missing_texts, embeddings):
+            vector = np.asarray(embedding, dtype=np.float32)
+            cache.put(text, vector)
+            vectors[position] = vector
+    
+    return vectors
+
+
+@timed('generate_embedding')
 def generate_embedding(text):
     """
     生成文本向量
@@ -192,19 +552,36 @@ def generate_embedding(text):
         text (str): 输入文本
         
     Returns:
-        str: 向量字符串
+        ndarray: float32向量
     """
     try:
-        # 使用sentence-transformers生成向量
-        embedding = embedding_model.encode(text, convert_to_numpy=True)
-        # 转换为字符串格式，适应数据库存储
-        embedding_str = ','.join(map(str, embedding.tolist()))
-        return embedding_str
+        # 使用配置的向量生成后端生成向量（命中缓存时不做前向计算）
+        return embed_texts([text])[0]
     except Exception as e:
         logger.error(f"向量生成失败: {e}")
         return None
 
 
+@timed('generate_embeddings')
+def generate_embeddings(texts, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    批量生成文本向量，一次调用内按batch_size切分前向计算
+    
+    Args:
+        texts (list): 输入文本列表
+        batch_size (int): 每次前向计算的文本数
+        
+    Returns:
+        list: float32向量列表，与输入顺序一致；失败时返回None
+    """
+    try:
+        return embed_texts(list(texts), batch_size=batch_size)
+    except Exception as e:
+        logger.error(f"批量向量生成失败: {e}")
+        return None
+
+
+@timed('insert_entity_to_seekdb')
 def insert_entity_to_seekdb(entity_item):
     """
     将Coze识别的实体写入标签向量库
@@ -226,41 +603,47 @@ def insert_entity_to_seekdb(entity_item):
     
     try:
         # 1. 新增实体类型（不存在则插入）
-        type_sql = "SELECT type_id FROM dynamic_entity_type WHERE type_name = %s"
-        type_result = db_client.query_sql(type_sql, params=[type_name])
+        type_id = ensure_entity_type(type_name)
         
-        if type_result.empty:
-            # 插入新的实体类型
-            db_client.insert("dynamic_entity_type", {"type_name": type_name})
-            type_result = db_client.query_sql(type_sql, params=[type_name])
-            logger.info(f"新增实体类型: {type_name}")
+        # 2. 新增实体值（去重处理），目录命中时无需访问数据库和生成向量
+        entity_id = entity_directory.get_entity_id(type_id, entity_value)
+        if entity_id is not None:
+            return entity_id, coze_confidence
         
-        type_id = type_result['type_id'].iloc[0]
-        
-        # 2. 生成实体向量
+        # 3. 生成实体向量
         entity_text = f"{type_name}:{entity_value}"
         entity_vector = generate_embedding(entity_text)
         
-        if not entity_vector:
+        if entity_vector is None:
             logger.error(f"实体向量生成失败: {entity_text}")
             return None, None
         
-        # 3. 新增实体值（去重处理）
-        entity_sql = "SELECT entity_id FROM entity_vector_lib WHERE type_id = %s AND entity_value = %s"
-        entity_result = db_client.query_sql(entity_sql, params=[type_id, entity_value])
-        
-        if entity_result.empty:
-            # 插入新的实体值
-            db_client.insert("entity_vector_lib", {
-                "type_id": type_id,
-                "entity_value": entity_value,
-                "entity_vector": entity_vector,
-                "confidence": coze_confidence
-            })
-            entity_result = db_client.query_sql(entity_sql, params=[type_id, entity_value])
+        # 借助UNIQUE (type_id, entity_value) 约束单语句写入
+        new_entity_id = str(uuid.uuid4())
+        upsert_sql = """
+        INSERT INTO entity_vector_lib (entity_id, type_id, entity_value, entity_vector, entity_vector_bin, confidence) 
+        VALUES (%s, %s, %s, %s, %s, %s) 
+        ON DUPLICATE KEY UPDATE entity_id = entity_id
+        """
+        inserted = get_db_client().execute_sql(
+            upsert_sql,
+            params=[new_entity_id, type_id, entity_value, to_sql_vector(entity_vector),
+                    encode_vector(entity_vector, VECTOR_CODEC_DTYPE), coze_confidence]
+        ) == 1
+        
+        if inserted:
+            entity_id = new_entity_id
             logger.info(f"新增实体值: {type_name}:{entity_value}")
+            
+            # 增量更新内存索引
+            if entity_index is not None:
+                entity_index.add(entity_id, type_name, entity_value, entity_vector)
+        else:
+            # 其他进程已写入该实体
+            entity_sql = "SELECT entity_id FROM entity_vector_lib WHERE type_id = %s AND entity_value = %s"
+            entity_id = get_db_client().query_sql(entity_sql, params=[type_id, entity_value])['entity_id'].iloc[0]
         
-        entity_id = entity_result['entity_id'].iloc[0]
+        entity_directory.set_entity_id(type_id, entity_value, entity_id)
         
         return entity_id, coze_confidence
         
@@ -269,6 +652,40 @@ def insert_entity_to_seekdb(entity_item):
         return None, None
 
 
+def ensure_entity_type(type_name):
+    """
+    获取实体类型ID，不存在时写入
+    目录命中时无数据库访问；未命中时借助UNIQUE (type_name) 约束单语句写入
+    
+    Args:
+        type_name (str): 实体类型名称
+        
+    Returns:
+        str: 实体类型ID
+    """
+    type_id = entity_directory.get_type_id(type_name)
+    if type_id is not None:
+        return type_id
+    
+    # 重复键时为空操作，受影响行数为0；新插入时为1
+    new_type_id = str(uuid.uuid4())
+    upsert_sql = """
+    INSERT INTO dynamic_entity_type (type_id, type_name) 
+    VALUES (%s, %s) 
+    ON DUPLICATE KEY UPDATE type_id = type_id
+    """
+    if get_db_client().execute_sql(upsert_sql, params=[new_type_id, type_name]) == 1:
+        type_id = new_type_id
+        logger.info(f"新增实体类型: {type_name}")
+    else:
+        type_sql = "SELECT type_id FROM dynamic_entity_type WHERE type_name = %s"
+        type_id = get_db_client().query_sql(type_sql, params=[type_name])['type_id'].iloc[0]
+    
+    entity_directory.set_type_id(type_name, type_id)
+    return type_id
+
+
+@timed('seekdb_match_entity')
 def seekdb_match_entity(feedback_id):
     """
     混合检索匹配实体
@@ -283,38 +700,25 @@ def seekdb_match_entity(feedback_id):
     try:
         # 获取反馈的向量和文本
         feedback_sql = """
-        SELECT feedback_text, feedback_vector 
+        SELECT feedback_text, feedback_vector, feedback_vector_bin 
         FROM customer_feedback 
         WHERE feedback_id = %s
         """
-        feedback_result = db_client.query_sql(feedback_sql, params=[feedback_id])
+        feedback_result = get_db_client().query_sql(feedback_sql, params=[feedback_id])
         
         if feedback_result.empty:
             logger.warning(f"反馈ID不存在: {feedback_id}")
             return []
         
+        decode_feedback_vectors(feedback_result)
         feedback_text = feedback_result['feedback_text'].iloc[0]
         feedback_vector = feedback_result['feedback_vector'].iloc[0]
         
-        # 混合检索：向量相似度 + 关键词匹配
-        match_sql = f"""
-        SELECT 
-            e.entity_id, 
-            t.type_name, 
-            e.entity_value,
-            VECTOR_SIMILARITY(e.entity_vector, %s) AS match_confidence
-        FROM 
-            entity_vector_lib e
-        JOIN 
-            dynamic_entity_type t ON e.type_id = t.type_id
-        WHERE 
-            VECTOR_SIMILARITY(e.entity_vector, %s) > 0.5
-            AND MATCH(e.entity_value) AGAINST(%s IN NATURAL LANGUAGE MODE)
-        ORDER BY 
-            match_confidence DESC
-        """
-        
-        match_result = db_client.query_sql(match_sql, params=[feedback_vector, feedback_vector, feedback_text]).to_dict('records')
+        index = get_entity_index()
+        if index is not None:
+            match_result = match_entity_with_index(index, feedback_text, feedback_vector)
+        else:
+            match_result = seekdb_match_entity_sql(feedback_text, feedback_vector)
         logger.info(f"匹配到 {len(match_result)} 个实体")
         
         return match_result
@@ -324,9 +728,148 @@ def seekdb_match_entity(feedback_id):
         return []
 
 
+@timed('seekdb_match_entity_sql')
+def seekdb_match_entity_sql(feedback_text, feedback_vector):
+    """
+    在SeekDB中执行混合检索：向量相似度 + 关键词匹配（全表扫描entity_vector_lib）
+    
+    Args:
+        feedback_text (str): 反馈文本
+        feedback_vector (ndarray): 反馈向量
+        
+    Returns:
+        list: 匹配结果列表
+    """
+    # VECTOR列只接受文本字面量，仅在SQL边界处格式化
+    vector_literal = to_sql_vector(feedback_vector)
+    match_sql = f"""
+    SELECT 
+        e.entity_id, 
+        t.type_name, 
+        e.entity_value,
+        VECTOR_SIMILARITY(e.entity_vector, %s) AS match_confidence
+    FROM 
+        entity_vector_lib e
+    JOIN 
+        dynamic_entity_type t ON e.type_id = t.type_id
+    WHERE 
+        VECTOR_SIMILARITY(e.entity_vector, %s) > {VECTOR_MATCH_THRESHOLD}
+        AND MATCH(e.entity_value) AGAINST(%s IN NATURAL LANGUAGE MODE)
+    ORDER BY 
+        match_confidence DESC
+    """
+    
+    return get_db_client().query_sql(match_sql, params=[vector_literal, vector_literal, feedback_text]).to_dict('records')
+
+
+def match_entity_with_index(index, feedback_text, feedback_vector):
+    """
+    使用实体向量内存索引完成混合检索
+    向量相似度在本地计算，关键词匹配仅对候选实体执行一次全文检索
+    
+    Args:
+        index (EntityIndex): 实体向量索引
+        feedback_text (str): 反馈文本
+        feedback_vector (ndarray): 反馈向量
+        
+    Returns:
+        list: 匹配结果列表
+    """
+    candidates = index.search(feedback_vector, min_similarity=VECTOR_MATCH_THRESHOLD)
+    return filter_candidates_by_keyword([(None, feedback_text, candidates)], top_k=ENTITY_INDEX_TOP_K or None)[None]
+
+
+def filter_candidates_by_keyword(items, chunk_size=100, top_k=None):
+    """
+    对向量候选实体执行关键词匹配过滤
+    多条反馈的全文检索以UNION ALL合并，每chunk_size条反馈一次往返；
+    top-k截断在过滤之后进行，通过关键词匹配的候选不会因排名靠后被提前截掉
+    
+    Args:
+        items (list): (key, feedback_text, candidates) 元组列表，candidates按相似度降序
+        chunk_size (int): 每条SQL包含的反馈数
+        top_k (int): 过滤后每条反馈保留的最大候选数，为None时不限制
+        
+    Returns:
+        dict: key -> 通过关键词匹配的候选列表（保持原有顺序）
+    """
+    filtered = {key: [] for key, _, _ in items}
+    pending = [(str(i), key, text, candidates) for i, (key, text, candidates) in enumerate(items) if candidates]
+    
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        selects = []
+        params = []
+        for tag, _, feedback_text, candidates in chunk:
+            placeholders = ', '.join(['%s'] * len(candidates))
+            selects.append(f"""
+            SELECT %s AS match_key, entity_id 
+            FROM entity_vector_lib 
+            WHERE entity_id IN ({placeholders})
+                AND MATCH(entity_value) AGAINST(%s IN NATURAL LANGUAGE MODE)
+            """)
+            params.append(tag)
+            params.extend(item['entity_id'] for item in candidates)
+            params.append(feedback_text)
+        
+        keyword_result = get_db_client().query_sql(' UNION ALL '.join(selects), params=params)
+        passed = set()
+        if not keyword_result.empty:
+            passed = set(zip(keyword_result['match_key'], keyword_result['entity_id']))
+        
+        for tag, key, _, candidates in chunk:
+            filtered[key] = [item for item in candidates if (tag, item['entity_id']) in passed][:top_k]
+    
+    return filtered
+
+
+@timed('match_feedback_batch')
+def match_feedback_batch(untagged_df):
+    """
+    整批匹配实体：堆叠整批反馈向量，一次矩阵乘完成与实体库的相似度计算
+    直接使用get_untagged_feedback已取回的向量，不再逐条回查customer_feedback
+    
+    Args:
+        untagged_df (DataFrame): 待打标反馈数据
+        
+    Returns:
+        dict: feedback_id -> 匹配结果列表（与seekdb_match_entity返回格式一致）
+    """
+    index = get_entity_index()
+    if index is None:
+        return {feedback_id: seekdb_match_entity(feedback_id) for feedback_id in untagged_df['feedback_id']}
+    
+    batch_matches = {feedback_id: [] for feedback_id in untagged_df['feedback_id']}
+    
+    rows = []
+    vectors = []
+    for feedback_id, feedback_text, feedback_vector in zip(
+        untagged_df['feedback_id'], untagged_df['feedback_text'], untagged_df['feedback_vector']
+    ):
+        if feedback_vector is not None and feedback_vector.shape[0] == EMBEDDING_DIMENSION:
+            rows.append((feedback_id, feedback_text))
+            vectors.append(feedback_vector)
+    
+    if not vectors:
+        return batch_matches
+    
+    try:
+        candidates_list = index.search_batch(np.vstack(vectors), min_similarity=VECTOR_MATCH_THRESHOLD)
+        items = [(feedback_id, feedback_text, candidates)
+                 for (feedback_id, feedback_text), candidates in zip(rows, candidates_list)]
+        batch_matches.update(filter_candidates_by_keyword(items, top_k=ENTITY_INDEX_TOP_K or None))
+    except Exception as e:
+        logger.error(f"整批实体匹配失败: {e}")
+    
+    matched_count = sum(1 for matches in batch_matches.values() if matches)
+    logger.info(f"整批匹配完成: {len(batch_matches)} 条反馈, 其中 {matched_count} 条有匹配实体")
+    return batch_matches
+
+
+@timed('write_tag_result')
 def write_tag_result(feedback_id, entity_id, match_confidence):
     """
-    写入反馈明细+打标结果
+    写入反馈明细+打标结果（经缓冲写入器批量提交）
     对应架构图中的“反馈明细+打标结果”
     
     Args:
@@ -335,19 +878,20 @@ def write_tag_result(feedback_id, entity_id, match_confidence):
         match_confidence (float): 匹配置信度
     """
     try:
-        db_client.insert("feedback_entity_relation", {
+        get_relation_writer().add("feedback_entity_relation", {
             "feedback_id": feedback_id,
             "entity_id": entity_id,
             "match_confidence": match_confidence
         })
-        logger.info(f"反馈 {feedback_id} 打标成功，实体 {entity_id}，置信度 {match_confidence:.2f}")
+        logger.info(f"反馈 {feedback_id} 打标成功（待批量写入），实体 {entity_id}，置信度 {match_confidence:.2f}")
     except Exception as e:
         logger.error(f"打标结果写入失败: {e}")
 
 
+@timed('write_re_tag_detail')
 def write_re_tag_detail(feedback_id, entity_id, coze_confidence):
     """
-    写入重新打标明细
+    写入重新打标明细（经缓冲写入器批量提交）
     对应架构图中的“重新打标明细”
     
     Args:
@@ -356,19 +900,117 @@ def write_re_tag_detail(feedback_id, entity_id, coze_confidence):
         coze_confidence (float): Coze识别置信度
     """
     try:
-        db_client.insert("entity_precipitation_log", {
+        get_relation_writer().add("entity_precipitation_log", {
             "feedback_id": feedback_id,
             "entity_id": entity_id,
             "coze_confidence": coze_confidence
         })
-        logger.info(f"反馈 {feedback_id} 重新打标明细记录成功")
+        logger.info(f"反馈 {feedback_id} 重新打标明细记录成功（待批量写入）")
     except Exception as e:
         logger.error(f"重新打标明细写入失败: {e}")
 
 
+def decode_feedback_vectors(feedback_df):
+    """
+    将查询结果中的向量列统一解码为float32数组
+    优先使用二进制列（np.frombuffer零拷贝），历史数据回退到解析VECTOR文本；
+    解码后的数组写回feedback_vector列，并删除feedback_vector_bin列
+    
+    Args:
+        feedback_df (DataFrame): 含feedback_vector（及feedback_vector_bin）列的反馈数据
+    """
+    if feedback_df.empty:
+        return
+    
+    binary_values = (feedback_df['feedback_vector_bin'] if 'feedback_vector_bin' in feedback_df
+                     else [None] * len(feedback_df))
+    vectors = []
+    for binary_value, text_value in zip(binary_values, feedback_df['feedback_vector']):
+        vector = to_vector(binary_value, EMBEDDING_DIMENSION)
+        if vector is None:
+            vector = to_vector(text_value, EMBEDDING_DIMENSION)
+        vectors.append(vector)
+    
+    feedback_df['feedback_vector'] = pd.Series(vectors, index=feedback_df.index, dtype=object)
+    if 'feedback_vector_bin' in feedback_df:
+        feedback_df.drop(columns='feedback_vector_bin', inplace=True)
+
+
+@timed('backfill_feedback_vectors')
+def backfill_feedback_vectors(untagged_df, chunk_size=VECTOR_BACKFILL_CHUNK_SIZE):
+    """
+    为缺少向量的反馈批量生成向量，并按块用多行UPDATE写回数据库
+    回填后的向量同时写回untagged_df，供后续匹配直接使用
+    
+    Args:
+        untagged_df (DataFrame): 待打标反馈数据（已经decode_feedback_vectors解码）
+        chunk_size (int): 每条UPDATE语句包含的行数
+        
+    Returns:
+        int: 成功回填的反馈数量
+    """
+    if untagged_df.empty:
+        return 0
+    
+    missing_mask = untagged_df['feedback_vector'].isna()
+    if not missing_mask.any():
+        return 0
+    
+    missing_df = untagged_df[missing_mask]
+    feedback_ids = missing_df['feedback_id'].tolist()
+    
+    # 1. 批量向量化
+    encode_start = time.perf_counter()
+    vectors = generate_embeddings(missing_df['feedback_text'].tolist())
+    encode_elapsed = time.perf_counter() - encode_start
+    
+    if vectors is None:
+        return 0
+    
+    logger.info(f"向量生成完成: {len(vectors)} 条, 耗时 {encode_elapsed:.2f}s, "
+                f"{len(vectors) / max(encode_elapsed, 1e-9):.1f} 条/秒")
+    
+    # 2. 按块写回，每块一条多行UPDATE语句
+    written_count = 0
+    write_start = time.perf_counter()
+    for start in range(0, len(feedback_ids), chunk_size):
+        chunk_ids = feedback_ids[start:start + chunk_size]
+        chunk_vectors = vectors[start:start + chunk_size]
+        
+        case_clause = ' '.join(['WHEN %s THEN %s'] * len(chunk_ids))
+        in_clause = ', '.join(['%s'] * len(chunk_ids))
+        update_sql = f"""
+        UPDATE customer_feedback 
+        SET feedback_vector = CASE feedback_id {case_clause} END, 
+            feedback_vector_bin = CASE feedback_id {case_clause} END 
+        WHERE feedback_id IN ({in_clause})
+        """
+        params = []
+        for feedback_id, feedback_vector in zip(chunk_ids, chunk_vectors):
+            params.extend([feedback_id, to_sql_vector(feedback_vector)])
+        for feedback_id, feedback_vector in zip(chunk_ids, chunk_vectors):
+            params.extend([feedback_id, encode_vector(feedback_vector, VECTOR_CODEC_DTYPE)])
+        params.extend(chunk_ids)
+        
+        try:
+            get_db_client().execute_sql(update_sql, params=params, idempotent=True)
+            written_count += len(chunk_ids)
+        except Exception as e:
+            logger.error(f"批量回填向量失败（{len(chunk_ids)} 条）: {e}")
+    write_elapsed = time.perf_counter() - write_start
+    
+    logger.info(f"向量回填完成: {written_count}/{len(feedback_ids)} 条, 耗时 {write_elapsed:.2f}s, "
+                f"{written_count / max(write_elapsed, 1e-9):.1f} 条/秒")
+    
+    for row_index, vector in zip(untagged_df.index[missing_mask], vectors):
+        untagged_df.at[row_index, 'feedback_vector'] = vector
+    return written_count
+
+
+@timed('get_untagged_feedback')
 def get_untagged_feedback(batch_size=BATCH_SIZE):
     """
-    获取待打标明细，并为没有向量的反馈生成向量
+    获取待打标明细
     对应架构图中的“待打标明细”
     
     Args:
@@ -381,7 +1023,8 @@ def get_untagged_feedback(batch_size=BATCH_SIZE):
     SELECT 
         feedback_id, 
         feedback_text, 
-        feedback_vector
+        feedback_vector, 
+        feedback_vector_bin
     FROM 
         customer_feedback 
     WHERE 
@@ -390,23 +1033,11 @@ def get_untagged_feedback(batch_size=BATCH_SIZE):
     """
     
     try:
-        untagged_df = db_client.query_sql(untagged_sql, params=[batch_size])
+        untagged_df = get_db_client().query_sql(untagged_sql, params=[batch_size])
         logger.info(f"获取到 {len(untagged_df)} 条待打标反馈")
         
-        # 为没有向量的反馈生成向量
-        for index, row in untagged_df.iterrows():
-            if not row['feedback_vector'] or pd.isna(row['feedback_vector']):
-                # 生成向量
-                feedback_vector = generate_embedding(row['feedback_text'])
-                if feedback_vector:
-                    # 更新数据库中的向量
-                    update_sql = """
-                    UPDATE customer_feedback 
-                    SET feedback_vector = %s 
-                    WHERE feedback_id = %s
-                    """
-                    db_client.execute_sql(update_sql, params=[feedback_vector, row['feedback_id']])
-                    logger.info(f"为反馈 {row['feedback_id']} 生成并更新向量")
+        # 解码向量；缺少向量的反馈在流水线的向量化阶段补齐
+        decode_feedback_vectors(untagged_df)
         
         return untagged_df
     except Exception as e:
@@ -414,28 +1045,569 @@ def get_untagged_feedback(batch_size=BATCH_SIZE):
         return pd.DataFrame()
 
 
-def process_feedback_batch():
+def load_tag_watermark(path=TAG_WATERMARK_PATH):
     """
-    处理一批反馈的打标
-    对应架构图中的“自动打标”完整流程
+    读取积压清理水位
+    
+    Args:
+        path (str): 水位文件路径
+        
+    Returns:
+        tuple: (create_time, feedback_id)，文件不存在时返回初始水位
+    """
+    if not os.path.exists(path):
+        return INITIAL_WATERMARK
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            watermark = json.load(f)
+        return watermark['create_time'], watermark['feedback_id']
+    except Exception as e:
+        logger.warning(f"水位文件读取失败，从头开始扫描: {e}")
+        return INITIAL_WATERMARK
+
+
+def save_tag_watermark(watermark, path=TAG_WATERMARK_PATH):
+    """
+    持久化积压清理水位（先写临时文件再原子替换）
+    
+    Args:
+        watermark (tuple): (create_time, feedback_id)
+        path (str): 水位文件路径
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'create_time': watermark[0], 'feedback_id': watermark[1]}, f)
+    os.replace(temp_path, path)
+
+
+def count_untagged_feedback_after(watermark):
     """
-    untagged_df = get_untagged_feedback()
+    统计水位之后的待打标反馈数量，用于估算积压清理进度
     
+    Args:
+        watermark (tuple): (create_time, feedback_id)
+        
+    Returns:
+        int: 待打标反馈数量
+    """
+    count_sql = """
+    SELECT COUNT(*) AS untagged_count 
+    FROM customer_feedback c 
+    WHERE (c.create_time > %s OR (c.create_time = %s AND c.feedback_id > %s))
+        AND NOT EXISTS (SELECT 1 FROM feedback_entity_relation f WHERE f.feedback_id = c.feedback_id)
+    """
+    create_time, feedback_id = watermark
+    return int(get_db_client().query_sql(count_sql, params=[create_time, create_time, feedback_id]).iloc[0]['untagged_count'])
+
+
+@timed('get_untagged_feedback_after')
+def get_untagged_feedback_after(watermark, batch_size=BATCH_SIZE, upper=None):
+    """
+    按 (create_time, feedback_id) 键集分页获取水位之后的待打标明细
+    未打标判断使用按feedback_id索引探测的NOT EXISTS，不随关联表增长而变慢
+    
+    Args:
+        watermark (tuple): (create_time, feedback_id)
+        batch_size (int): 批次大小
+        upper (tuple): 可选的键上界（含），补扫水位之前的反馈时使用
+        
+    Returns:
+        tuple: (未打标的反馈数据, 新水位)；无数据时新水位等于原水位
+    """
+    untagged_sql = """
+    SELECT 
+        c.feedback_id, 
+        c.feedback_text, 
+        c.feedback_vector, 
+        c.feedback_vector_bin, 
+        c.create_time
+    FROM 
+        customer_feedback c 
+    WHERE 
+        (c.create_time > %s OR (c.create_time = %s AND c.feedback_id > %s))
+        AND NOT EXISTS (SELECT 1 FROM feedback_entity_relation f WHERE f.feedback_id = c.feedback_id)
+        {upper_condition}
+    ORDER BY 
+        c.create_time, c.feedback_id
+    LIMIT %s
+    """
+    
+    create_time, feedback_id = watermark
+    params = [create_time, create_time, feedback_id]
+    upper_condition = ''
+    if upper is not None:
+        upper_condition = 'AND (c.create_time < %s OR (c.create_time = %s AND c.feedback_id <= %s))'
+        params += [upper[0], upper[0], upper[1]]
+    untagged_sql = untagged_sql.format(upper_condition=upper_condition)
+    untagged_df = get_db_client().query_sql(untagged_sql, params=params + [batch_size])
     if untagged_df.empty:
-        logger.info("无待打标明细，流程结束")
+        return untagged_df, watermark
+    
+    last_row = untagged_df.iloc[-1]
+    next_watermark = (str(last_row['create_time']), last_row['feedback_id'])
+    
+    # 解码向量；缺少向量的反馈在流水线的向量化阶段补齐
+    decode_feedback_vectors(untagged_df)
+    
+    return untagged_df, next_watermark
+
+
+@timed('claim_feedback_batch')
+def claim_feedback_batch(worker_id, batch_size=BATCH_SIZE, lease_seconds=TAG_LEASE_SECONDS):
+    """
+    通过租约表认领一批待打标反馈
+    1. 选出未打标、且无租约或租约已过期的候选反馈
+    2. 批量写入租约；已被他人持有且未过期的租约保持不变
+    3. 只返回租约确属本进程的反馈
+    候选全部被其他进程抢先认领时，这些反馈已持有未过期租约、不再是候选，重新选取下一片候选；
+    只有没有候选时才返回空，调用方可据此判断积压已清空
+    
+    Args:
+        worker_id (str): 工作进程ID
+        batch_size (int): 批次大小
+        lease_seconds (int): 租约时长（秒）
+        
+    Returns:
+        DataFrame: 本进程认领到的待打标反馈，无候选时为空
+    """
+    while True:
+        candidate_count, claimed_df = claim_feedback_slice(worker_id, batch_size, lease_seconds)
+        if candidate_count == 0 or not claimed_df.empty:
+            return claimed_df
+        logger.info(f"工作进程 {worker_id} 的 {candidate_count} 条候选均被其他进程认领，重新选取候选")
+
+
+def claim_feedback_slice(worker_id, batch_size, lease_seconds):
+    """
+    选取一片候选反馈并尝试认领
+    
+    Args:
+        worker_id (str): 工作进程ID
+        batch_size (int): 批次大小
+        lease_seconds (int): 租约时长（秒）
+        
+    Returns:
+        tuple: (候选数量, 本进程认领到的待打标反馈)
+    """
+    candidate_sql = """
+    SELECT 
+        c.feedback_id
+    FROM 
+        customer_feedback c 
+    LEFT JOIN 
+        feedback_claim_lease l ON l.feedback_id = c.feedback_id
+    WHERE 
+        NOT EXISTS (SELECT 1 FROM feedback_entity_relation f WHERE f.feedback_id = c.feedback_id)
+        AND (l.feedback_id IS NULL OR l.lease_expire_time < NOW())
+    ORDER BY 
+        c.create_time, c.feedback_id
+    LIMIT %s
+    """
+    candidate_df = get_db_client().query_sql(candidate_sql, params=[batch_size])
+    if candidate_df.empty:
+        return 0, pd.DataFrame()
+    
+    candidate_ids = candidate_df['feedback_id'].tolist()
+    
+    # worker_id须先于lease_expire_time赋值，两个IF判断的都是原租约是否过期
+    claim_sql = """
+    INSERT INTO feedback_claim_lease (feedback_id, worker_id, lease_expire_time) 
+    VALUES (%s, %s, NOW() + INTERVAL %s SECOND) 
+    ON DUPLICATE KEY UPDATE 
+        worker_id = IF(lease_expire_time < NOW(), VALUES(worker_id), worker_id),
+        lease_expire_time = IF(lease_expire_time < NOW(), VALUES(lease_expire_time), lease_expire_time)
+    """
+    get_db_client().execute_many([(claim_sql, [(feedback_id, worker_id, lease_seconds) for feedback_id in candidate_ids])],
+                                 idempotent=True)
+    
+    placeholders = ', '.join(['%s'] * len(candidate_ids))
+    claimed_sql = f"""
+    SELECT 
+        c.feedback_id, 
+        c.feedback_text, 
+        c.feedback_vector, 
+        c.feedback_vector_bin
+    FROM 
+        customer_feedback c 
+    JOIN 
+        feedback_claim_lease l ON l.feedback_id = c.feedback_id
+    WHERE 
+        l.worker_id = %s 
+        AND l.lease_expire_time > NOW()
+        AND c.feedback_id IN ({placeholders})
+    """
+    claimed_df = get_db_client().query_sql(claimed_sql, params=[worker_id] + candidate_ids)
+    logger.info(f"工作进程 {worker_id} 认领 {len(claimed_df)}/{len(candidate_ids)} 条待打标反馈")
+    
+    # 解码向量；缺少向量的反馈在流水线的向量化阶段补齐
+    decode_feedback_vectors(claimed_df)
+    
+    return len(candidate_ids), claimed_df
+
+
+def release_feedback_leases(worker_id, feedback_ids):
+    """
+    释放已完成打标的反馈租约
+    未能打标的反馈保留租约，到期后再被重新认领，避免失败反馈被反复立即重试
+    
+    Args:
+        worker_id (str): 工作进程ID
+        feedback_ids (list): 本批反馈ID列表
+    """
+    if not feedback_ids:
         return
+    placeholders = ', '.join(['%s'] * len(feedback_ids))
+    release_sql = f"""
+    DELETE FROM feedback_claim_lease 
+    WHERE worker_id = %s 
+        AND feedback_id IN ({placeholders})
+        AND EXISTS (SELECT 1 FROM feedback_entity_relation f WHERE f.feedback_id = feedback_claim_lease.feedback_id)
+    """
+    get_db_client().execute_sql(release_sql, params=[worker_id] + list(feedback_ids), idempotent=True)
+
+
+class WatermarkFeedbackSource:
+    """
+    单进程数据源：按持久化水位键集分页
+    水位推进到每批最后一行，不论该批反馈是否都打标成功；水位之后没有待打标反馈时，
+    从头补扫一遍水位之前仍未打标的反馈（处理失败、Coze未识别出实体，或create_time
+    并非插入顺序、在水位推进后才写入的行），每行每轮补扫只重试一次；
+    设置retry_interval时（守护进程）每隔该秒数重复补扫，否则只补扫一轮
+    """
     
-    processed_count = 0
+    def __init__(self, batch_size=BATCH_SIZE, retry_interval=None):
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.watermark = load_tag_watermark()
+        self._next_watermark = self.watermark
+        # 补扫游标与上界；游标为None表示未在补扫
+        self._retry_cursor = None
+        self._retry_upper = None
+        self._retry_done = False
+        self._next_retry_time = 0.0
+    
+    def describe(self):
+        if self._retry_cursor is not None:
+            return f"水位 {self.watermark}, 补扫至 {self._retry_cursor}"
+        return f"水位 {self.watermark}"
+    
+    def count_backlog(self):
+        return count_untagged_feedback_after(self.watermark)
+    
+    def retry_due(self):
+        """是否应开始一轮补扫"""
+        if self.retry_interval is None:
+            return not self._retry_done
+        return time.monotonic() >= self._next_retry_time
+    
+    def fetch(self):
+        if self._retry_cursor is None:
+            untagged_df, self._next_watermark = get_untagged_feedback_after(self.watermark, self.batch_size)
+            if not untagged_df.empty or not self.retry_due():
+                return untagged_df
+            self._retry_cursor = INITIAL_WATERMARK
+            self._retry_upper = self.watermark
+            logger.info(f"开始补扫水位 {self.watermark} 之前未打标的反馈")
+        
+        untagged_df, self._next_watermark = get_untagged_feedback_after(
+            self._retry_cursor, self.batch_size, upper=self._retry_upper)
+        if untagged_df.empty:
+            logger.info("补扫完成")
+            self._retry_cursor = None
+            self._retry_done = True
+            if self.retry_interval is not None:
+                self._next_retry_time = time.monotonic() + self.retry_interval
+        return untagged_df
+    
+    def commit(self, untagged_df):
+        if self._retry_cursor is not None:
+            self._retry_cursor = self._next_watermark
+            return
+        self.watermark = self._next_watermark
+        save_tag_watermark(self.watermark)
+
+
+class LeaseFeedbackSource:
+    """
+    多工作进程数据源：通过租约表认领互不重叠的反馈
+    """
+    
+    def __init__(self, worker_id=TAG_WORKER_ID, batch_size=BATCH_SIZE, lease_seconds=TAG_LEASE_SECONDS):
+        self.worker_id = worker_id
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+    
+    def describe(self):
+        return f"工作进程 {self.worker_id}"
+    
+    def count_backlog(self):
+        count_sql = """
+        SELECT COUNT(*) AS untagged_count 
+        FROM customer_feedback c 
+        WHERE NOT EXISTS (SELECT 1 FROM feedback_entity_relation f WHERE f.feedback_id = c.feedback_id)
+        """
+        return int(get_db_client().query_sql(count_sql).iloc[0]['untagged_count'])
+    
+    def fetch(self):
+        return claim_feedback_batch(self.worker_id, self.batch_size, self.lease_seconds)
+    
+    def commit(self, untagged_df):
+        release_feedback_leases(self.worker_id, untagged_df['feedback_id'].tolist())
+
+
+def drain_backlog(source):
+    """
+    积压清理模式：从数据源逐批处理，直到没有待打标反馈
+    每批处理完成后提交进度（推进水位或释放租约），中断后可从断点继续；
+    水位数据源在水位之后清理完后，再补扫一轮水位之前仍未打标的反馈
+    
+    Args:
+        source (WatermarkFeedbackSource|LeaseFeedbackSource): 待打标反馈数据源
+        
+    Returns:
+        int: 本次处理的反馈数量
+    """
+    backlog_count = source.count_backlog()
+    logger.info(f"积压清理开始: {source.describe()}, 待打标反馈约 {backlog_count} 条")
+    
+    drained_count = 0
+    start = time.perf_counter()
+    
+    while True:
+        untagged_df = source.fetch()
+        if untagged_df.empty:
+            break
+        
+        logger.info(f"获取到 {len(untagged_df)} 条待打标反馈")
+        process_feedback_batch(untagged_df)
+        
+        source.commit(untagged_df)
+        drained_count += len(untagged_df)
+        
+        # 进度与预计剩余时间
+        elapsed = time.perf_counter() - start
+        rate = drained_count / max(elapsed, 1e-9)
+        remaining = max(backlog_count - drained_count, 0)
+        eta = remaining / rate if rate > 0 else 0
+        logger.info(f"积压清理进度: {drained_count}/{backlog_count}, 速率 {rate:.1f} 条/秒, "
+                    f"预计剩余 {eta:.0f}s, {source.describe()}")
+    
+    elapsed = time.perf_counter() - start
+    logger.info(f"积压清理完成: 共处理 {drained_count} 条, 耗时 {elapsed:.1f}s")
+    return drained_count
+
+
+def acquire_daemon_lock(path=DAEMON_LOCK_PATH):
+    """
+    获取守护进程单实例文件锁，防止多个守护进程（或误配置的定时任务）同时运行
+    
+    Args:
+        path (str): 锁文件路径
+        
+    Returns:
+        file: 持有锁的文件对象，获取失败时返回None；平台不支持时返回True
+    """
+    if fcntl is None:
+        return True
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    lock_file = open(path, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+
+def run_daemon(source, lock_path=DAEMON_LOCK_PATH):
+    """
+    守护进程模式：模型与数据库连接常驻，持续轮询新反馈
+    - 有积压（拉满一批）时不等待，立即处理下一批
+    - 无新反馈时轮询间隔指数退避，直到DAEMON_MAX_POLL_INTERVAL
+    - 每次只拉取一批，峰值流量留在数据库中按处理能力消化，不在内存中堆积
+    - 收到SIGTERM/SIGINT后处理完当前批次并写入缓冲区后退出
+    - 批次失败时不提交进度；水位数据源每隔TAG_RETRY_INTERVAL秒补扫水位之前未打标的反馈，
+      故障期间被越过的反馈在恢复后重新打标
+    
+    Args:
+        source (WatermarkFeedbackSource|LeaseFeedbackSource): 待打标反馈数据源
+        lock_path (str): 单实例锁文件路径
+    """
+    lock = acquire_daemon_lock(lock_path)
+    if lock is None:
+        logger.error(f"已有守护进程在运行（锁文件 {lock_path}），本进程退出")
+        return
+    
+    stop_event = threading.Event()
+    
+    def handle_stop_signal(signum, frame):
+        logger.info(f"收到信号 {signum}，处理完当前批次后退出")
+        stop_event.set()
+    
+    signal.signal(signal.SIGTERM, handle_stop_signal)
+    signal.signal(signal.SIGINT, handle_stop_signal)
+    
+    poll_interval = DAEMON_MIN_POLL_INTERVAL
+    logger.info(f"守护进程启动: {source.describe()}, 批次大小 {source.batch_size}")
+    
+    while not stop_event.is_set():
+        try:
+            untagged_df = source.fetch()
+        except Exception as e:
+            logger.error(f"获取待打标反馈失败: {e}")
+            untagged_df = pd.DataFrame()
+        
+        if not untagged_df.empty:
+            try:
+                process_feedback_batch(untagged_df)
+            except Exception as e:
+                # 不提交进度，退避后重新获取同一批反馈
+                logger.error(f"批次处理失败，未提交进度: {e}")
+                poll_interval = min(poll_interval * 2, DAEMON_MAX_POLL_INTERVAL)
+                stop_event.wait(poll_interval)
+                continue
+            source.commit(untagged_df)
+            poll_interval = DAEMON_MIN_POLL_INTERVAL
+            
+            if len(untagged_df) >= source.batch_size:
+                # 仍有积压，立即处理下一批
+                continue
+        else:
+            poll_interval = min(poll_interval * 2, DAEMON_MAX_POLL_INTERVAL)
+        
+        # 空闲时缓冲区不会再被批次结束刷新，这里保证写入
+        get_relation_writer().close()
+        stop_event.wait(poll_interval)
+    
+    get_relation_writer().close()
+    logger.info(f"守护进程已停止: {source.describe()}")
+
+
+def write_coze_entities(feedback_ids, coze_entities):
+    """
+    将Coze识别的实体沉淀到标签向量库，并为每条反馈写入打标结果和重新打标明细
+    
+    Args:
+        feedback_ids (list): 反馈ID列表（同一簇的所有成员）
+        coze_entities (list): Coze识别的实体列表
+        
+    Returns:
+        int: 成功打标的（反馈, 实体）数量
+    """
     success_count = 0
-    coze_trigger_count = 0
+    for entity in coze_entities or []:
+        entity_id, coze_confidence = insert_entity_to_seekdb(entity)
+        if entity_id:
+            for feedback_id in feedback_ids:
+                write_tag_result(feedback_id, entity_id, coze_confidence)
+                write_re_tag_detail(feedback_id, entity_id, coze_confidence)
+                success_count += 1
+    return success_count
+
+
+class LowConfidenceClusterer:
+    """
+    低置信度反馈的增量近似去重聚类（贪心选取簇中心）
+    按到达顺序逐条归入第一个余弦相似度不低于阈值的簇中心，否则自成新簇；
+    与对整批反馈一次性贪心聚类的结果相同，流水线中可边到达边提交Coze
+    """
+    
+    def __init__(self, similarity_threshold=COZE_CLUSTER_SIMILARITY, enabled=COZE_CLUSTER_ENABLED):
+        self.similarity_threshold = similarity_threshold
+        self.enabled = enabled
+        self.cluster_count = 0
+        self._centers = np.zeros((0, EMBEDDING_DIMENSION), dtype=np.float32)
+        self._center_clusters = []
+    
+    def assign(self, feedback_vector):
+        """
+        为一条低置信度反馈分配簇
+        
+        Args:
+            feedback_vector (ndarray): 反馈向量，无向量的反馈各自成簇
+            
+        Returns:
+            tuple: (簇编号, 是否为新簇)
+        """
+        vector = feedback_vector
+        has_vector = (self.enabled and vector is not None and vector.shape[0] == EMBEDDING_DIMENSION
+                      and np.linalg.norm(vector) > 0)
+        if has_vector:
+            vector = vector / np.linalg.norm(vector)
+            if len(self._center_clusters) > 0:
+                matched = np.flatnonzero(self._centers @ vector >= self.similarity_threshold)
+                if matched.size > 0:
+                    return self._center_clusters[matched[0]], False
+        
+        cluster_id = self.cluster_count
+        self.cluster_count += 1
+        if has_vector:
+            self._centers = np.vstack([self._centers, vector[None, :].astype(np.float32)])
+            self._center_clusters.append(cluster_id)
+        return cluster_id, True
+
+
+def iter_feedback_chunks(untagged_df, chunk_size=PIPELINE_CHUNK_SIZE):
+    """
+    流水线的数据源阶段：未传入数据时从数据库获取一批待打标反馈，按块切分
     
-    for _, row in untagged_df.iterrows():
-        feedback_id = row['feedback_id']
-        feedback_text = row['feedback_text']
+    Args:
+        untagged_df (DataFrame): 待打标反馈数据，为None时调用get_untagged_feedback获取
+        chunk_size (int): 每块反馈数
         
+    Yields:
+        DataFrame: 反馈数据块
+    """
+    if untagged_df is None:
+        untagged_df = get_untagged_feedback()
+    for start in range(0, len(untagged_df), chunk_size):
+        yield untagged_df.iloc[start:start + chunk_size].copy()
+
+
+def embed_feedback_chunk(chunk_df):
+    """
+    流水线的向量化阶段：为缺少向量的反馈生成向量并写回数据库
+    
+    Args:
+        chunk_df (DataFrame): 反馈数据块
+        
+    Returns:
+        DataFrame: 向量补齐后的数据块
+    """
+    backfill_feedback_vectors(chunk_df)
+    return chunk_df
+
+
+def match_feedback_chunk(chunk_df):
+    """
+    流水线的向量匹配阶段：整块匹配实体并按置信度分流
+    
+    Args:
+        chunk_df (DataFrame): 向量补齐后的反馈数据块
+        
+    Returns:
+        dict: 高置信度打标结果、低置信度反馈及已处理数量
+    """
+    batch_matches = match_feedback_batch(chunk_df)
+    
+    high_confidence_items = []
+    low_confidence_items = []
+    processed_count = 0
+    
+    for feedback_id, feedback_text, feedback_vector in zip(
+        chunk_df['feedback_id'], chunk_df['feedback_text'], chunk_df['feedback_vector']
+    ):
         try:
             # 1. SeekDB匹配打标
-            match_result = seekdb_match_entity(feedback_id)
+            match_result = batch_matches.get(feedback_id, [])
             
             if match_result:
                 # 2. 判断置信度
@@ -444,36 +1616,15 @@ def process_feedback_batch():
                 if max_confidence >= CONFIDENCE_THRESHOLD:
                     # 高置信度：直接打标
                     best_match = [item for item in match_result if item['match_confidence'] == max_confidence][0]
-                    write_tag_result(feedback_id, best_match['entity_id'], best_match['match_confidence'])
-                    success_count += 1
+                    high_confidence_items.append((feedback_id, best_match['entity_id'], best_match['match_confidence']))
                 else:
                     # 低置信度：触发Coze智能Agent
                     logger.info(f"反馈 {feedback_id} 置信度不足 ({max_confidence:.2f})，触发智能Agent")
-                    coze_entities = invoke_coze_entity_recognize(feedback_text)
-                    coze_trigger_count += 1
-                    
-                    if coze_entities:
-                        # 写入新实体并打标
-                        for entity in coze_entities:
-                            entity_id, coze_confidence = insert_entity_to_seekdb(entity)
-                            if entity_id:
-                                write_tag_result(feedback_id, entity_id, coze_confidence)
-                                write_re_tag_detail(feedback_id, entity_id, coze_confidence)
-                                success_count += 1
+                    low_confidence_items.append((feedback_id, feedback_text, feedback_vector))
             else:
                 # 无匹配结果：触发Coze智能Agent
                 logger.info(f"反馈 {feedback_id} 无匹配标签，触发智能Agent")
-                coze_entities = invoke_coze_entity_recognize(feedback_text)
-                coze_trigger_count += 1
-                
-                if coze_entities:
-                    # 写入新实体并打标
-                    for entity in coze_entities:
-                        entity_id, coze_confidence = insert_entity_to_seekdb(entity)
-                        if entity_id:
-                            write_tag_result(feedback_id, entity_id, coze_confidence)
-                            write_re_tag_detail(feedback_id, entity_id, coze_confidence)
-                            success_count += 1
+                low_confidence_items.append((feedback_id, feedback_text, feedback_vector))
             
             processed_count += 1
             
@@ -481,25 +1632,278 @@ def process_feedback_batch():
             logger.error(f"处理反馈 {feedback_id} 时发生错误: {e}")
             continue
     
+    return {
+        'processed': processed_count,
+        'high_confidence': high_confidence_items,
+        'low_confidence': low_confidence_items
+    }
+
+
+def make_agent_stage(clusterer, coze_executor):
+    """
+    创建流水线的智能Agent阶段：低置信度反馈增量聚类，每个新簇的代表反馈立即提交Coze（并发、限流），
+    同簇成员共享该次调用的识别结果
+    
+    Args:
+        clusterer (LowConfidenceClusterer): 本批次共用的聚类器
+        coze_executor (ThreadPoolExecutor): Coze调用线程池
+        
+    Returns:
+        callable: 阶段处理函数（须按数据块顺序执行）
+    """
+    cluster_futures = {}
+    
+    def agent_stage(chunk_result):
+        members = {}
+        for feedback_id, feedback_text, feedback_vector in chunk_result['low_confidence']:
+            cluster_id, is_new = clusterer.assign(feedback_vector)
+            if is_new:
+                cluster_futures[cluster_id] = coze_executor.submit(recognize_entities_cached, feedback_text)
+            members.setdefault(cluster_id, []).append(feedback_id)
+        
+        chunk_result['coze'] = [(member_ids, cluster_futures[cluster_id]) for cluster_id, member_ids in members.items()]
+        return chunk_result
+    
+    return agent_stage
+
+
+def write_feedback_chunk(chunk_result):
+    """
+    流水线的结果写入阶段：写入高置信度打标结果，等待Coze识别结果并沉淀新实体、扇出打标
+    本块的打标结果作为一组并入缓冲写入器，自动刷新不会只写入某条反馈的部分行
+    
+    Args:
+        chunk_result (dict): 智能Agent阶段的输出
+        
+    Returns:
+        dict: 本块统计（已处理、成功、Coze触发）
+    """
+    success_count = 0
+    with get_relation_writer().group():
+        for feedback_id, entity_id, match_confidence in chunk_result['high_confidence']:
+            write_tag_result(feedback_id, entity_id, match_confidence)
+            success_count += 1
+        
+        for member_ids, future in chunk_result['coze']:
+            try:
+                success_count += write_coze_entities(member_ids, future.result())
+            except Exception as e:
+                logger.error(f"处理反馈 {member_ids[0]} 的Coze识别结果时发生错误: {e}")
+    
+    return {
+        'processed': chunk_result['processed'],
+        'success': success_count,
+        'coze_triggered': len(chunk_result['low_confidence'])
+    }
+
+
+BATCHES_TOTAL = REGISTRY.counter('tagger_batches_total', "已处理批次数")
+FEEDBACK_PROCESSED_TOTAL = REGISTRY.counter('tagger_feedback_processed_total', "已处理反馈数")
+FEEDBACK_TAGGED_TOTAL = REGISTRY.counter('tagger_feedback_tagged_total', "打标成功的反馈数")
+COZE_TRIGGERED_TOTAL = REGISTRY.counter('tagger_coze_triggered_total', "触发智能Agent识别的低置信度反馈数")
+COZE_CALLS_TOTAL = REGISTRY.counter('tagger_coze_clusters_total', "低置信度反馈聚类后的Coze调用数（含缓存命中）")
+
+
+def log_batch_summary(batch_stats, pipeline, elapsed):
+    """
+    输出本批次的JSON指标汇总：批次统计、各阶段利用率、各函数自上一批次以来的调用次数与延迟分位数
+    配置METRICS_SUMMARY_PATH时同时追加写入该文件（每行一个批次）
+    
+    Args:
+        batch_stats (dict): 批次统计
+        pipeline (StagedPipeline): 本批次的流水线
+        elapsed (float): 批次总耗时（秒）
+    """
+    summary = {
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'elapsed_seconds': round(elapsed, 3),
+        'feedback_per_second': round(batch_stats['processed'] / max(elapsed, 1e-9), 1),
+        **batch_stats,
+        'stages': pipeline.stats(),
+        **REGISTRY.summary(delta=True)
+    }
+    line = json.dumps(summary, ensure_ascii=False)
+    logger.info(f"批次指标汇总: {line}")
+    
+    if METRICS_SUMMARY_PATH:
+        try:
+            directory = os.path.dirname(METRICS_SUMMARY_PATH)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(METRICS_SUMMARY_PATH, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            logger.warning(f"批次指标汇总写入失败: {e}")
+
+
+def process_feedback_batch(untagged_df=None):
+    """
+    处理一批反馈的打标
+    对应架构图中的“自动打标”完整流程，按块流经 读取 → 向量化 → 向量匹配 → 智能Agent → 结果写入 五个阶段，
+    阶段之间以有界队列衔接，编码、网络等待与数据库写入互相重叠
+    
+    Args:
+        untagged_df (DataFrame): 待打标反馈数据，为None时调用get_untagged_feedback获取
+        
+    Returns:
+        dict: 批次统计（总处理、成功、Coze触发）
+    """
+    if untagged_df is not None and untagged_df.empty:
+        logger.info("无待打标明细，流程结束")
+        return {'processed': 0, 'success': 0, 'coze_triggered': 0}
+    
+    refresh_entity_caches()
+    batch_start = time.perf_counter()
+    if batch_profiler is not None:
+        batch_profiler.start()
+    
+    clusterer = LowConfidenceClusterer()
+    try:
+        with ThreadPoolExecutor(max_workers=COZE_MAX_CONCURRENCY) as coze_executor:
+            pipeline = StagedPipeline([
+                PipelineStage('embed', embed_feedback_chunk, PIPELINE_EMBED_WORKERS),
+                PipelineStage('match', match_feedback_chunk, PIPELINE_MATCH_WORKERS),
+                # 聚类须按反馈顺序进行，结果才与整批聚类一致
+                PipelineStage('agent', make_agent_stage(clusterer, coze_executor), ordered=True),
+                PipelineStage('write', write_feedback_chunk, PIPELINE_WRITE_WORKERS),
+            ], queue_size=PIPELINE_QUEUE_SIZE, profile=batch_profiler is not None)
+            chunk_stats = pipeline.run(iter_feedback_chunks(untagged_df))
+        
+        # 批次结束，写入缓冲区中的全部打标结果；失败时整批视为失败，调用方不提交进度
+        get_relation_writer().flush()
+    except Exception:
+        # 未提交进度的批次会被重新获取并重新生成打标结果，丢弃缓冲行避免重复写入
+        get_relation_writer().discard()
+        raise
+    
+    processed_count = sum(stats['processed'] for stats in chunk_stats)
+    success_count = sum(stats['success'] for stats in chunk_stats)
+    coze_trigger_count = sum(stats['coze_triggered'] for stats in chunk_stats)
+    
+    if pipeline.source_items == 0:
+        if batch_profiler is not None:
+            batch_profiler.stop(pipeline.profiles)
+        logger.info("无待打标明细，流程结束")
+        return {'processed': 0, 'success': 0, 'coze_triggered': 0}
+    
+    if batch_profiler is not None:
+        batch_profiler.stop(pipeline.profiles)
+    
+    BATCHES_TOTAL.inc()
+    FEEDBACK_PROCESSED_TOTAL.inc(processed_count)
+    FEEDBACK_TAGGED_TOTAL.inc(success_count)
+    COZE_TRIGGERED_TOTAL.inc(coze_trigger_count)
+    COZE_CALLS_TOTAL.inc(clusterer.cluster_count)
+    
     # 记录批次处理结果
-    logger.info(f"批次处理完成 - 总处理: {processed_count}, 成功: {success_count}, Coze触发: {coze_trigger_count}")
+    if COZE_CLUSTER_ENABLED and coze_trigger_count:
+        logger.info(f"低置信度反馈聚类: {coze_trigger_count} 条反馈归为 {clusterer.cluster_count} 簇, "
+                    f"节省Coze调用 {coze_trigger_count - clusterer.cluster_count} 次")
+    logger.info(f"批次处理完成 - 总处理: {processed_count}, 成功: {success_count}, Coze触发: {coze_trigger_count}, "
+                f"Coze实际调用: {clusterer.cluster_count}")
+    pipeline.log_stats()
+    if coze_cache is not None:
+        try:
+            coze_cache.flush()
+        except Exception as e:
+            logger.warning(f"Coze识别结果缓存访问时间写入失败: {e}")
+        logger.info(f"Coze识别结果缓存: {coze_cache.stats()}")
+    if isinstance(embedding_model, LengthBucketedBackend):
+        embedding_model.log_stats()
+    
+    batch_stats = {'processed': processed_count, 'success': success_count, 'coze_triggered': coze_trigger_count}
+    log_batch_summary(batch_stats, pipeline, time.perf_counter() - batch_start)
+    return batch_stats
+
+
+record_step("模块导入", time.perf_counter() - _IMPORT_START)
 
 
 # ---------------------- 主函数 ----------------------
 
+def parse_args():
+    """
+    解析命令行参数
+    """
+    parser = argparse.ArgumentParser(description="客服反馈自动打标")
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument('--drain', action='store_true',
+                            help="积压清理模式：按水位键集分页持续处理，直到没有待打标反馈")
+    mode_group.add_argument('--daemon', action='store_true',
+                            help="守护进程模式：常驻并轮询新反馈，收到SIGTERM后优雅退出")
+    parser.add_argument('--worker', action='store_true',
+                        help="多工作进程模式：与 --drain/--daemon 配合，通过租约表认领反馈，可多进程/多机并行")
+    parser.add_argument('--profile', action='store_true',
+                        help=f"性能剖析：每批次输出cProfile（含流水线工作线程）与tracemalloc报告到 {PROFILE_DIR}")
+    return parser.parse_args()
+
+
 def main():
     """
     主函数
     """
+    global batch_profiler
+    
+    args = parse_args()
     logger.info("===== 客服反馈自动打标系统启动 =====")
     
+    if METRICS_PORT:
+        try:
+            start_metrics_server(METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logger.warning(f"指标端点启动失败: {e}")
+    if args.profile:
+        batch_profiler = BatchProfiler(PROFILE_DIR)
+        logger.info(f"性能剖析已开启，报告输出到 {PROFILE_DIR}")
+    
     try:
-        process_feedback_batch()
+        get_db_client()
+    except Exception as e:
+        logger.error(f"数据库客户端初始化失败: {e}")
+        sys.exit(1)
+    
+    try:
+        with timed_step("实体ID目录预热"):
+            entity_directory.warm(get_db_client())
+    except Exception as e:
+        logger.warning(f"实体ID目录预热失败，将按需查询数据库: {e}")
+    
+    # 向量模型等资源在首次使用时加载，加载耗时单独记录
+    log_startup_report()
+    
+    try:
+        if args.worker:
+            source = LeaseFeedbackSource()
+            lock_path = f"{DAEMON_LOCK_PATH}.{source.worker_id}"
+        else:
+            source = WatermarkFeedbackSource(retry_interval=TAG_RETRY_INTERVAL if args.daemon else None)
+            lock_path = DAEMON_LOCK_PATH
+        
+        if args.drain:
+            drain_backlog(source)
+        elif args.daemon:
+            run_daemon(source, lock_path)
+        elif args.worker:
+            untagged_df = source.fetch()
+            process_feedback_batch(untagged_df)
+            if not untagged_df.empty:
+                source.commit(untagged_df)
+        else:
+            process_feedback_batch()
     except KeyboardInterrupt:
         logger.info("程序被用户中断")
     except Exception as e:
         logger.error(f"程序运行出错: {e}")
     finally:
+        if relation_writer is not None:
+            relation_writer.close()
+        if EMBEDDING_CACHE_PATH and embedding_cache is not None:
+            try:
+                embedding_cache.save()
+            except Exception as e:
+                logger.warning(f"向量缓存保存失败: {e}")
+        if coze_cache is not None:
+            coze_cache.close()
         logger.info("===== 客服反馈自动打标系统结束 =====")
 
 
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+自动打标性能基准脚本
+用于对比优化前后各环节的耗时，需连接真实的SeekDB数据库运行
+"""
+
+import os
+import sys
+import time
+import logging
+import numpy as np
+from dotenv import load_dotenv
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 导入需要测试的函数
+import auto_tag_feedback_loop as tagger
+from embedding_backend import create_embedding_backend
+from length_bucketing import LengthBucketedBackend, padding_efficiency
+from vector_codec import decode_vector, encode_vector, to_sql_vector
+
+
+def best_entity_id(match_result):
+    """
+    按process_feedback_batch的置信度逻辑取最佳匹配实体
+
+    Args:
+        match_result (list): 匹配结果列表
+
+    Returns:
+        tuple: (entity_id, 是否达到置信度阈值)，无匹配时返回 (None, False)
+    """
+    if not match_result:
+        return None, False
+    max_confidence = max(item['match_confidence'] for item in match_result)
+    best_match = [item for item in match_result if item['match_confidence'] == max_confidence][0]
+    return best_match['entity_id'], max_confidence >= tagger.CONFIDENCE_THRESHOLD
+
+
+def benchmark_matching(batch_size=tagger.BATCH_SIZE):
+    """
+    对比逐条SQL检索与整批矩阵匹配的耗时，并校验两者的打标决策是否一致
+
+    Args:
+        batch_size (int): 参与测试的反馈数
+    """
+    logger.info("开始测试实体匹配性能")
+
+    untagged_df = tagger.get_untagged_feedback(batch_size)
+    if untagged_df.empty:
+        logger.warning("无待打标反馈，无法测试实体匹配性能")
+        return
+    tagger.backfill_feedback_vectors(untagged_df)
+
+    # 1. 逐条SQL检索（原有路径）
+    row_start = time.perf_counter()
+    row_matches = {}
+    for feedback_id, feedback_text, feedback_vector in zip(
+        untagged_df['feedback_id'], untagged_df['feedback_text'], untagged_df['feedback_vector']
+    ):
+        try:
+            row_matches[feedback_id] = tagger.seekdb_match_entity_sql(feedback_text, feedback_vector)
+        except Exception as e:
+            logger.warning(f"反馈 {feedback_id} 逐条检索失败: {e}")
+            row_matches[feedback_id] = []
+    row_elapsed = time.perf_counter() - row_start
+
+    # 2. 整批矩阵匹配（首次调用包含索引加载，单独计时）
+    load_start = time.perf_counter()
+    tagger.get_entity_index()
+    load_elapsed = time.perf_counter() - load_start
+
+    batch_start = time.perf_counter()
+    batch_matches = tagger.match_feedback_batch(untagged_df)
+    batch_elapsed = time.perf_counter() - batch_start
+
+    # 3. 校验打标决策一致性
+    mismatch_count = 0
+    for feedback_id in untagged_df['feedback_id']:
+        if best_entity_id(row_matches[feedback_id]) != best_entity_id(batch_matches.get(feedback_id, [])):
+            mismatch_count += 1
+
+    total = len(untagged_df)
+    logger.info(f"反馈数: {total}")
+    logger.info(f"逐条SQL检索: {row_elapsed:.3f}s, {total / max(row_elapsed, 1e-9):.1f} 条/秒")
+    logger.info(f"实体索引加载: {load_elapsed:.3f}s")
+    logger.info(f"整批矩阵匹配: {batch_elapsed:.3f}s, {total / max(batch_elapsed, 1e-9):.1f} 条/秒")
+    logger.info(f"打标决策不一致: {mismatch_count} 条")
+
+
+def benchmark_vector_serialization(sample_size=1000):
+    """
+    对比逗号拼接文本与二进制编码两种向量序列化方式的耗时和体积
+
+    Args:
+        sample_size (int): 参与测试的向量数
+    """
+    logger.info("开始测试向量序列化性能")
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((sample_size, tagger.EMBEDDING_DIMENSION)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def timed(function, items):
+        start = time.perf_counter()
+        results = [function(item) for item in items]
+        return results, (time.perf_counter() - start) / len(items) * 1e6
+
+    # 1. 原有方式：逐元素格式化拼接，读取时split后逐个转float
+    texts, text_encode_us = timed(lambda vector: ','.join(map(str, vector.tolist())), vectors)
+    _, text_decode_us = timed(lambda text: np.array([float(x) for x in text.split(',')], dtype=np.float32), texts)
+    text_bytes = sum(len(text) for text in texts) / sample_size
+
+    # 2. SQL边界的VECTOR文本字面量
+    _, literal_encode_us = timed(to_sql_vector, vectors)
+
+    # 3. 二进制编码
+    for dtype in ('float32', 'float16'):
+        buffers, binary_encode_us = timed(lambda vector: encode_vector(vector, dtype), vectors)
+        decoded, binary_decode_us = timed(
+            lambda buffer: decode_vector(buffer, tagger.EMBEDDING_DIMENSION), buffers
+        )
+        max_error = float(np.max(np.abs(np.vstack(decoded) - vectors)))
+        logger.info(f"二进制({dtype}): 编码 {binary_encode_us:.1f}us/条, 解码 {binary_decode_us:.1f}us/条, "
+                    f"{len(buffers[0])} 字节/条, 最大误差 {max_error:.2e}")
+
+    logger.info(f"逗号拼接文本: 编码 {text_encode_us:.1f}us/条, 解码 {text_decode_us:.1f}us/条, "
+                f"{text_bytes:.0f} 字节/条")
+    logger.info(f"VECTOR文本字面量: 编码 {literal_encode_us:.1f}us/条")
+
+
+def benchmark_embedding_backends(sample_size=1000, batch_size=tagger.EMBEDDING_BATCH_SIZE):
+    """
+    对比各向量生成后端的吞吐量，并以PyTorch后端为基准计算向量的余弦一致性
+
+    Args:
+        sample_size (int): 参与测试的反馈文本数
+        batch_size (int): 每次前向计算的文本数
+    """
+    logger.info("开始测试向量生成后端性能")
+
+    sample_df = tagger.get_db_client().query_sql(
+        "SELECT feedback_text FROM customer_feedback LIMIT %s", params=[sample_size]
+    )
+    if sample_df.empty:
+        logger.warning("无反馈数据，无法测试向量生成后端性能")
+        return
+    texts = sample_df['feedback_text'].tolist()
+
+    backend_configs = [
+        ('torch', {}),
+        ('onnx', {'quantize': False}),
+        ('onnx', {'quantize': True}),
+    ]
+
+    reference = None
+    reference_name = None
+    for backend_name, options in backend_configs:
+        try:
+            backend = create_embedding_backend(
+                backend_name, tagger.EMBEDDING_MODEL, onnx_dir=tagger.EMBEDDING_ONNX_DIR,
+                num_threads=tagger.EMBEDDING_ONNX_THREADS, **options
+            )
+        except Exception as e:
+            logger.warning(f"向量生成后端 {backend_name}{options} 初始化失败，跳过: {e}")
+            continue
+
+        # 预热一次，排除首批的图优化和内存分配开销
+        backend.encode(texts[:batch_size], batch_size=batch_size)
+
+        start = time.perf_counter()
+        embeddings = backend.encode(texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+
+        message = f"{backend.name}: {len(texts) / max(elapsed, 1e-9):.1f} 条/秒"
+        if reference is None:
+            reference, reference_name = embeddings, backend.name
+        else:
+            # 两个后端的输出均已归一化，逐行点积即余弦相似度
+            cosine = np.sum(reference * embeddings, axis=1)
+            message += f", 与{reference_name}余弦一致性 均值 {cosine.mean():.5f} / 最小 {cosine.min():.5f}"
+        logger.info(message)
+
+
+def benchmark_length_bucketing(sample_size=1000, batch_size=tagger.EMBEDDING_BATCH_SIZE):
+    """
+    对比按原始顺序编码与按token长度分桶编码的填充效率和吞吐量
+
+    Args:
+        sample_size (int): 参与测试的反馈文本数
+        batch_size (int): 每次前向计算的文本数
+    """
+    logger.info("开始测试长度分桶编码性能")
+
+    sample_df = tagger.get_db_client().query_sql(
+        "SELECT feedback_text FROM customer_feedback LIMIT %s", params=[sample_size]
+    )
+    if sample_df.empty:
+        logger.warning("无反馈数据，无法测试长度分桶编码性能")
+        return
+    texts = sample_df['feedback_text'].tolist()
+
+    backend = create_embedding_backend(
+        tagger.EMBEDDING_BACKEND, tagger.EMBEDDING_MODEL, onnx_dir=tagger.EMBEDDING_ONNX_DIR,
+        quantize=tagger.EMBEDDING_ONNX_QUANTIZE, max_seq_length=tagger.EMBEDDING_MAX_TOKENS,
+        num_threads=tagger.EMBEDDING_ONNX_THREADS
+    )
+    bucketed = LengthBucketedBackend(backend, tagger.EMBEDDING_MAX_TOKENS, tagger.EMBEDDING_TRUNCATION)
+    backend.encode(texts[:batch_size], batch_size=batch_size)
+
+    lengths = np.minimum(bucketed.token_lengths(texts), tagger.EMBEDDING_MAX_TOKENS)
+    for label, encoder, order in (
+        ('原始顺序', backend, np.arange(len(lengths))),
+        ('长度分桶', bucketed, np.argsort(lengths, kind='stable')),
+    ):
+        start = time.perf_counter()
+        encoder.encode(texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        real_tokens, padded_tokens = padding_efficiency(lengths[order], batch_size)
+        logger.info(f"{label}: {len(texts) / max(elapsed, 1e-9):.1f} 条/秒, "
+                    f"填充效率 {real_tokens / max(padded_tokens, 1):.1%}")
+    bucketed.log_stats()
+
+
+def main():
+    """
+    主函数
+    """
+    logger.info("===== 自动打标性能测试开始 =====")
+
+    benchmark_vector_serialization()
+    benchmark_embedding_backends()
+    benchmark_length_bucketing()
+    benchmark_matching()
+
+    logger.info("===== 自动打标性能测试结束 =====")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Coze实体识别结果持久化缓存
+- 以 (Agent命名空间, 归一化反馈文本) 的哈希为键，结果存放在本地SQLite文件中；
+  更换Agent或其提示词（命名空间变化）后旧结果不再命中
+- LRU + TTL淘汰，记录命中/未命中次数
+- 命中时的访问时间先记在内存中，写入、刷新、关闭或累计到一定数量时批量落盘，
+  命中路径不做磁盘提交，并发的Coze工作线程不会在同步写盘上串行
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+def normalize_feedback_text(text):
+    """
+    归一化反馈文本：全半角统一、转小写、合并空白
+
+    Args:
+        text (str): 反馈文本
+
+    Returns:
+        str: 归一化后的文本
+    """
+    text = unicodedata.normalize('NFKC', text or '')
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+class CozeResultCache:
+    """
+    基于SQLite的Coze实体识别结果缓存
+    """
+
+    # 内存中累计的访问时间达到该数量时批量落盘
+    TOUCH_FLUSH_THRESHOLD = 1000
+
+    def __init__(self, path, max_entries=100000, ttl_seconds=7 * 24 * 3600, namespace=''):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 尚未落盘的访问时间：cache_key -> last_access
+        self._touches = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS coze_result_cache (
+            cache_key TEXT PRIMARY KEY,
+            entities TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON coze_result_cache (last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM coze_result_cache").fetchone()[0]
+
+    def make_key(self, feedback_text):
+        """
+        生成缓存键
+
+        Args:
+            feedback_text (str): 反馈文本
+
+        Returns:
+            str: 命名空间与归一化文本的SHA-256摘要
+        """
+        key_text = f"{self.namespace}\0{normalize_feedback_text(feedback_text)}"
+        return hashlib.sha256(key_text.encode('utf-8')).hexdigest()
+
+    def get(self, feedback_text):
+        """
+        查询缓存，过期条目视为未命中并删除
+
+        Args:
+            feedback_text (str): 反馈文本
+
+        Returns:
+            list: 缓存的实体列表，未命中时返回None
+        """
+        cache_key = self.make_key(feedback_text)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT entities, created_at FROM coze_result_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            entities, created_at = row
+            if self.ttl_seconds > 0 and now - created_at > self.ttl_seconds:
+                self._touches.pop(cache_key, None)
+                self._conn.execute("DELETE FROM coze_result_cache WHERE cache_key = ?", (cache_key,))
+                self._conn.commit()
+                self._size -= 1
+                self.misses += 1
+                return None
+
+            self._touches[cache_key] = now
+            if len(self._touches) >= self.TOUCH_FLUSH_THRESHOLD:
+                self._write_touches()
+                self._conn.commit()
+            self.hits += 1
+            return json.loads(entities)
+
+    def put(self, feedback_text, entities):
+        """
+        写入缓存，超出容量时按最近访问时间淘汰
+
+        Args:
+            feedback_text (str): 反馈文本
+            entities (list): Coze识别的实体列表
+        """
+        cache_key = self.make_key(feedback_text)
+        now = time.time()
+        with self._lock:
+            # 淘汰前先写入访问时间，LRU顺序才准确
+            self._write_touches()
+            existed = self._conn.execute(
+                "SELECT 1 FROM coze_result_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone() is not None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO coze_result_cache (cache_key, entities, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (cache_key, json.dumps(entities, ensure_ascii=False), now, now)
+            )
+            if not existed:
+                self._size += 1
+
+            overflow = self._size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM coze_result_cache WHERE cache_key IN "
+                    "(SELECT cache_key FROM coze_result_cache ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+                self._size -= overflow
+            self._conn.commit()
+
+    def _write_touches(self):
+        """将内存中的访问时间批量写入（调用方持有锁并负责提交）"""
+        if self._touches:
+            self._conn.executemany(
+                "UPDATE coze_result_cache SET last_access = ? WHERE cache_key = ?",
+                [(last_access, cache_key) for cache_key, last_access in self._touches.items()]
+            )
+            self._touches = {}
+
+    def flush(self):
+        """将内存中的访问时间落盘"""
+        with self._lock:
+            if self._touches:
+                self._write_touches()
+                self._conn.commit()
+
+    def stats(self):
+        """
+        获取缓存统计信息
+
+        Returns:
+            dict: 命中数、未命中数、命中率、条目数
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total > 0 else 0,
+            'size': self._size
+        }
+
+    def close(self):
+        """写入访问时间并关闭缓存文件"""
+        with self._lock:
+            self._write_touches()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Coze智能Agent调用的公共组件
+- 带连接池、keep-alive的HTTP会话
+- 令牌桶限流，控制并发调用时的请求速率
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def create_pooled_session(pool_size=10):
+    """
+    创建带连接池的HTTP会话，同一主机的请求复用keep-alive连接
+
+    Args:
+        pool_size (int): 连接池大小，建议不小于并发数
+
+    Returns:
+        requests.Session: HTTP会话
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限流器
+    rate为每秒补充的令牌数，capacity为允许的突发请求数；rate<=0时不限流
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        获取令牌，令牌不足时阻塞等待
+
+        Args:
+            tokens (int): 需要的令牌数
+        """
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate
+            time.sleep(wait_seconds)
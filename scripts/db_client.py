@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SeekDB数据库客户端（自动打标与分析总结脚本共用）
+- 线程安全的连接池
+- 查询（及调用方声明为幂等的写操作）在连接断开时透明重连并重试一次；
+  其他写操作与事务不重试（语句可能已在服务端执行），只在执行前探测并替换池中已失效的连接
+- 基于服务端游标（SSDictCursor）的流式查询，大结果集常量内存遍历
+"""
+
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+# 视为连接已断开、可重连重试的MySQL错误码
+CONNECTION_LOST_ERRORS = {0, 2006, 2013, 2055}
+
+
+def is_connection_lost(error):
+    """
+    判断异常是否由连接断开引起
+
+    Args:
+        error (Exception): 异常
+
+    Returns:
+        bool: 是否为连接断开
+    """
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    if isinstance(error, pymysql.err.OperationalError):
+        return bool(error.args) and error.args[0] in CONNECTION_LOST_ERRORS
+    return False
+
+
+class DatabaseClient:
+    def __init__(self, pool_size=5, pool_timeout=30, **config):
+        self.config = config
+        self.pool_size = pool_size
+        self.pool_timeout = pool_timeout
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+        # 预先建立一个连接，配置错误时在初始化阶段即失败
+        self._release(self._acquire())
+
+    def connect(self):
+        """建立数据库连接"""
+        try:
+            return pymysql.connect(
+                host=self.config['host'],
+                port=self.config['port'],
+                user=self.config['user'],
+                password=self.config['password'],
+                database=self.config['database'],
+                charset='utf8mb4',
+                cursorclass=pymysql.cursors.DictCursor
+            )
+        except Exception as e:
+            raise Exception(f"数据库连接失败: {e}")
+
+    def _acquire(self):
+        """从连接池获取连接，池未满时按需新建"""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.pool_size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self.connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._pool.get(timeout=self.pool_timeout)
+        except queue.Empty:
+            raise Exception(f"等待数据库连接超时（{self.pool_timeout}s）")
+
+    def _acquire_live(self):
+        """
+        获取连接并ping探测，池中连接已失效（如空闲超时被服务端关闭）时丢弃并换一个；
+        此时尚未发送任何语句，替换是安全的。池中连接全部失效时最终会新建连接
+
+        Returns:
+            Connection: 探测通过的连接
+        """
+        for attempt in range(self.pool_size + 1):
+            connection = self._acquire()
+            try:
+                connection.ping(reconnect=False)
+                return connection
+            except Exception as e:
+                self._discard(connection)
+                if attempt == self.pool_size:
+                    raise
+                logger.warning(f"数据库连接已失效，换新连接执行: {e}")
+
+    def _release(self, connection):
+        """归还连接，已断开的连接直接丢弃"""
+        if connection.open:
+            self._pool.put(connection)
+        else:
+            self._discard(connection)
+
+    def _discard(self, connection):
+        """关闭并丢弃连接"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def _run(self, operation, idempotent=True):
+        """
+        在池化连接上执行操作
+        幂等操作在连接断开时换新连接重试一次；非幂等操作先ping探测连接（失效时换新连接，此时语句尚未发送），
+        执行中连接断开时不重试，避免重复写入
+
+        Args:
+            operation (callable): 接收连接对象的函数
+            idempotent (bool): 操作重复执行是否安全
+
+        Returns:
+            operation的返回值
+        """
+        for attempt in range(2):
+            connection = self._acquire() if idempotent else self._acquire_live()
+            try:
+                result = operation(connection)
+            except Exception as e:
+                if is_connection_lost(e):
+                    self._discard(connection)
+                    if idempotent and attempt == 0:
+                        logger.warning(f"数据库连接已断开，重连后重试: {e}")
+                        continue
+                else:
+                    self._release(connection)
+                raise
+            self._release(connection)
+            return result
+
+    @contextmanager
+    def transaction(self):
+        """
+        在同一连接上开启事务，正常结束时提交，异常时回滚
+        事务内的语句不重试，开始前先探测并替换池中已失效的连接
+
+        Yields:
+            Cursor: 事务内使用的游标
+        """
+        connection = self._acquire_live()
+        try:
+            with connection.cursor() as cursor:
+                yield cursor
+            connection.commit()
+        except Exception as e:
+            if is_connection_lost(e):
+                self._discard(connection)
+            else:
+                connection.rollback()
+                self._release(connection)
+            raise
+        else:
+            self._release(connection)
+
+    def query_sql(self, sql, params=None):
+        """执行查询SQL并返回DataFrame"""
+        def operation(connection):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return pd.DataFrame(cursor.fetchall())
+
+        try:
+            return self._run(operation)
+        except Exception as e:
+            raise Exception(f"查询执行失败: {e}")
+
+    def stream_rows(self, sql, params=None, chunk_size=10000):
+        """
+        使用服务端游标流式执行查询，按块返回行字典列表
+
+        Args:
+            sql (str): 查询SQL
+            params (list): 查询参数
+            chunk_size (int): 每块行数
+
+        Yields:
+            list: 行字典列表
+        """
+        connection = self._acquire()
+        connection_lost = False
+        try:
+            with connection.cursor(pymysql.cursors.SSDictCursor) as cursor:
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+        except Exception as e:
+            connection_lost = is_connection_lost(e)
+            raise Exception(f"流式查询执行失败: {e}")
+        finally:
+            # 生成器提前关闭时同样归还连接（关闭服务端游标会读尽剩余结果）
+            if connection_lost:
+                self._discard(connection)
+            else:
+                self._release(connection)
+
+    def execute_sql(self, sql, params=None, idempotent=False):
+        """
+        执行SQL语句（更新、删除等）
+
+        Args:
+            sql (str): SQL语句
+            params (list): 参数
+            idempotent (bool): 语句重复执行是否安全（如按主键的UPSERT、DELETE），为True时连接断开后重试
+
+        Returns:
+            int: 影响的行数
+        """
+        def operation(connection):
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+                    connection.commit()
+                    return cursor.rowcount
+            except Exception:
+                if connection.open:
+                    connection.rollback()
+                raise
+
+        try:
+            return self._run(operation, idempotent=idempotent)
+        except Exception as e:
+            raise Exception(f"SQL执行失败: {e}")
+
+    def insert(self, table, data):
+        """插入数据到指定表"""
+        if not data:
+            return 0
+
+        columns = ', '.join(data.keys())
+        placeholders = ', '.join(['%s'] * len(data))
+        values = list(data.values())
+
+        sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+        return self.execute_sql(sql, values)
+
+    def execute_many(self, statements, idempotent=False):
+        """
+        在同一事务中批量执行多条SQL语句
+
+        Args:
+            statements (list): (sql, params_list) 元组列表，每条SQL用executemany执行
+            idempotent (bool): 事务重复执行是否安全，为True时连接断开后重试
+
+        Returns:
+            int: 影响的总行数
+        """
+        def operation(connection):
+            try:
+                rowcount = 0
+                with connection.cursor() as cursor:
+                    for sql, params_list in statements:
+                        if params_list:
+                            rowcount += cursor.executemany(sql, params_list) or 0
+                connection.commit()
+                return rowcount
+            except Exception:
+                if connection.open:
+                    connection.rollback()
+                raise
+
+        try:
+            return self._run(operation, idempotent=idempotent)
+        except Exception as e:
+            raise Exception(f"批量SQL执行失败: {e}")
+
+    def close(self):
+        """关闭连接池中的所有空闲连接"""
+        while True:
+            try:
+                self._discard(self._pool.get_nowait())
+            except queue.Empty:
+                break
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+可插拔的文本向量生成后端
+- torch：sentence-transformers + PyTorch（原有实现）
+- onnx：ONNX Runtime推理，可选int8动态量化，适合仅有CPU的主机
+- remote：调用本地向量服务（embedding_server.py），多个进程共用一份已预热的模型；
+  服务报告的模型标识与本进程配置不一致时不使用该服务，避免混入其他向量空间的向量
+各后端输出一致：均值池化 + L2归一化的float32向量
+"""
+
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_BACKENDS = ('torch', 'onnx')
+
+
+def embedding_model_id(model_name, backend, quantize, dimension, max_tokens=None, truncation=None):
+    """
+    生成向量空间标识：模型、后端、量化、维度与截断配置任一变化时，生成的向量不可混用
+
+    Args:
+        model_name (str): 模型名称
+        backend (str): 后端名称，torch或onnx
+        quantize (bool): 是否使用int8动态量化模型（onnx后端）
+        dimension (int): 向量维度
+        max_tokens (int): 长度分桶的最大token数，为None表示未启用长度分桶（按模型自身截断）
+        truncation (str): 长度分桶的截断方式
+
+    Returns:
+        str: 模型标识
+    """
+    if backend == 'onnx' and quantize:
+        backend = 'onnx-int8'
+    truncation = f"{max_tokens}/{truncation}" if max_tokens is not None else 'model'
+    return f"{model_name}|{backend}|dim={dimension}|max_tokens={truncation}"
+
+
+class EmbeddingBackend:
+    """
+    向量生成后端接口
+    """
+
+    name = 'base'
+
+    def encode(self, texts, batch_size=64):
+        """
+        批量生成文本向量
+
+        Args:
+            texts (list): 输入文本列表
+            batch_size (int): 每次前向计算的文本数
+
+        Returns:
+            ndarray: (len(texts), dimension) 的float32矩阵
+        """
+        raise NotImplementedError
+
+
+class TorchEmbeddingBackend(EmbeddingBackend):
+    """
+    基于sentence-transformers的PyTorch后端
+    """
+
+    name = 'torch'
+
+    def __init__(self, model_name, max_seq_length=256):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.model.max_seq_length = max_seq_length
+        self.tokenizer = self.model.tokenizer
+
+    def encode(self, texts, batch_size=64):
+        embeddings = self.model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+def export_onnx_model(model_name, model_dir):
+    """
+    将HuggingFace模型导出为ONNX（仅首次使用时执行，需要torch与transformers）
+
+    Args:
+        model_name (str): 模型名称
+        model_dir (str): 导出目录，保存model.onnx与分词器文件
+
+    Returns:
+        str: ONNX模型路径
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(model_dir, exist_ok=True)
+    onnx_path = os.path.join(model_dir, 'model.onnx')
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    dummy = tokenizer(["客服反馈示例文本"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in dummy]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    tokenizer.save_pretrained(model_dir)
+    logger.info(f"ONNX模型导出完成: {model_name} -> {onnx_path}")
+    return onnx_path
+
+
+def quantize_onnx_model(onnx_path, quantized_path):
+    """
+    对ONNX模型做int8动态量化（权重量化为int8，激活在推理时动态量化）
+
+    Args:
+        onnx_path (str): 原始ONNX模型路径
+        quantized_path (str): 量化模型输出路径
+
+    Returns:
+        str: 量化模型路径
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+    logger.info(f"ONNX模型int8动态量化完成: {quantized_path}")
+    return quantized_path
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    基于ONNX Runtime的CPU推理后端
+    模型目录不存在时自动导出（及量化），之后只依赖onnxruntime与分词器
+    """
+
+    def __init__(self, model_name, model_dir, quantize=False, max_seq_length=256, num_threads=0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_seq_length = max_seq_length
+        self.name = 'onnx-int8' if quantize else 'onnx'
+
+        onnx_path = os.path.join(model_dir, 'model.onnx')
+        if not os.path.exists(onnx_path):
+            export_onnx_model(model_name, model_dir)
+
+        model_path = onnx_path
+        if quantize:
+            model_path = os.path.join(model_dir, 'model_int8.onnx')
+            if not os.path.exists(model_path):
+                quantize_onnx_model(onnx_path, model_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=64):
+        texts = list(texts)
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+
+            # 与sentence-transformers一致：按attention_mask做均值池化后L2归一化
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            outputs.append(pooled / np.clip(norms, 1e-12, None))
+
+        if not outputs:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(outputs).astype(np.float32)
+
+
+class EmbeddingServiceError(Exception):
+    """
+    本地向量服务不可用或调用失败
+    """
+
+
+class RemoteEmbeddingBackend(EmbeddingBackend):
+    """
+    本地向量服务（embedding_server.py）的客户端
+    """
+
+    name = 'remote'
+
+    def __init__(self, url, timeout=30, model_id=None):
+        import requests
+
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        # 本进程配置对应的模型标识，服务的模型标识须与之一致
+        self.model_id = model_id
+        self.session = requests.Session()
+
+    def is_available(self):
+        """
+        检查服务是否在线且与本进程使用同一向量空间
+
+        Returns:
+            bool: 服务健康检查是否通过且模型标识一致
+        """
+        try:
+            response = self.session.get(f"{self.url}/health", timeout=min(self.timeout, 2))
+            response.raise_for_status()
+            health = response.json()
+        except Exception:
+            return False
+
+        if self.model_id is not None and health.get('model_id') != self.model_id:
+            logger.warning(f"本地向量服务的模型与本进程配置不一致，不使用该服务: "
+                           f"服务 {health.get('model_id')}，本进程 {self.model_id}")
+            return False
+        self.name = f"remote({health.get('backend')})"
+        return True
+
+    def encode(self, texts, batch_size=64):
+        try:
+            response = self.session.post(f"{self.url}/embed", json={'texts': list(texts)}, timeout=self.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            raise EmbeddingServiceError(f"本地向量服务调用失败: {e}")
+
+        # 服务可能已用其他配置重启，每次调用都核对模型标识
+        served_model_id = response.headers.get('X-Embedding-Model-Id')
+        if self.model_id is not None and served_model_id != self.model_id:
+            raise EmbeddingServiceError(f"本地向量服务的模型已变更: {served_model_id}")
+
+        dimension = int(response.headers.get('X-Embedding-Dimension', 0))
+        if dimension == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.frombuffer(response.content, dtype='<f4').reshape(-1, dimension)
+
+
+def create_embedding_backend(backend, model_name, onnx_dir=None, quantize=False,
+                             max_seq_length=256, num_threads=0):
+    """
+    按名称创建向量生成后端
+
+    Args:
+        backend (str): 后端名称，torch或onnx
+        model_name (str): 模型名称
+        onnx_dir (str): ONNX模型缓存根目录（onnx后端使用）
+        quantize (bool): 是否使用int8动态量化模型（onnx后端使用）
+        max_seq_length (int): 最大token数，超出部分截断
+        num_threads (int): ONNX Runtime线程数，0表示使用默认值
+
+    Returns:
+        EmbeddingBackend: 向量生成后端
+    """
+    if backend == 'torch':
+        return TorchEmbeddingBackend(model_name, max_seq_length=max_seq_length)
+    if backend == 'onnx':
+        model_dir = os.path.join(onnx_dir or 'cache/onnx_models', model_name.replace('/', '__'))
+        return OnnxEmbeddingBackend(model_name, model_dir, quantize=quantize,
+                                    max_seq_length=max_seq_length, num_threads=num_threads)
+    raise ValueError(f"不支持的向量生成后端: {backend}，可选: {', '.join(SUPPORTED_BACKENDS)}")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+文本向量记忆化缓存
+- 以 (模型标识, 输入文本) 的摘要为键，缓存模型生成的float32向量
+- 按内存占用做LRU淘汰，可选持久化到磁盘，进程重启后直接复用
+- 持久化文件记录模型标识，与当前模型不一致时拒绝加载，避免复用其他模型的向量
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 每个条目除向量外的估算开销（键、字典节点等）
+ENTRY_OVERHEAD_BYTES = 128
+
+
+class EmbeddingCache:
+    """
+    线程安全的向量LRU缓存，容量按字节数限制
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, path=None, model_id=''):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.model_id = model_id
+        self._key_prefix = model_id.encode('utf-8') + b'\0'
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            try:
+                self.load(path)
+            except Exception as e:
+                logger.warning(f"向量缓存文件加载失败，将从空缓存开始: {e}")
+
+    def make_key(self, text):
+        """
+        生成缓存键
+
+        Args:
+            text (str): 输入文本
+
+        Returns:
+            bytes: 模型标识与文本的SHA-1摘要
+        """
+        return hashlib.sha1(self._key_prefix + text.encode('utf-8')).digest()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, text):
+        """
+        查询缓存
+
+        Args:
+            text (str): 输入文本
+
+        Returns:
+            ndarray: 缓存的向量，未命中时返回None
+        """
+        key = self.make_key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, text, vector):
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            text (str): 输入文本
+            vector (ndarray): 文本向量
+        """
+        self._put_key(self.make_key(text), np.asarray(vector, dtype=np.float32))
+
+    def _put_key(self, key, vector):
+        entry_bytes = vector.nbytes + ENTRY_OVERHEAD_BYTES
+        if entry_bytes > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes + ENTRY_OVERHEAD_BYTES
+            self._entries[key] = vector
+            self._bytes += entry_bytes
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes + ENTRY_OVERHEAD_BYTES
+
+    def stats(self):
+        """
+        获取缓存统计信息
+
+        Returns:
+            dict: 命中数、未命中数、条目数、占用字节数
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'bytes': self._bytes
+        }
+
+    def save(self, path=None):
+        """
+        将缓存持久化为npz文件（按最近使用顺序保存）
+
+        Args:
+            path (str): 文件路径，默认使用初始化时的路径
+        """
+        path = path or self.path
+        if not path:
+            return
+
+        with self._lock:
+            keys = list(self._entries.keys())
+            vectors = list(self._entries.values())
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        key_array = np.frombuffer(b''.join(keys), dtype=np.uint8).reshape(len(keys), 20)
+        vector_array = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        temp_path = f"{path}.tmp.npz"
+        np.savez(temp_path, keys=key_array, vectors=vector_array, model_id=np.array(self.model_id))
+        os.replace(temp_path, path)
+        logger.info(f"向量缓存已保存: {len(keys)} 条 -> {path}")
+
+    def load(self, path):
+        """
+        从npz文件加载缓存
+
+        Args:
+            path (str): 文件路径
+
+        Raises:
+            ValueError: 文件中的模型标识与当前缓存不一致（或文件未记录模型标识）
+        """
+        with np.load(path) as data:
+            file_model_id = str(data['model_id']) if 'model_id' in data.files else None
+            if file_model_id != self.model_id:
+                raise ValueError(f"模型标识不一致: 文件为 {file_model_id!r}，当前为 {self.model_id!r}")
+            key_array = data['keys']
+            vector_array = data['vectors']
+
+        for key_row, vector in zip(key_array, vector_array):
+            self._put_key(key_row.tobytes(), vector)
+        logger.info(f"向量缓存已加载: {len(self._entries)} 条 <- {path}")
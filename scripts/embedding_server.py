@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地向量生成服务
+- 常驻进程持有一份已预热的向量模型，打标脚本、临时脚本、多个工作进程共用
+- 监听localhost HTTP，POST /embed 接收文本列表，返回小端float32向量矩阵字节串
+- 并发请求合并为微批次：凑满批次上限或等待超过截止时间即执行一次前向计算
+- /health与每次/embed响应都报告模型标识，客户端据此拒绝与自身配置不一致的服务
+"""
+
+import os
+import sys
+import json
+import queue
+import signal
+import threading
+import time
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_backend import create_embedding_backend, embedding_model_id
+from length_bucketing import LengthBucketedBackend
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(
+    level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# ---------------------- 配置加载 ----------------------
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch').lower()
+EMBEDDING_ONNX_QUANTIZE = os.getenv('EMBEDDING_ONNX_QUANTIZE', 'false').lower() == 'true'
+EMBEDDING_ONNX_DIR = os.getenv('EMBEDDING_ONNX_DIR', 'cache/onnx_models')
+EMBEDDING_ONNX_THREADS = int(os.getenv('EMBEDDING_ONNX_THREADS', 0))
+EMBEDDING_LENGTH_BUCKETING = os.getenv('EMBEDDING_LENGTH_BUCKETING', 'true').lower() == 'true'
+EMBEDDING_MAX_TOKENS = int(os.getenv('EMBEDDING_MAX_TOKENS', 256))
+EMBEDDING_TRUNCATION = os.getenv('EMBEDDING_TRUNCATION', 'head').lower()
+
+# 服务监听地址（只监听本机）
+EMBEDDING_SERVER_HOST = os.getenv('EMBEDDING_SERVER_HOST', '127.0.0.1')
+EMBEDDING_SERVER_PORT = int(os.getenv('EMBEDDING_SERVER_PORT', 8765))
+# 一个微批次最多合并的文本数
+EMBEDDING_SERVER_MAX_BATCH_SIZE = int(os.getenv('EMBEDDING_SERVER_MAX_BATCH_SIZE', EMBEDDING_BATCH_SIZE))
+# 微批次等待更多请求的最长时间（毫秒）
+EMBEDDING_SERVER_MAX_WAIT_MS = float(os.getenv('EMBEDDING_SERVER_MAX_WAIT_MS', 10))
+
+
+class EmbeddingRequest:
+    """
+    一次向量生成请求，由HTTP处理线程提交，等待批处理线程填充结果
+    """
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    将并发请求合并为微批次的调度器（单个批处理线程独占模型）
+    """
+
+    def __init__(self, backend, max_batch_size=64, max_wait_seconds=0.01):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.batch_count = 0
+        self.text_count = 0
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+        self._thread.start()
+
+    def encode(self, texts):
+        """
+        提交文本并等待向量结果
+
+        Args:
+            texts (list): 输入文本列表
+
+        Returns:
+            ndarray: (len(texts), dimension) 的float32矩阵
+        """
+        request = EmbeddingRequest(texts)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        """取出第一个请求后，在截止时间内继续合并后续请求，直到凑满批次上限"""
+        first = self._queue.get()
+        if first is None:
+            return []
+
+        batch = [first]
+        text_count = len(first.texts)
+        deadline = time.monotonic() + self.max_wait_seconds
+        while text_count < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._stopped.set()
+                break
+            batch.append(request)
+            text_count += len(request.texts)
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if not batch:
+                break
+
+            texts = [text for request in batch for text in request.texts]
+            try:
+                embeddings = self.backend.encode(texts, batch_size=self.max_batch_size)
+            except Exception as e:
+                logger.error(f"微批次向量生成失败（{len(texts)} 条）: {e}")
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            self.batch_count += 1
+            self.text_count += len(texts)
+            offset = 0
+            for request in batch:
+                request.result = embeddings[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                request.done.set()
+
+    def stop(self):
+        """停止批处理线程（已入队的请求处理完毕后退出）"""
+        self._queue.put(None)
+        self._thread.join()
+
+
+def make_handler(batcher, backend, model_id):
+    """
+    创建绑定微批次调度器的HTTP请求处理类
+
+    Args:
+        batcher (MicroBatcher): 微批次调度器
+        backend (EmbeddingBackend): 向量生成后端
+        model_id (str): 模型标识（见embedding_model_id）
+
+    Returns:
+        type: BaseHTTPRequestHandler子类
+    """
+    class EmbeddingHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, body, content_type, headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status, payload):
+            self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+        def do_GET(self):
+            if self.path != '/health':
+                self._send_json(404, {'error': 'not found'})
+                return
+            self._send_json(200, {
+                'status': 'ok',
+                'backend': backend.name,
+                'model': EMBEDDING_MODEL,
+                'model_id': model_id,
+                'batches': batcher.batch_count,
+                'texts': batcher.text_count
+            })
+
+        def do_POST(self):
+            if self.path != '/embed':
+                self._send_json(404, {'error': 'not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                texts = json.loads(self.rfile.read(length))['texts']
+            except Exception as e:
+                self._send_json(400, {'error': f"请求格式错误: {e}"})
+                return
+
+            try:
+                embeddings = np.ascontiguousarray(batcher.encode(texts), dtype='<f4')
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+                return
+
+            dimension = embeddings.shape[1] if embeddings.ndim == 2 else 0
+            self._send(200, embeddings.tobytes(), 'application/octet-stream',
+                       {'X-Embedding-Dimension': str(dimension), 'X-Embedding-Model-Id': model_id})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return EmbeddingHandler
+
+
+def main():
+    """
+    主函数
+    """
+    logger.info("===== 本地向量生成服务启动 =====")
+
+    load_start = time.perf_counter()
+    try:
+        backend = create_embedding_backend(
+            EMBEDDING_BACKEND,
+            EMBEDDING_MODEL,
+            onnx_dir=EMBEDDING_ONNX_DIR,
+            quantize=EMBEDDING_ONNX_QUANTIZE,
+            max_seq_length=EMBEDDING_MAX_TOKENS,
+            num_threads=EMBEDDING_ONNX_THREADS
+        )
+        if EMBEDDING_LENGTH_BUCKETING:
+            backend = LengthBucketedBackend(backend, EMBEDDING_MAX_TOKENS, EMBEDDING_TRUNCATION)
+        # 预热一次，首个请求不承担图初始化开销
+        dimension = backend.encode(["预热"], batch_size=1).shape[1]
+    except Exception as e:
+        logger.error(f"向量生成模型初始化失败: {e}")
+        sys.exit(1)
+    model_id = embedding_model_id(
+        EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_ONNX_QUANTIZE, dimension,
+        max_tokens=EMBEDDING_MAX_TOKENS if EMBEDDING_LENGTH_BUCKETING else None,
+        truncation=EMBEDDING_TRUNCATION
+    )
+    logger.info(f"向量生成模型已加载: {backend.name} / {model_id}, "
+                f"耗时 {time.perf_counter() - load_start:.2f}s")
+
+    batcher = MicroBatcher(backend, EMBEDDING_SERVER_MAX_BATCH_SIZE, EMBEDDING_SERVER_MAX_WAIT_MS / 1000)
+    server = ThreadingHTTPServer((EMBEDDING_SERVER_HOST, EMBEDDING_SERVER_PORT), make_handler(batcher, backend, model_id))
+    server.daemon_threads = True
+
+    def handle_signal(signum, frame):
+        logger.info(f"收到信号 {signum}，停止服务")
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    logger.info(f"监听 http://{EMBEDDING_SERVER_HOST}:{EMBEDDING_SERVER_PORT}，"
+                f"微批次上限 {EMBEDDING_SERVER_MAX_BATCH_SIZE} 条 / 等待 {EMBEDDING_SERVER_MAX_WAIT_MS}ms")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        batcher.stop()
+        if isinstance(backend, LengthBucketedBackend):
+            backend.log_stats()
+        logger.info(f"===== 本地向量生成服务结束：共 {batcher.batch_count} 个批次, "
+                    f"{batcher.text_count} 条文本 =====")
+
+
+if __name__ == "__main__":
+    main()
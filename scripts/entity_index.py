@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+实体向量内存索引
+对应架构图中的“标签向量库”在应用层的只读副本：
+- 启动时从entity_vector_lib一次性加载所有实体向量
+- 以连续float32矩阵保存归一化后的向量，本地完成余弦相似度top-k检索
+- Coze沉淀新实体时增量追加，无需重新加载整个向量库
+- 其他进程沉淀的实体通过按create_time的增量刷新加载
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+import numpy as np
+
+from vector_codec import to_vector
+
+logger = logging.getLogger(__name__)
+
+# 增量刷新时向前回看的秒数：create_time取自插入时刻，事务提交较晚的实体可能早于上次加载到的时间
+REFRESH_OVERLAP_SECONDS = 60
+
+
+def refresh_since(loaded_until, overlap_seconds):
+    """增量刷新的起始create_time，未加载过任何行时返回None（全量加载）"""
+    if loaded_until is None:
+        return None
+    return loaded_until - timedelta(seconds=overlap_seconds)
+
+
+class EntityIndex:
+    """
+    实体向量内存索引
+    行向量均已L2归一化，矩阵乘即为余弦相似度
+    """
+
+    def __init__(self, dimension, initial_capacity=1024):
+        self.dimension = dimension
+        self._matrix = np.zeros((initial_capacity, dimension), dtype=np.float32)
+        self._size = 0
+        self.entity_ids = []
+        self.type_names = []
+        self.entity_values = []
+        self._positions = {}
+        self.loaded_until = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def matrix(self):
+        """当前有效的实体向量矩阵（只读视图）"""
+        return self._matrix[:self._size]
+
+    def load(self, db_client, since=None):
+        """
+        从entity_vector_lib加载实体向量（已在索引中的实体按entity_id覆盖）
+
+        Args:
+            db_client (DatabaseClient): 数据库客户端
+            since (datetime): 只加载create_time不早于该时间的实体，为None时全量加载
+
+        Returns:
+            int: 加载的实体数量
+        """
+        load_sql = """
+        SELECT
+            e.entity_id,
+            t.type_name,
+            e.entity_value,
+            e.entity_vector_bin,
+            e.entity_vector,
+            e.create_time
+        FROM
+            entity_vector_lib e
+        JOIN
+            dynamic_entity_type t ON e.type_id = t.type_id
+        """
+        entity_df = _query_since(db_client, load_sql, 'e.create_time', since)
+
+        size_before = self._size
+        skipped_count = 0
+        if not entity_df.empty:
+            self.loaded_until = _latest(self.loaded_until, entity_df['create_time'])
+            for entity_id, type_name, entity_value, entity_vector_bin, entity_vector in zip(
+                entity_df['entity_id'], entity_df['type_name'], entity_df['entity_value'],
+                entity_df['entity_vector_bin'], entity_df['entity_vector']
+            ):
+                # 优先使用二进制列（零拷贝解码），历史数据回退到解析VECTOR文本
+                vector = to_vector(entity_vector_bin, self.dimension)
+                if vector is None:
+                    vector = to_vector(entity_vector, self.dimension)
+                if vector is None or vector.shape[0] != self.dimension:
+                    skipped_count += 1
+                    continue
+                self.add(entity_id, type_name, entity_value, vector)
+
+        if since is None:
+            logger.info(f"实体向量索引加载完成: {self._size} 个实体, 跳过无向量实体 {skipped_count} 个")
+        elif self._size > size_before:
+            logger.info(f"实体向量索引增量刷新: 新增 {self._size - size_before} 个实体, 共 {self._size} 个")
+        return len(entity_df) - skipped_count
+
+    def refresh(self, db_client, overlap_seconds=REFRESH_OVERLAP_SECONDS):
+        """
+        增量加载上次加载之后新沉淀的实体（走idx_entity_create_time）
+
+        Args:
+            db_client (DatabaseClient): 数据库客户端
+            overlap_seconds (int): 向前回看的秒数
+
+        Returns:
+            int: 本次加载（含覆盖）的实体数量
+        """
+        return self.load(db_client, since=refresh_since(self.loaded_until, overlap_seconds))
+
+    def add(self, entity_id, type_name, entity_value, vector):
+        """
+        增量追加（或更新）一个实体向量
+
+        Args:
+            entity_id (str): 实体ID
+            type_name (str): 实体类型名称
+            entity_value (str): 实体值
+            vector (ndarray): 实体向量
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+
+        with self._lock:
+            position = self._positions.get(entity_id)
+            if position is None:
+                if self._size == self._matrix.shape[0]:
+                    # 容量翻倍，保证追加为均摊O(1)
+                    grown = np.zeros((max(1, self._size * 2), self.dimension), dtype=np.float32)
+                    grown[:self._size] = self._matrix[:self._size]
+                    self._matrix = grown
+                position = self._size
+                self._positions[entity_id] = position
+                self.entity_ids.append(entity_id)
+                self.type_names.append(type_name)
+                self.entity_values.append(entity_value)
+                self._size += 1
+            else:
+                self.type_names[position] = type_name
+                self.entity_values[position] = entity_value
+            self._matrix[position] = vector
+
+    def search(self, vector, top_k=None, min_similarity=0.0):
+        """
+        余弦相似度检索
+
+        Args:
+            vector (ndarray): 查询向量
+            top_k (int): 返回的最大实体数，为None时返回所有满足阈值的实体
+            min_similarity (float): 相似度下限（不含）
+
+        Returns:
+            list: 匹配结果列表，按match_confidence降序
+        """
+        matrix = self.matrix
+        if matrix.shape[0] == 0 or vector is None:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        similarities = matrix @ (query / norm)
+
+        candidates = np.flatnonzero(similarities > min_similarity)
+        if top_k is not None and candidates.shape[0] > top_k:
+            top = np.argpartition(similarities[candidates], -top_k)[-top_k:]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(similarities[candidates])[::-1]]
+
+        return [
+            {
+                'entity_id': self.entity_ids[position],
+                'type_name': self.type_names[position],
+                'entity_value': self.entity_values[position],
+                'match_confidence': float(similarities[position])
+            }
+            for position in candidates
+        ]
+
+    def search_batch(self, vectors, top_k=None, min_similarity=0.0):
+        """
+        批量余弦相似度检索：一次矩阵乘完成整批打分，argpartition取每行top-k
+
+        Args:
+            vectors (ndarray): 查询向量矩阵，形状为 (n, dimension)
+            top_k (int): 每条查询返回的最大实体数，为None时返回所有满足阈值的实体
+            min_similarity (float): 相似度下限（不含）
+
+        Returns:
+            list: 与查询顺序一致的匹配结果列表，每项按match_confidence降序
+        """
+        queries = np.asarray(vectors, dtype=np.float32)
+        matrix = self.matrix
+        if queries.shape[0] == 0 or matrix.shape[0] == 0:
+            return [[] for _ in range(queries.shape[0])]
+
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = np.inf
+        scores = (queries / norms) @ matrix.T
+
+        if top_k is not None and top_k < matrix.shape[0]:
+            columns = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            rows = np.repeat(np.arange(queries.shape[0]), top_k)
+            columns = columns.ravel()
+            keep = scores[rows, columns] > min_similarity
+            rows, columns = rows[keep], columns[keep]
+        else:
+            rows, columns = np.nonzero(scores > min_similarity)
+
+        # 先按查询行、再按相似度降序排列，随后按行切分
+        selected = scores[rows, columns]
+        order = np.lexsort((-selected, rows))
+        rows, columns, selected = rows[order], columns[order], selected[order]
+        boundaries = np.searchsorted(rows, np.arange(1, queries.shape[0]))
+
+        results = []
+        for row_columns, row_scores in zip(np.split(columns, boundaries), np.split(selected, boundaries)):
+            results.append([
+                {
+                    'entity_id': self.entity_ids[position],
+                    'type_name': self.type_names[position],
+                    'entity_value': self.entity_values[position],
+                    'match_confidence': float(score)
+                }
+                for position, score in zip(row_columns, row_scores)
+            ])
+        return results
+
+
+class EntityDirectory:
+    """
+    实体类型与实体值的ID目录（写穿式内存缓存）
+    - type_name -> type_id
+    - (type_id, entity_value) -> entity_id
+    目录为空或未命中时调用方回退到数据库，因此冷启动下结果仍然正确
+    """
+
+    def __init__(self):
+        self._type_ids = {}
+        self._entity_ids = {}
+        self.types_loaded_until = None
+        self.entities_loaded_until = None
+        self._lock = threading.Lock()
+
+    def warm(self, db_client):
+        """
+        从数据库预热目录
+
+        Args:
+            db_client (DatabaseClient): 数据库客户端
+
+        Returns:
+            tuple: (实体类型数量, 实体数量)
+        """
+        self._load(db_client, None, None)
+        logger.info(f"实体ID目录预热完成: {len(self._type_ids)} 个实体类型, {len(self._entity_ids)} 个实体")
+        return len(self._type_ids), len(self._entity_ids)
+
+    def refresh(self, db_client, overlap_seconds=REFRESH_OVERLAP_SECONDS):
+        """
+        增量加载上次加载之后新建的实体类型与实体
+
+        Args:
+            db_client (DatabaseClient): 数据库客户端
+            overlap_seconds (int): 向前回看的秒数
+
+        Returns:
+            tuple: (本次加载的实体类型数量, 实体数量)
+        """
+        return self._load(db_client,
+                          refresh_since(self.types_loaded_until, overlap_seconds),
+                          refresh_since(self.entities_loaded_until, overlap_seconds))
+
+    def _load(self, db_client, types_since, entities_since):
+        type_df = _query_since(db_client, "SELECT type_id, type_name, create_time FROM dynamic_entity_type",
+                               'create_time', types_since)
+        entity_df = _query_since(db_client, "SELECT entity_id, type_id, entity_value, create_time FROM entity_vector_lib",
+                                 'create_time', entities_since)
+
+        with self._lock:
+            if not type_df.empty:
+                self._type_ids.update(zip(type_df['type_name'], type_df['type_id']))
+                self.types_loaded_until = _latest(self.types_loaded_until, type_df['create_time'])
+            if not entity_df.empty:
+                self._entity_ids.update(zip(zip(entity_df['type_id'], entity_df['entity_value']), entity_df['entity_id']))
+                self.entities_loaded_until = _latest(self.entities_loaded_until, entity_df['create_time'])
+        return len(type_df), len(entity_df)
+
+    def get_type_id(self, type_name):
+        """查询实体类型ID，未命中时返回None"""
+        return self._type_ids.get(type_name)
+
+    def set_type_id(self, type_name, type_id):
+        """记录实体类型ID"""
+        with self._lock:
+            self._type_ids[type_name] = type_id
+
+    def get_entity_id(self, type_id, entity_value):
+        """查询实体ID，未命中时返回None"""
+        return self._entity_ids.get((type_id, entity_value))
+
+    def set_entity_id(self, type_id, entity_value, entity_id):
+        """记录实体ID"""
+        with self._lock:
+            self._entity_ids[(type_id, entity_value)] = entity_id
+
+
+def _query_since(db_client, sql, time_column, since):
+    """执行查询，since不为None时只取time_column不早于since的行"""
+    if since is None:
+        return db_client.query_sql(sql)
+    return db_client.query_sql(f"{sql} WHERE {time_column} >= %s", params=[since])
+
+
+def _latest(loaded_until, create_times):
+    """取已加载时间与本次加载行的最大create_time中较晚者"""
+    latest = create_times.max()
+    if latest != latest:
+        return loaded_until
+    if hasattr(latest, 'to_pydatetime'):
+        latest = latest.to_pydatetime()
+    if loaded_until is None or latest > loaded_until:
+        return latest
+    return loaded_until
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按token长度分桶的向量编码调度
+- 编码前按token长度排序并分桶，同一小批次内的文本长度接近，减少填充到最长序列造成的浪费
+- 超过最大token数的文本按截断策略处理：head保留开头，head_tail保留开头和结尾
+- 结果按原始顺序返回，并统计每个长度桶的填充效率与吞吐量
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+
+from embedding_backend import EmbeddingBackend
+
+logger = logging.getLogger(__name__)
+
+# 长度桶上界（token数，含特殊token），最后一个桶收纳其余文本
+DEFAULT_BUCKET_BOUNDARIES = (16, 32, 64, 128, 256)
+
+SUPPORTED_TRUNCATION = ('head', 'head_tail')
+
+
+def padding_efficiency(lengths, batch_size):
+    """
+    计算按给定顺序切分小批次时的填充效率（有效token数 / 填充后token数）
+
+    Args:
+        lengths (ndarray): 按编码顺序排列的token长度
+        batch_size (int): 小批次大小
+
+    Returns:
+        tuple: (有效token数, 填充后token数)
+    """
+    real_tokens = 0
+    padded_tokens = 0
+    for start in range(0, len(lengths), batch_size):
+        chunk = lengths[start:start + batch_size]
+        real_tokens += int(chunk.sum())
+        padded_tokens += int(chunk.max()) * len(chunk)
+    return real_tokens, padded_tokens
+
+
+class LengthBucketedBackend(EmbeddingBackend):
+    """
+    为任意向量生成后端增加按长度分桶调度与截断策略的包装器
+    """
+
+    def __init__(self, backend, max_tokens=256, truncation='head', boundaries=DEFAULT_BUCKET_BOUNDARIES):
+        if truncation not in SUPPORTED_TRUNCATION:
+            raise ValueError(f"不支持的截断策略: {truncation}，可选: {', '.join(SUPPORTED_TRUNCATION)}")
+
+        self.backend = backend
+        self.max_tokens = max_tokens
+        self.truncation = truncation
+        self.boundaries = tuple(sorted(bound for bound in boundaries if bound < max_tokens)) + (max_tokens,)
+        self.name = f"{backend.name}+bucketed"
+        # 后端没有分词器时（如本地向量服务客户端）以字符数近似token数
+        self.tokenizer = getattr(backend, 'tokenizer', None)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def token_lengths(self, texts):
+        """
+        计算文本的token长度（含特殊token，不截断）
+
+        Args:
+            texts (list): 输入文本列表
+
+        Returns:
+            ndarray: token长度
+        """
+        if self.tokenizer is None:
+            return np.array([len(text) + 2 for text in texts], dtype=np.int64)
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=True,
+            truncation=False,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False
+        )
+        return np.array([len(ids) for ids in encoded['input_ids']], dtype=np.int64)
+
+    def truncate_head_tail(self, text):
+        """
+        保留开头与结尾各一半的token（长投诉的结论常在末尾）
+
+        Args:
+            text (str): 超长文本
+
+        Returns:
+            str: 截断后的文本
+        """
+        ids = self.tokenizer(text, add_special_tokens=False, verbose=False)['input_ids']
+        budget = self.max_tokens - 2
+        head = budget // 2
+        tail = budget - head
+        return self.tokenizer.decode(ids[:head] + ids[-tail:])
+
+    def _bucket_label(self, bucket):
+        lower = self.boundaries[bucket - 1] + 1 if bucket > 0 else 1
+        return f"{lower}-{self.boundaries[bucket]}"
+
+    def encode(self, texts, batch_size=64):
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        lengths = self.token_lengths(texts)
+
+        # 1. 截断策略：head交给后端按max_tokens截断，head_tail在文本层面先截断
+        if self.truncation == 'head_tail' and self.tokenizer is not None:
+            for position in np.flatnonzero(lengths > self.max_tokens):
+                texts[position] = self.truncate_head_tail(texts[position])
+        lengths = np.minimum(lengths, self.max_tokens)
+
+        # 2. 按长度稳定排序并分桶
+        order = np.argsort(lengths, kind='stable')
+        bucket_ids = np.searchsorted(self.boundaries, lengths[order], side='left')
+
+        # 3. 逐桶编码，结果写回原始位置
+        embeddings = None
+        for bucket in np.unique(bucket_ids):
+            positions = order[bucket_ids == bucket]
+            bucket_lengths = lengths[positions]
+
+            start = time.perf_counter()
+            bucket_embeddings = self.backend.encode([texts[i] for i in positions], batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+
+            if embeddings is None:
+                embeddings = np.empty((len(texts), bucket_embeddings.shape[1]), dtype=np.float32)
+            embeddings[positions] = bucket_embeddings
+
+            real_tokens, padded_tokens = padding_efficiency(bucket_lengths, batch_size)
+            self._record(self._bucket_label(bucket), len(positions),
+                         -(-len(positions) // batch_size), real_tokens, padded_tokens, elapsed)
+
+        # 4. 与不分桶（原始顺序切分）的填充效率对比
+        bucketed_real, bucketed_padded = padding_efficiency(lengths[order], batch_size)
+        original_real, original_padded = padding_efficiency(lengths, batch_size)
+        logger.debug(f"分桶编码: {len(texts)} 条, 填充效率 {bucketed_real / max(bucketed_padded, 1):.1%} "
+                     f"（不分桶 {original_real / max(original_padded, 1):.1%}）")
+        return embeddings
+
+    def _record(self, label, texts, batches, real_tokens, padded_tokens, seconds):
+        with self._lock:
+            bucket_stats = self._stats.setdefault(label, {
+                'texts': 0, 'batches': 0, 'real_tokens': 0, 'padded_tokens': 0, 'seconds': 0.0
+            })
+            bucket_stats['texts'] += texts
+            bucket_stats['batches'] += batches
+            bucket_stats['real_tokens'] += real_tokens
+            bucket_stats['padded_tokens'] += padded_tokens
+            bucket_stats['seconds'] += seconds
+
+    def stats(self):
+        """
+        获取累计的分桶统计
+
+        Returns:
+            dict: 长度桶 -> 文本数、批次数、填充效率、吞吐量（条/秒）
+        """
+        with self._lock:
+            snapshot = {label: dict(values) for label, values in self._stats.items()}
+
+        report = {}
+        for label, values in snapshot.items():
+            report[label] = {
+                'texts': values['texts'],
+                'batches': values['batches'],
+                'padding_efficiency': round(values['real_tokens'] / max(values['padded_tokens'], 1), 4),
+                'texts_per_second': round(values['texts'] / max(values['seconds'], 1e-9), 1)
+            }
+        return report
+
+    def log_stats(self):
+        """输出每个长度桶的填充效率与吞吐量"""
+        for label, values in self.stats().items():
+            logger.info(f"长度桶 {label} tokens: {values['texts']} 条 / {values['batches']} 批, "
+                        f"填充效率 {values['padding_efficiency']:.1%}, {values['texts_per_second']:.1f} 条/秒")
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+打标流程的运行指标与性能剖析
+- 延迟直方图与计数器（进程内，线程安全）
+- 本地HTTP端点输出Prometheus文本格式（/metrics）与JSON汇总（/metrics.json）
+- 每批次的JSON指标汇总（与上一批次之间的增量）
+- 可选的按批次cProfile与tracemalloc剖析报告
+"""
+
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 默认延迟分桶上界（秒）
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 函数级延迟直方图与调用计数器的指标名
+FUNCTION_LATENCY_METRIC = 'tagger_function_duration_seconds'
+FUNCTION_CALLS_METRIC = 'tagger_function_calls_total'
+
+
+class Counter:
+    """
+    单调递增计数器
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """
+    固定分桶直方图
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: (各分桶计数列表, 总次数, 总和)
+        """
+        with self._lock:
+            return list(self.bucket_counts), self.count, self.sum
+
+
+def estimate_quantile(buckets, bucket_counts, quantile):
+    """
+    按分桶计数线性插值估算分位数
+
+    Args:
+        buckets (tuple): 分桶上界
+        bucket_counts (list): 各分桶计数（最后一个为超出上界的计数）
+        quantile (float): 分位数，0~1
+
+    Returns:
+        float: 估算值，无数据时返回0
+    """
+    total = sum(bucket_counts)
+    if total == 0:
+        return 0.0
+
+    rank = quantile * total
+    cumulative = 0
+    for index, count in enumerate(bucket_counts):
+        if cumulative + count >= rank and count > 0:
+            if index >= len(buckets):
+                return buckets[-1]
+            lower = buckets[index - 1] if index > 0 else 0.0
+            return lower + (buckets[index] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return buckets[-1]
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._last_summary = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text='', **labels):
+        """
+        获取（不存在时创建）计数器
+
+        Args:
+            name (str): 指标名
+            help_text (str): 指标说明
+            **labels: 标签
+
+        Returns:
+            Counter: 计数器
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._counters:
+                self._counters[key] = Counter()
+                self._help.setdefault(name, help_text)
+            return self._counters[key]
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_LATENCY_BUCKETS, **labels):
+        """
+        获取（不存在时创建）直方图
+
+        Args:
+            name (str): 指标名
+            help_text (str): 指标说明
+            buckets (tuple): 分桶上界
+            **labels: 标签
+
+        Returns:
+            Histogram: 直方图
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(buckets)
+                self._help.setdefault(name, help_text)
+            return self._histograms[key]
+
+    def timed(self, function_name):
+        """
+        函数耗时装饰器：记录延迟直方图与成功/失败调用次数
+
+        Args:
+            function_name (str): 函数标签
+
+        Returns:
+            callable: 装饰器
+        """
+        def decorator(function):
+            histogram = self.histogram(FUNCTION_LATENCY_METRIC, "函数调用耗时", function=function_name)
+            ok_counter = self.counter(FUNCTION_CALLS_METRIC, "函数调用次数", function=function_name, status='ok')
+            error_counter = self.counter(FUNCTION_CALLS_METRIC, "函数调用次数", function=function_name, status='error')
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = function(*args, **kwargs)
+                except Exception:
+                    error_counter.inc()
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+                ok_counter.inc()
+                return result
+
+            return wrapper
+
+        return decorator
+
+    def render_prometheus(self):
+        """
+        输出Prometheus文本格式
+
+        Returns:
+            str: 指标文本
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            help_texts = dict(self._help)
+
+        lines = []
+        declared = set()
+        for (name, labels), counter in counters:
+            if name not in declared:
+                lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {counter.value}")
+
+        for (name, labels), histogram in histograms:
+            if name not in declared:
+                lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            bucket_counts, count, total = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self, delta=False):
+        """
+        汇总函数延迟与计数器
+
+        Args:
+            delta (bool): 为True时只汇总自上次delta汇总以来的增量（用于每批次汇总）
+
+        Returns:
+            dict: {'functions': {函数: 调用数/失败数/耗时/分位数}, 'counters': {指标: 值}}
+        """
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = list(self._histograms.items())
+
+        current = {}
+        for key, histogram in histograms:
+            current[('histogram',) + key] = histogram.snapshot()
+        for key, counter in counters:
+            current[('counter',) + key] = counter.value
+
+        previous = self._last_summary if delta else {}
+        if delta:
+            self._last_summary = current
+
+        functions = {}
+        counter_values = {}
+        for key, value in current.items():
+            kind, name, labels = key
+            label_map = dict(labels)
+            if kind == 'histogram':
+                bucket_counts, count, total = value
+                if key in previous:
+                    previous_counts, previous_count, previous_total = previous[key]
+                    bucket_counts = [a - b for a, b in zip(bucket_counts, previous_counts)]
+                    count -= previous_count
+                    total -= previous_total
+                if count == 0 or name != FUNCTION_LATENCY_METRIC:
+                    continue
+                buckets = dict(histograms)[(name, labels)].buckets
+                functions[label_map['function']] = {
+                    'calls': count,
+                    'total_seconds': round(total, 4),
+                    'avg_ms': round(total / count * 1000, 3),
+                    'p50_ms': round(estimate_quantile(buckets, bucket_counts, 0.5) * 1000, 3),
+                    'p95_ms': round(estimate_quantile(buckets, bucket_counts, 0.95) * 1000, 3),
+                }
+            else:
+                value -= previous.get(key, 0)
+                if name == FUNCTION_CALLS_METRIC:
+                    if label_map.get('status') == 'error' and value:
+                        functions.setdefault(label_map['function'], {})['errors'] = value
+                    continue
+                if value:
+                    counter_values[name + _format_labels(labels)] = value
+        return {'functions': functions, 'counters': counter_values}
+
+
+# 进程级默认注册表
+REGISTRY = MetricsRegistry()
+
+
+def timed(function_name):
+    """使用默认注册表的函数耗时装饰器"""
+    return REGISTRY.timed(function_name)
+
+
+def start_metrics_server(host, port, registry=REGISTRY):
+    """
+    在后台线程启动本地指标端点
+
+    Args:
+        host (str): 监听地址
+        port (int): 监听端口
+        registry (MetricsRegistry): 指标注册表
+
+    Returns:
+        ThreadingHTTPServer: HTTP服务
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body = registry.render_prometheus().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path == '/metrics.json':
+                body = json.dumps(registry.summary(), ensure_ascii=False).encode('utf-8')
+                content_type = 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"指标端点已启动: http://{host}:{port}/metrics")
+    return server
+
+
+class BatchProfiler:
+    """
+    按批次的性能剖析：cProfile统计CPU耗时，tracemalloc统计内存分配增量
+    每批次输出 .prof（可用snakeviz等工具查看）与文本报告
+    Python 3.12起cProfile同一时刻只能有一个实例、且覆盖所有线程，主线程的剖析器即包含流水线工作线程
+    """
+
+    def __init__(self, output_dir, top_n=30):
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.batch_number = 0
+        self._profile = None
+        self._snapshot = None
+        os.makedirs(output_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+    def start(self):
+        """开始剖析一个批次（剖析调用线程；Python 3.12起为所有线程），开启失败时只告警"""
+        if self._profile is not None:
+            # 上一批次异常中断、未调用stop
+            self._profile.disable()
+        self.batch_number += 1
+        self._snapshot = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError as e:
+            logger.warning(f"cProfile开启失败，本批次只采集内存分配: {e}")
+            self._profile = None
+
+    def stop(self, extra_profiles=()):
+        """
+        结束剖析并写出报告
+
+        Args:
+            extra_profiles (list): 其他线程中采集的cProfile.Profile（如Python 3.12之前流水线各阶段的工作线程）
+
+        Returns:
+            str: 文本报告路径
+        """
+        profiles = list(extra_profiles)
+        if self._profile is not None:
+            self._profile.disable()
+            profiles.insert(0, self._profile)
+            self._profile = None
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+
+        prefix = os.path.join(self.output_dir, f"batch_{self.batch_number:05d}_{time.strftime('%Y%m%d_%H%M%S')}")
+        report = io.StringIO()
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(f"{prefix}.prof")
+
+            threads = '所有线程' if sys.version_info >= (3, 12) else f"含 {len(extra_profiles)} 个工作线程"
+            report.write(f"===== cProfile（按累计耗时前 {self.top_n} 项，{threads}）=====\n")
+            stats.stream = report
+            stats.sort_stats('cumulative').print_stats(self.top_n)
+        report.write(f"\n===== tracemalloc（当前 {current_bytes / 1024 / 1024:.1f}MB, "
+                     f"峰值 {peak_bytes / 1024 / 1024:.1f}MB，分配增量前 {self.top_n} 项）=====\n")
+        for diff in snapshot.compare_to(self._snapshot, 'lineno')[:self.top_n]:
+            report.write(f"{diff}\n")
+
+        report_path = f"{prefix}.txt"
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+        logger.info(f"批次 {self.batch_number} 剖析报告: {report_path}")
+        return report_path
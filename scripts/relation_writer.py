@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+打标结果缓冲写入器
+对应架构图中的“反馈明细+打标结果”与“重新打标明细”的写入：
+- 收集feedback_entity_relation与entity_precipitation_log的待写入行
+- 同一组的行（一个数据块内各反馈的全部打标结果）整体并入缓冲区，达到行数或时间阈值时
+  在一个事务内用多行executemany批量写入；自动刷新只发生在完整的组之间，
+  已写入的反馈不会只有部分打标结果（未打标探测会把这样的反馈视为已打标，缺失的行不会再生成）
+- 写入失败时行放回缓冲区并抛出异常，由调用方决定重试或丢弃（批次失败时丢弃，整批重新处理）
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# 支持缓冲写入的表及其列
+TABLE_COLUMNS = {
+    'feedback_entity_relation': ('feedback_id', 'entity_id', 'match_confidence'),
+    'entity_precipitation_log': ('feedback_id', 'entity_id', 'coze_confidence'),
+}
+
+FLUSH_LATENCY = REGISTRY.histogram('tagger_relation_flush_duration_seconds', "打标结果批量写入耗时")
+ROWS_WRITTEN = REGISTRY.counter('tagger_relation_rows_written_total', "打标结果写入行数")
+FLUSH_FAILURES = REGISTRY.counter('tagger_relation_flush_failures_total', "打标结果批量写入失败次数")
+ROWS_DROPPED = REGISTRY.counter('tagger_relation_rows_dropped_total', "批次失败时丢弃的缓冲行数")
+
+
+class BufferedRelationWriter:
+    """
+    线程安全的打标结果缓冲写入器
+    """
+
+    def __init__(self, db_client, max_rows=500, flush_interval=5.0):
+        self.db_client = db_client
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self._buffers = {table: [] for table in TABLE_COLUMNS}
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        # 当前线程正在收集的组（group()内为行列表）
+        self._local = threading.local()
+
+    @property
+    def pending(self):
+        """缓冲区中待写入的行数"""
+        return self._pending
+
+    def add(self, table, row):
+        """
+        加入一行待写入数据；在group()内时先暂存到当前组，否则直接进入缓冲区（不自动刷新）
+
+        Args:
+            table (str): 表名
+            row (dict): 行数据
+        """
+        columns = TABLE_COLUMNS[table]
+        values = tuple(row[column] for column in columns)
+        group_rows = getattr(self._local, 'rows', None)
+        if group_rows is not None:
+            group_rows.append((table, values))
+            return
+        with self._lock:
+            self._buffers[table].append(values)
+            self._pending += 1
+
+    @contextmanager
+    def group(self):
+        """
+        收集一组行：组内add()的行暂存在当前线程，正常结束时整体并入缓冲区并按阈值自动刷新，
+        抛出异常时丢弃；嵌套使用时并入最外层的组
+        """
+        if getattr(self._local, 'rows', None) is not None:
+            yield
+            return
+
+        self._local.rows = []
+        try:
+            yield
+            rows = self._local.rows
+        finally:
+            self._local.rows = None
+
+        with self._lock:
+            for table, values in rows:
+                self._buffers[table].append(values)
+            self._pending += len(rows)
+            should_flush = (self._pending >= self.max_rows
+                            or time.monotonic() - self._last_flush >= self.flush_interval)
+        if should_flush:
+            try:
+                self.flush()
+            except Exception as e:
+                # 行已放回缓冲区，下次刷新（最迟在批次结束时）重试
+                logger.warning(f"打标结果自动刷新失败，{self._pending} 行保留在缓冲区: {e}")
+
+    def flush(self):
+        """
+        在一个事务内写入所有缓冲行
+
+        Returns:
+            int: 写入的行数
+
+        Raises:
+            Exception: 写入失败（事务已回滚，行已放回缓冲区）
+        """
+        with self._lock:
+            buffers = self._buffers
+            pending = self._pending
+            self._buffers = {table: [] for table in TABLE_COLUMNS}
+            self._pending = 0
+            self._last_flush = time.monotonic()
+
+        if pending == 0:
+            return 0
+
+        statements = []
+        for table, rows in buffers.items():
+            if rows:
+                columns = TABLE_COLUMNS[table]
+                placeholders = ', '.join(['%s'] * len(columns))
+                sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+                statements.append((sql, rows))
+
+        start = time.perf_counter()
+        try:
+            self.db_client.execute_many(statements)
+        except Exception as e:
+            self._requeue(buffers, pending)
+            FLUSH_FAILURES.inc()
+            logger.error(f"打标结果批量写入失败，{pending} 行放回缓冲区: {e}")
+            raise
+        elapsed = time.perf_counter() - start
+        FLUSH_LATENCY.observe(elapsed)
+        ROWS_WRITTEN.inc(pending)
+
+        logger.info(f"打标结果批量写入完成: {pending} 行, 耗时 {elapsed:.3f}s")
+        return pending
+
+    def _requeue(self, buffers, pending):
+        """将写入失败的行放回缓冲区头部，保持原有顺序"""
+        with self._lock:
+            for table, rows in buffers.items():
+                self._buffers[table][:0] = rows
+            self._pending += pending
+
+    def discard(self):
+        """
+        丢弃缓冲区中的全部行（批次失败、进度未提交时使用，整批重新处理时会重新生成这些行）
+
+        Returns:
+            int: 丢弃的行数
+        """
+        with self._lock:
+            pending = self._pending
+            self._buffers = {table: [] for table in TABLE_COLUMNS}
+            self._pending = 0
+            self._last_flush = time.monotonic()
+
+        if pending:
+            ROWS_DROPPED.inc(pending)
+            logger.warning(f"批次失败，丢弃缓冲区中 {pending} 行打标结果")
+        return pending
+
+    def close(self):
+        """
+        进程退出前写入剩余缓冲行，失败时只记录日志
+
+        Returns:
+            int: 写入的行数
+        """
+        try:
+            return self.flush()
+        except Exception as e:
+            logger.error(f"退出前写入打标结果失败，{self._pending} 行未写入: {e}")
+            return 0
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分阶段流水线
+- 每个阶段有独立的工作线程数，阶段之间通过有界队列衔接，CPU密集与IO密集的阶段互相重叠
+- 数据块带序号流转，ordered阶段按序号重排后再处理，保证与顺序执行的结果一致
+- 统计每个阶段的处理块数与忙碌时间，可选对各工作线程做cProfile剖析
+- 数据块处理失败或数据源读取失败时不再读取新数据块，已读取的数据块处理完毕后run()抛出异常，
+  调用方据此不提交该批进度（单条数据的容错由各阶段的处理函数自行负责）
+- 工作线程异常退出时仍通知下游结束并排空自己的输入队列，流水线不会挂起，run()随后抛出该异常
+"""
+
+import cProfile
+import logging
+import queue
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 阶段结束标记
+_STOP = object()
+
+# Python 3.12起cProfile基于sys.monitoring，同一时刻只能有一个剖析器且覆盖所有线程：
+# 调用方在主线程开启的剖析器已包含工作线程，此时不再为各工作线程单独采集
+PER_THREAD_PROFILING = sys.version_info < (3, 12)
+
+
+class PipelineStage:
+    """
+    流水线阶段定义
+
+    Args:
+        name (str): 阶段名称
+        function (callable): 处理函数，接收上游数据块，返回交给下游的数据块
+        workers (int): 工作线程数
+        ordered (bool): 是否按数据块序号依次处理（仅支持单线程）
+    """
+
+    def __init__(self, name, function, workers=1, ordered=False):
+        if ordered and workers != 1:
+            raise ValueError(f"有序阶段只能使用单个工作线程: {name}")
+        self.name = name
+        self.function = function
+        self.workers = max(1, workers)
+        self.ordered = ordered
+        self.items = 0
+        self.failed_items = 0
+        self.first_error = None
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def process(self, item):
+        """
+        执行处理函数并记录耗时；失败时记录异常，上游失败的数据块（None）直接透传
+
+        Args:
+            item: 数据块
+
+        Returns:
+            处理结果，失败时返回None
+        """
+        if item is None:
+            return None
+
+        start = time.perf_counter()
+        try:
+            return self.function(item)
+        except Exception as e:
+            logger.error(f"流水线阶段 {self.name} 处理失败: {e}")
+            with self._lock:
+                self.failed_items += 1
+                if self.first_error is None:
+                    self.first_error = e
+            return None
+        finally:
+            with self._lock:
+                self.items += 1
+                self.busy_seconds += time.perf_counter() - start
+
+
+class StagedPipeline:
+    """
+    由有界队列连接的多阶段流水线
+    """
+
+    def __init__(self, stages, queue_size=4, source_name='fetch', profile=False):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.source_name = source_name
+        self.profile = profile
+        # 各工作线程的cProfile结果（profile=True且PER_THREAD_PROFILING时）
+        self.profiles = []
+        self._lock = threading.Lock()
+        self.source_items = 0
+        self.source_seconds = 0.0
+        self.elapsed = 0.0
+        self._source_error = None
+        self._errors = []
+
+    def run(self, source):
+        """
+        运行流水线直到数据源耗尽且所有阶段处理完毕
+
+        Args:
+            source (iterable): 数据源，在调用线程中迭代（作为第一个阶段）
+
+        Returns:
+            list: 最后一个阶段的输出（按数据块序号排列）
+
+        Raises:
+            RuntimeError: 数据源读取失败、有数据块处理失败或有工作线程异常退出（部分数据块未处理）
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = {}
+        results_lock = threading.Lock()
+        threads = []
+        start = time.perf_counter()
+
+        for index, stage in enumerate(self.stages):
+            output_queue = queues[index + 1] if index + 1 < len(self.stages) else None
+            next_workers = self.stages[index + 1].workers if output_queue is not None else 0
+            remaining_workers = [stage.workers]
+
+            def emit(seq, result, output_queue=output_queue):
+                if output_queue is not None:
+                    output_queue.put((seq, result))
+                elif result is not None:
+                    with results_lock:
+                        results[seq] = result
+
+            def finish(stage=stage, remaining_workers=remaining_workers,
+                       output_queue=output_queue, next_workers=next_workers):
+                # 最后一个退出的工作线程通知下游阶段结束
+                with stage._lock:
+                    remaining_workers[0] -= 1
+                    is_last = remaining_workers[0] == 0
+                if is_last and output_queue is not None:
+                    for _ in range(next_workers):
+                        output_queue.put(_STOP)
+
+            target = self._ordered_worker if stage.ordered else self._worker
+            for worker_index in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._run_worker,
+                    args=(target, stage, queues[index], emit, finish),
+                    name=f"pipeline-{stage.name}-{worker_index}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        self._feed(source, queues[0], self.stages[0].workers)
+
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - start
+        if self._errors:
+            stage_name, error = self._errors[0]
+            raise RuntimeError(f"流水线阶段 {stage_name} 工作线程异常退出: {error!r}") from error
+        if self._source_error is not None:
+            raise RuntimeError(f"流水线阶段 {self.source_name} 读取失败: {self._source_error!r}") \
+                from self._source_error
+        for stage in self.stages:
+            if stage.failed_items:
+                raise RuntimeError(f"流水线阶段 {stage.name} 处理失败 {stage.failed_items} 块: "
+                                   f"{stage.first_error!r}") from stage.first_error
+        return [results[seq] for seq in sorted(results)]
+
+    def _failed(self):
+        """是否已有数据块处理失败或工作线程异常退出"""
+        return bool(self._errors) or any(stage.failed_items for stage in self.stages)
+
+    def _feed(self, source, output_queue, workers):
+        """在当前线程迭代数据源，为数据块编号后送入第一个阶段；已有失败时停止读取"""
+        seq = 0
+        iterator = iter(source)
+        try:
+            while not self._failed():
+                fetch_start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    self.source_seconds += time.perf_counter() - fetch_start
+                output_queue.put((seq, item))
+                seq += 1
+                self.source_items += 1
+        except Exception as e:
+            logger.error(f"流水线阶段 {self.source_name} 读取失败: {e}")
+            self._source_error = e
+        finally:
+            for _ in range(workers):
+                output_queue.put(_STOP)
+
+    def _run_worker(self, target, *args):
+        """执行工作线程主循环，profile=True时在该线程内采集cProfile（开启失败时只告警，照常处理）"""
+        profile = None
+        if self.profile and PER_THREAD_PROFILING:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                logger.warning(f"工作线程 {threading.current_thread().name} 剖析开启失败，不采集该线程: {e}")
+                profile = None
+
+        try:
+            target(*args)
+        except BaseException as e:
+            # 工作线程已通知下游并排空输入队列，由run()在所有线程结束后抛出
+            with self._lock:
+                self._errors.append((args[0].name, e))
+        finally:
+            if profile is not None:
+                profile.disable()
+                with self._lock:
+                    self.profiles.append(profile)
+
+    @staticmethod
+    def _drain(input_queue):
+        """丢弃输入队列中直到结束标记的数据块，使上游不会阻塞在已满的队列上"""
+        while input_queue.get() is not _STOP:
+            pass
+
+    @staticmethod
+    def _worker(stage, input_queue, emit, finish):
+        try:
+            while True:
+                entry = input_queue.get()
+                if entry is _STOP:
+                    break
+                seq, item = entry
+                emit(seq, stage.process(item))
+        except BaseException:
+            logger.exception(f"流水线阶段 {stage.name} 工作线程异常退出")
+            StagedPipeline._drain(input_queue)
+            raise
+        finally:
+            finish()
+
+    @staticmethod
+    def _ordered_worker(stage, input_queue, emit, finish):
+        pending = {}
+        next_seq = 0
+        entry = None
+        try:
+            while True:
+                entry = input_queue.get()
+                if entry is _STOP:
+                    break
+                seq, item = entry
+                pending[seq] = item
+                while next_seq in pending:
+                    emit(next_seq, stage.process(pending.pop(next_seq)))
+                    next_seq += 1
+            # 上游已全部结束，剩余数据块按序处理
+            for seq in sorted(pending):
+                emit(seq, stage.process(pending[seq]))
+        except BaseException:
+            logger.exception(f"流水线阶段 {stage.name} 工作线程异常退出")
+            if entry is not _STOP:
+                StagedPipeline._drain(input_queue)
+            raise
+        finally:
+            finish()
+
+    def stats(self):
+        """
+        获取各阶段的处理块数、忙碌时间及利用率
+
+        Returns:
+            dict: 阶段名 -> {'workers', 'items', 'busy_seconds', 'utilization'}（处理阶段另含'failed_items'）
+        """
+        elapsed = max(self.elapsed, 1e-9)
+        report = {self.source_name: {
+            'workers': 1,
+            'items': self.source_items,
+            'busy_seconds': round(self.source_seconds, 4),
+            'utilization': round(self.source_seconds / elapsed, 4)
+        }}
+        for stage in self.stages:
+            report[stage.name] = {
+                'workers': stage.workers,
+                'items': stage.items,
+                'failed_items': stage.failed_items,
+                'busy_seconds': round(stage.busy_seconds, 4),
+                'utilization': round(stage.busy_seconds / elapsed / stage.workers, 4)
+            }
+        return report
+
+    def log_stats(self):
+        """输出各阶段的处理块数、忙碌时间及占总耗时的比例"""
+        for name, values in self.stats().items():
+            logger.info(f"流水线阶段 {name} x{values['workers']}: {values['items']} 块, "
+                        f"忙碌 {values['busy_seconds']:.2f}s ({values['utilization']:.0%})")
+        logger.info(f"流水线总耗时: {self.elapsed:.2f}s")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+启动耗时统计
+- 记录模块导入、模型加载、数据库连接等初始化步骤的耗时
+- 启动完成后输出一份耗时报告，便于定位启动慢的环节
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_steps = []
+
+
+def record_step(name, elapsed):
+    """
+    记录一个初始化步骤的耗时
+
+    Args:
+        name (str): 步骤名称
+        elapsed (float): 耗时（秒）
+    """
+    with _lock:
+        _steps.append((name, elapsed))
+    logger.info(f"初始化 {name}: {elapsed:.3f}s")
+
+
+@contextmanager
+def timed_step(name):
+    """
+    统计代码块耗时并记录为初始化步骤（代码块抛出异常时不记录）
+
+    Args:
+        name (str): 步骤名称
+    """
+    start = time.perf_counter()
+    yield
+    record_step(name, time.perf_counter() - start)
+
+
+def log_startup_report(title="启动耗时报告"):
+    """
+    输出目前为止已完成的初始化步骤耗时
+
+    Args:
+        title (str): 报告标题
+    """
+    with _lock:
+        steps = list(_steps)
+
+    total = sum(elapsed for _, elapsed in steps)
+    logger.info(f"----- {title}（合计 {total:.3f}s）-----")
+    for name, elapsed in steps:
+        logger.info(f"  {name}: {elapsed:.3f}s")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+实体组合的列式聚合
+- 统计SQL按 (反馈, 实体类型, 实体值) 展开返回，不再逐行解析JSON
+- 实体类型与 (类型, 值) 对在全局词表中编码为整数，同一反馈的实体写入 反馈 × 类型 的编码矩阵
+- 用pandas对矩阵按行分组计数，Python层循环只发生在每块去重后的组合上
+"""
+
+import numpy as np
+import pandas as pd
+
+# 编码矩阵中表示“该反馈无此类型实体”的值
+_MISSING = -1
+
+
+class EntityCombinationAggregator:
+    """
+    按块累计实体组合计数
+
+    输入的每块DataFrame包含 feedback_id、entity_type、entity_value 三列，
+    同一反馈的行不能跨块（见 iter_feedback_frames）
+    """
+
+    def __init__(self):
+        self.total_feedbacks = 0
+        self._type_codes = {}
+        self._types = []
+        self._pair_codes = {}
+        self._pairs = []
+        self._counts = {}
+
+    def _intern(self, vocabulary, items, values):
+        """将本块的唯一值映射为全局编码，返回与values对应的编码数组"""
+        codes = np.empty(len(values), dtype=np.int64)
+        for position, value in enumerate(values):
+            code = vocabulary.get(value)
+            if code is None:
+                code = len(items)
+                vocabulary[value] = code
+                items.append(value)
+            codes[position] = code
+        return codes
+
+    def add(self, frame):
+        """
+        累计一块展开后的关系行
+
+        Args:
+            frame (DataFrame): feedback_id, entity_type, entity_value
+        """
+        if frame.empty:
+            return
+
+        feedback_codes, feedback_ids = pd.factorize(frame['feedback_id'], sort=False)
+        self.total_feedbacks += len(feedback_ids)
+
+        # 1. 过滤空类型/空值（与原逻辑一致：不计入组合，但反馈计入总数）
+        valid = (frame['entity_type'].notna() & frame['entity_value'].notna()
+                 & (frame['entity_type'] != '') & (frame['entity_value'] != '')).to_numpy()
+        if not valid.any():
+            return
+        feedback_codes = feedback_codes[valid]
+        types = frame['entity_type'].to_numpy()[valid]
+        values = frame['entity_value'].to_numpy()[valid]
+
+        # 2. 类型与 (类型, 值) 对编码为全局整数（只对本块唯一值做字典查找）
+        type_local, type_uniques = pd.factorize(types, sort=False)
+        value_local, value_uniques = pd.factorize(values, sort=False)
+        type_codes = self._intern(self._type_codes, self._types, type_uniques)[type_local]
+        pair_local = type_local.astype(np.int64) * len(value_uniques) + value_local
+        pair_unique_local, pair_inverse = np.unique(pair_local, return_inverse=True)
+        pair_uniques = [
+            (type_uniques[code // len(value_uniques)], value_uniques[code % len(value_uniques)])
+            for code in pair_unique_local
+        ]
+        pair_codes = self._intern(self._pair_codes, self._pairs, pair_uniques)[pair_inverse.ravel()]
+
+        # 3. 写入 反馈 × 类型 编码矩阵；同一反馈同一类型出现多次时保留最后一个值
+        matrix = np.full((len(feedback_ids), len(self._types)), _MISSING, dtype=np.int64)
+        last = ~pd.DataFrame({'f': feedback_codes, 't': type_codes}).duplicated(keep='last').to_numpy()
+        matrix[feedback_codes[last], type_codes[last]] = pair_codes[last]
+
+        # 4. 按行分组计数（哈希分组，无需排序）；矩阵列按全局类型编码排列，非缺失编码序列即组合的规范键
+        matrix = matrix[(matrix != _MISSING).any(axis=1)]
+        if len(matrix) == 0:
+            return
+        for row, count in pd.DataFrame(matrix).value_counts(sort=False).items():
+            key = tuple(int(code) for code in row if code != _MISSING)
+            self._counts[key] = self._counts.get(key, 0) + int(count)
+
+    def combinations(self):
+        """
+        获取累计的组合计数
+
+        Returns:
+            list: (实体列表, 反馈数) 列表，实体列表元素为 {'entity_type', 'entity_value'}
+        """
+        result = []
+        for key, count in self._counts.items():
+            entities = [
+                {'entity_type': self._pairs[code][0], 'entity_value': self._pairs[code][1]}
+                for code in key
+            ]
+            result.append((entities, count))
+        return result
+
+
+def iter_feedback_frames(row_chunks):
+    """
+    将按feedback_id排序的流式行块整理为不拆分反馈的DataFrame块
+    每块末尾反馈的行暂存，与下一块合并后再输出
+
+    Args:
+        row_chunks (iterable): 行字典列表的迭代器（如DatabaseClient.stream_rows）
+
+    Yields:
+        DataFrame: feedback_id, entity_type, entity_value
+    """
+    carry = None
+    for rows in row_chunks:
+        frame = pd.DataFrame(rows, columns=['feedback_id', 'entity_type', 'entity_value'])
+        if carry is not None:
+            frame = pd.concat([carry, frame], ignore_index=True)
+        tail = frame['feedback_id'].to_numpy() == frame['feedback_id'].iloc[-1]
+        carry = frame[tail]
+        if not tail.all():
+            yield frame[~tail]
+    if carry is not None and not carry.empty:
+        yield carry
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试实体向量内存索引的脚本（模拟数据，不依赖数据库）
+用于验证向量编解码往返、索引加载与增量刷新，
+以及单条检索、批量检索与SQL检索（余弦相似度过滤 + 降序排列）的结果一致
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 导入需要测试的类
+from entity_index import EntityIndex
+from vector_codec import encode_vector, decode_vector, to_sql_vector, parse_sql_vector, to_vector
+
+# 测试向量维度与相似度阈值（与VECTOR_MATCH_THRESHOLD默认值一致）
+DIMENSION = 64
+MATCH_THRESHOLD = 0.5
+
+
+class FakeEntityClient:
+    """
+    模拟entity_vector_lib查询的数据库客户端
+    返回全部行，或按 "create_time >= %s" 条件过滤后的行
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def query_sql(self, sql, params=None):
+        self.queries.append((sql, params))
+        rows = self.rows
+        if params:
+            rows = [row for row in rows if row['create_time'] >= params[0]]
+        return pd.DataFrame(rows, columns=[
+            'entity_id', 'type_name', 'entity_value', 'entity_vector_bin', 'entity_vector', 'create_time'
+        ])
+
+
+def make_entity_rows(vectors, start_time, first_id=0):
+    """
+    生成实体行：轮流使用float32二进制、float16二进制与仅有VECTOR文本三种存储形式
+
+    Args:
+        vectors (ndarray): 实体向量矩阵
+        start_time (datetime): 第一个实体的create_time
+        first_id (int): 第一个实体的编号
+
+    Returns:
+        list: 实体行字典列表
+    """
+    rows = []
+    for offset, vector in enumerate(vectors):
+        number = first_id + offset
+        storage = number % 3
+        rows.append({
+            'entity_id': f"entity-{number}",
+            'type_name': f"type-{number % 5}",
+            'entity_value': f"value-{number}",
+            'entity_vector_bin': encode_vector(vector, 'float16' if storage == 1 else 'float32') if storage < 2 else None,
+            'entity_vector': to_sql_vector(vector),
+            'create_time': start_time + timedelta(seconds=number),
+        })
+    return rows
+
+
+def sql_reference(index, vector, min_similarity):
+    """
+    按SQL检索的语义计算结果：VECTOR_SIMILARITY > 阈值，ORDER BY match_confidence DESC
+
+    Args:
+        index (EntityIndex): 实体向量索引（只读取其中的实体与向量）
+        vector (ndarray): 查询向量
+        min_similarity (float): 相似度下限（不含）
+
+    Returns:
+        list: (entity_id, 相似度) 列表
+    """
+    matrix = index.matrix.astype(np.float64)
+    query = np.asarray(vector, dtype=np.float64)
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return []
+    similarities = matrix @ (query / norm) / np.linalg.norm(matrix, axis=1)
+    order = np.argsort(-similarities, kind='stable')
+    return [(index.entity_ids[i], similarities[i]) for i in order if similarities[i] > min_similarity]
+
+
+def same_matches(actual, expected, tolerance=1e-5):
+    """比较检索结果与参考结果：实体顺序一致且相似度在容差内"""
+    if [match['entity_id'] for match in actual] != [entity_id for entity_id, _ in expected]:
+        return False
+    return all(abs(match['match_confidence'] - score) <= tolerance for match, (_, score) in zip(actual, expected))
+
+
+def run_check(check):
+    """
+    以脚本方式运行一项检查（检查以assert表达失败，也可由pytest收集）
+
+    Args:
+        check (callable): 检查函数
+
+    Returns:
+        bool: 是否通过
+    """
+    try:
+        check()
+        return True
+    except AssertionError as e:
+        logger.error(f"{check.__name__} 未通过: {e}")
+        return False
+
+
+def test_vector_codec(seed=5):
+    """
+    向量编解码往返：float32二进制无损，float16二进制在精度内，VECTOR文本按float32无损
+    """
+    logger.info("开始测试向量编解码")
+    rng = np.random.default_rng(seed)
+    vector = rng.normal(size=DIMENSION).astype(np.float32)
+
+    checks = {
+        'float32二进制': np.array_equal(decode_vector(encode_vector(vector), DIMENSION), vector),
+        'float16二进制': np.allclose(decode_vector(encode_vector(vector, 'float16'), DIMENSION), vector,
+                                     rtol=1e-3, atol=1e-3),
+        'VECTOR文本': np.array_equal(parse_sql_vector(to_sql_vector(vector)), vector),
+        '历史文本格式': np.array_equal(parse_sql_vector(to_sql_vector(vector).strip('[]')), vector),
+        '文本字节串': np.array_equal(to_vector(to_sql_vector(vector).encode('utf-8'), DIMENSION), vector),
+        'memoryview': np.array_equal(to_vector(memoryview(encode_vector(vector)), DIMENSION), vector),
+        '长度不匹配': decode_vector(encode_vector(vector), DIMENSION + 1) is None,
+        '空值': to_vector(None) is None and to_vector(float('nan')) is None and parse_sql_vector('[]') is None,
+    }
+    if to_vector(encode_vector(vector), DIMENSION).dtype != np.float32:
+        checks['float32类型'] = False
+
+    failed = [name for name, passed in checks.items() if not passed]
+    assert not failed, f"向量编解码错误: {failed}"
+    logger.info(f"向量编解码正确: {len(checks)} 项")
+
+
+def test_index_load_and_refresh(seed=6):
+    """
+    索引从数据库加载三种存储形式的向量，增量刷新只查询回看窗口内的实体并按entity_id覆盖
+    """
+    logger.info("开始测试索引加载与增量刷新")
+    rng = np.random.default_rng(seed)
+    start_time = datetime(2024, 1, 1)
+    rows = make_entity_rows(rng.normal(size=(30, DIMENSION)), start_time)
+    # 一个无任何向量的实体，加载时跳过
+    rows.append({'entity_id': 'entity-empty', 'type_name': 'type-0', 'entity_value': 'empty',
+                 'entity_vector_bin': None, 'entity_vector': None, 'create_time': start_time})
+    client = FakeEntityClient(rows)
+
+    index = EntityIndex(DIMENSION, initial_capacity=4)
+    loaded = index.load(client)
+    assert loaded == 30 and len(index) == 30 and index.loaded_until == start_time + timedelta(seconds=29), \
+        f"索引加载错误: 加载={loaded}, 大小={len(index)}, 加载到={index.loaded_until}"
+
+    # 其他进程新沉淀的实体，以及一个被更新的已有实体
+    client.rows = rows + make_entity_rows(rng.normal(size=(5, DIMENSION)), start_time, first_id=30)
+    client.rows[0] = dict(client.rows[0], entity_value='value-0-updated', create_time=start_time + timedelta(seconds=40))
+    refreshed = index.refresh(client, overlap_seconds=10)
+
+    since = client.queries[-1][1][0]
+    assert since == start_time + timedelta(seconds=19) and refreshed == 17 and len(index) == 35, \
+        f"增量刷新错误: 起始={since}, 刷新={refreshed}, 大小={len(index)}"
+    assert index.entity_values[0] == 'value-0-updated' and index.loaded_until == start_time + timedelta(seconds=40), \
+        "增量刷新未覆盖已有实体"
+    assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0, atol=1e-5), "索引向量未归一化"
+    logger.info(f"索引加载与增量刷新正确: {len(index)} 个实体")
+
+
+def test_search_consistency(entity_count=500, query_count=200, seed=7):
+    """
+    单条检索、批量检索与SQL检索语义的结果一致（含top-k截断与零向量查询）
+    """
+    logger.info("开始测试检索一致性")
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(20, DIMENSION))
+
+    def around_topics(count):
+        # 同一主题加噪声，使相似度分布跨过阈值
+        return topics[rng.integers(len(topics), size=count)] + rng.normal(scale=0.8, size=(count, DIMENSION))
+
+    index = EntityIndex(DIMENSION)
+    for position, vector in enumerate(around_topics(entity_count)):
+        index.add(f"entity-{position}", f"type-{position % 5}", f"value-{position}", vector)
+
+    queries = around_topics(query_count).astype(np.float32)
+    queries[0] = 0.0
+
+    matched = 0
+    for top_k in (None, 3):
+        batch_results = index.search_batch(queries, top_k=top_k, min_similarity=MATCH_THRESHOLD)
+        assert len(batch_results) == query_count, f"批量检索结果数量错误: {len(batch_results)}"
+        for position, query in enumerate(queries):
+            expected = sql_reference(index, query, MATCH_THRESHOLD)[:top_k]
+            single = index.search(query, top_k=top_k, min_similarity=MATCH_THRESHOLD)
+            assert same_matches(single, expected) and same_matches(batch_results[position], expected), \
+                (f"检索结果不一致: 查询={position}, top_k={top_k}, "
+                 f"单条={len(single)}, 批量={len(batch_results[position])}, SQL={len(expected)}")
+            matched += len(expected)
+
+    assert matched > 0, "测试数据没有任何相似度超过阈值的实体"
+    logger.info(f"单条检索、批量检索与SQL检索一致: {query_count} 条查询, 共 {matched} 个匹配")
+
+
+def main():
+    """
+    主函数
+    """
+    logger.info("===== 实体向量索引测试开始 =====")
+
+    results = [run_check(check) for check in (
+        test_vector_codec,
+        test_index_load_and_refresh,
+        test_search_consistency,
+    )]
+
+    logger.info(f"===== 实体向量索引测试结束: {sum(results)}/{len(results)} 通过 =====")
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试打标流水线的脚本（模拟数据，不依赖数据库与Coze）
+用于验证分阶段流水线的输出顺序、数据块与数据源失败、工作线程异常退出与剖析模式，
+批次在自动刷新之后失败时已写入的反馈打标结果完整，以及低置信度反馈增量聚类与整批贪心聚类的结果一致
+"""
+
+import os
+import sys
+import random
+import tempfile
+import threading
+import logging
+
+import numpy as np
+from dotenv import load_dotenv
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 导入需要测试的类
+from metrics import BatchProfiler
+from relation_writer import BufferedRelationWriter
+from stage_pipeline import PipelineStage, StagedPipeline
+
+# 单个流水线运行的超时秒数，超时视为挂起
+RUN_TIMEOUT_SECONDS = 30
+
+
+def run_with_timeout(pipeline, source):
+    """
+    在后台线程运行流水线，超时视为挂起
+
+    Args:
+        pipeline (StagedPipeline): 流水线
+        source (iterable): 数据源
+
+    Returns:
+        tuple: (是否按时结束, 输出列表, 异常)
+    """
+    outcome = {'results': None, 'error': None}
+
+    def target():
+        try:
+            outcome['results'] = pipeline.run(source)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(RUN_TIMEOUT_SECONDS)
+    return not thread.is_alive(), outcome['results'], outcome['error']
+
+
+def run_check(check):
+    """
+    以脚本方式运行一项检查（检查以assert表达失败，也可由pytest收集）
+
+    Args:
+        check (callable): 检查函数
+
+    Returns:
+        bool: 是否通过
+    """
+    try:
+        check()
+        return True
+    except AssertionError as e:
+        logger.error(f"{check.__name__} 未通过: {e}")
+        return False
+
+
+def jittered(function, seed=1):
+    """包装处理函数，随机让出线程，打乱多工作线程阶段的完成顺序"""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def wrapper(item):
+        with lock:
+            spins = rng.randint(0, 2000)
+        for _ in range(spins):
+            pass
+        return function(item)
+
+    return wrapper
+
+
+def test_pipeline_order():
+    """
+    多工作线程阶段乱序完成时，有序阶段仍按数据块序号处理，最终输出按序号排列
+    """
+    logger.info("开始测试流水线输出顺序")
+    seen_by_ordered = []
+    pipeline = StagedPipeline([
+        PipelineStage('square', jittered(lambda x: x * x), workers=4),
+        PipelineStage('ordered', lambda x: seen_by_ordered.append(x) or x, ordered=True),
+        PipelineStage('plus', jittered(lambda x: x + 1, seed=2), workers=3),
+    ], queue_size=2)
+
+    finished, results, error = run_with_timeout(pipeline, range(200))
+    assert finished and error is None, f"流水线运行错误: 结束={finished}, 异常={error}"
+    assert results == [x * x + 1 for x in range(200)], "流水线输出顺序错误"
+    assert seen_by_ordered == [x * x for x in range(200)], "有序阶段未按数据块序号处理"
+    assert pipeline.stats()['square']['items'] == 200, f"阶段统计错误: {pipeline.stats()}"
+    logger.info("流水线输出顺序正确")
+
+
+def test_pipeline_failed_items():
+    """
+    处理函数抛出异常的数据块不进入下游；数据源停止读取新数据块，已读取的处理完毕后run()抛出异常
+    """
+    logger.info("开始测试数据块处理失败")
+
+    def fail_on_seven(x):
+        if x == 7:
+            raise ValueError(f"模拟失败: {x}")
+        return x
+
+    downstream_calls = []
+    pipeline = StagedPipeline([
+        PipelineStage('check', fail_on_seven, workers=2),
+        PipelineStage('record', lambda x: downstream_calls.append(x) or x, ordered=True),
+    ], queue_size=1)
+
+    finished, results, error = run_with_timeout(pipeline, range(200))
+    assert finished, "数据块处理失败后流水线挂起"
+    assert isinstance(error, RuntimeError) and 'check' in str(error), f"数据块处理失败后run()未抛出异常: {error}"
+    assert 7 not in downstream_calls and downstream_calls == sorted(downstream_calls), \
+        f"失败数据块进入下游: {downstream_calls}"
+    assert pipeline.source_items < 200, "数据块处理失败后仍读取了全部数据源"
+    assert pipeline.stats()['check']['failed_items'] == 1, f"阶段统计错误: {pipeline.stats()}"
+    logger.info(f"数据块处理失败正确: 读取 {pipeline.source_items} 块后停止, {error}")
+
+
+def test_pipeline_source_error():
+    """
+    数据源中途抛出异常时，已读取的数据块照常处理，run()随后抛出异常
+    """
+    logger.info("开始测试数据源读取失败")
+
+    def source():
+        yield from range(5)
+        raise ValueError("模拟数据源失败")
+
+    processed = []
+    pipeline = StagedPipeline([PipelineStage('identity', lambda x: processed.append(x) or x, workers=2)],
+                              queue_size=1)
+    finished, results, error = run_with_timeout(pipeline, source())
+    assert finished, "数据源读取失败后流水线挂起"
+    assert isinstance(error, RuntimeError) and isinstance(error.__cause__, ValueError), \
+        f"数据源读取失败后run()未抛出异常: {error}"
+    assert sorted(processed) == list(range(5)) and pipeline.source_items == 5, f"已读取的数据块未处理完: {processed}"
+    logger.info(f"数据源读取失败处理正确: {error}")
+
+
+def check_worker_death(ordered):
+    """
+    工作线程异常退出（处理函数之外的异常）时流水线不挂起，run()抛出异常
+
+    Args:
+        ordered (bool): 异常退出的是否为有序阶段
+    """
+    logger.info(f"开始测试工作线程异常退出（{'有序' if ordered else '并行'}阶段）")
+
+    def die_on_ten(x):
+        if x == 10:
+            # SystemExit不属于Exception，不会被PipelineStage.process捕获
+            raise SystemExit("模拟工作线程退出")
+        return x
+
+    pipeline = StagedPipeline([
+        PipelineStage('first', lambda x: x, workers=2),
+        PipelineStage('dying', die_on_ten, ordered=ordered),
+        PipelineStage('last', lambda x: x, workers=2),
+    ], queue_size=1)
+
+    finished, results, error = run_with_timeout(pipeline, range(100))
+    assert finished, "工作线程异常退出后流水线挂起"
+    assert isinstance(error, RuntimeError), f"工作线程异常退出后run()未抛出异常: 输出={results}"
+    logger.info(f"工作线程异常退出处理正确: {error}")
+
+
+def test_pipeline_worker_death_parallel():
+    """并行阶段的工作线程异常退出"""
+    check_worker_death(ordered=False)
+
+
+def test_pipeline_worker_death_ordered():
+    """有序阶段的工作线程异常退出"""
+    check_worker_death(ordered=True)
+
+
+def test_pipeline_profile():
+    """
+    剖析模式（与--profile相同：主线程BatchProfiler + 流水线profile=True）不挂起并写出报告；
+    Python 3.12起cProfile同一时刻只能有一个实例，工作线程不再单独采集
+    """
+    logger.info(f"开始测试剖析模式（Python {sys.version_info.major}.{sys.version_info.minor}）")
+    with tempfile.TemporaryDirectory() as output_dir:
+        profiler = BatchProfiler(output_dir)
+        for _ in range(2):
+            profiler.start()
+            pipeline = StagedPipeline([
+                PipelineStage('square', lambda x: x * x, workers=2),
+                PipelineStage('ordered', lambda x: x, ordered=True),
+            ], queue_size=2, profile=True)
+            finished, results, error = run_with_timeout(pipeline, range(100))
+            assert finished and error is None, f"剖析模式下流水线运行错误: 结束={finished}, 异常={error}"
+            assert results == [x * x for x in range(100)], "剖析模式下流水线输出错误"
+            report_path = profiler.stop(pipeline.profiles)
+            with open(report_path, 'r', encoding='utf-8') as f:
+                assert 'cProfile' in f.readline(), f"剖析报告缺少cProfile部分: {report_path}"
+        logger.info(f"剖析模式正确，工作线程独立剖析 {len(pipeline.profiles)} 个")
+
+
+class FakeRelationClient:
+    """模拟打标结果写入的数据库客户端，记录每次事务写入的行"""
+
+    def __init__(self):
+        self.written = []
+
+    def execute_many(self, statements, idempotent=False):
+        for sql, rows in statements:
+            table = sql.split()[2]
+            self.written.extend((table, row) for row in rows)
+
+
+def test_relation_writer_batch_failure(feedback_count=60, chunk_size=6, failing_chunk=7):
+    """
+    批次中途失败（此前已发生自动刷新）时，已写入的每条反馈都有完整的打标结果与重新打标明细，
+    失败数据块及未刷新的行被丢弃，整批重新处理时由未打标探测重新获取
+    """
+    logger.info("开始测试批次失败时打标结果的完整性")
+    client = FakeRelationClient()
+    # 每条反馈4行，行数阈值3：逐行自动刷新必然拆开同一条反馈
+    writer = BufferedRelationWriter(client, max_rows=3, flush_interval=3600)
+    rows_per_feedback = 4
+
+    def write_chunk(feedback_ids):
+        with writer.group():
+            for feedback_id in feedback_ids:
+                if feedback_id == failing_chunk * chunk_size + 1:
+                    raise RuntimeError("模拟写入阶段失败")
+                for entity_number in range(2):
+                    writer.add('feedback_entity_relation', {
+                        'feedback_id': feedback_id, 'entity_id': f"entity-{entity_number}", 'match_confidence': 0.9
+                    })
+                    writer.add('entity_precipitation_log', {
+                        'feedback_id': feedback_id, 'entity_id': f"entity-{entity_number}", 'coze_confidence': 0.9
+                    })
+        return len(feedback_ids)
+
+    chunks = [list(range(start, start + chunk_size)) for start in range(0, feedback_count, chunk_size)]
+    pipeline = StagedPipeline([PipelineStage('write', jittered(write_chunk), workers=3)], queue_size=1)
+
+    # 与process_feedback_batch相同：批次结束时刷新，失败时丢弃缓冲行
+    error = None
+    try:
+        pipeline.run(chunks)
+        writer.flush()
+    except Exception as e:
+        writer.discard()
+        error = e
+    assert isinstance(error, RuntimeError), f"批次未按失败结束: {error}"
+    assert client.written, "批次失败前没有发生自动刷新，测试未覆盖该场景"
+
+    written_per_feedback = {}
+    for _, row in client.written:
+        written_per_feedback[row[0]] = written_per_feedback.get(row[0], 0) + 1
+    partial = {feedback_id: count for feedback_id, count in written_per_feedback.items() if count != rows_per_feedback}
+    assert not partial, f"已写入的反馈缺少部分打标结果: {partial}"
+    assert not set(chunks[failing_chunk]) & set(written_per_feedback), "失败数据块的打标结果被写入"
+    assert writer.pending == 0, f"批次失败后缓冲区未清空: {writer.pending}"
+    logger.info(f"批次失败时打标结果完整: 自动刷新写入 {len(written_per_feedback)} 条反馈的全部打标结果")
+
+
+def cluster_whole_batch(vectors, similarity_threshold):
+    """
+    对整批向量一次性贪心聚类（增量聚类之前的实现），作为对照
+
+    Args:
+        vectors (list): 向量列表，None表示无向量（各自成簇）
+        similarity_threshold (float): 与簇中心的余弦相似度下限
+
+    Returns:
+        set: 簇成员位置的frozenset集合
+    """
+    clusters = set()
+    positions = [i for i, vector in enumerate(vectors) if vector is not None]
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            clusters.add(frozenset([i]))
+    if positions:
+        matrix = np.vstack([vectors[i] / np.linalg.norm(vectors[i]) for i in positions])
+        similarities = matrix @ matrix.T
+        assigned = np.zeros(len(positions), dtype=bool)
+        for i in range(len(positions)):
+            if assigned[i]:
+                continue
+            members = np.flatnonzero(~assigned & (similarities[i] >= similarity_threshold))
+            assigned[members] = True
+            clusters.add(frozenset(positions[m] for m in members))
+    return clusters
+
+
+def test_incremental_clustering(feedback_count=600, seed=3):
+    """
+    低置信度反馈按到达顺序增量聚类，与整批贪心聚类的簇划分一致
+    """
+    logger.info("开始测试低置信度反馈增量聚类")
+    from auto_tag_feedback_loop import COZE_CLUSTER_SIMILARITY, EMBEDDING_DIMENSION, LowConfidenceClusterer
+
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(40, EMBEDDING_DIMENSION))
+    vectors = []
+    for _ in range(feedback_count):
+        if rng.random() < 0.05:
+            vectors.append(None)
+            continue
+        # 同一主题加小噪声，产生近似重复的反馈
+        vector = topics[rng.integers(len(topics))] + rng.normal(scale=0.12, size=EMBEDDING_DIMENSION)
+        vectors.append(vector.astype(np.float32))
+
+    clusterer = LowConfidenceClusterer(similarity_threshold=COZE_CLUSTER_SIMILARITY, enabled=True)
+    members = {}
+    for position, vector in enumerate(vectors):
+        cluster_id, _ = clusterer.assign(vector)
+        members.setdefault(cluster_id, set()).add(position)
+    actual = {frozenset(positions) for positions in members.values()}
+    expected = cluster_whole_batch(vectors, COZE_CLUSTER_SIMILARITY)
+
+    assert actual == expected and clusterer.cluster_count == len(expected), \
+        f"增量聚类与整批聚类不一致: {len(actual)} 簇 / {len(expected)} 簇"
+    logger.info(f"增量聚类与整批聚类一致: {feedback_count} 条反馈归为 {len(expected)} 簇")
+
+
+def main():
+    """
+    主函数
+    """
+    logger.info("===== 打标流水线测试开始 =====")
+
+    results = [run_check(check) for check in (
+        test_pipeline_order,
+        test_pipeline_failed_items,
+        test_pipeline_source_error,
+        test_pipeline_worker_death_parallel,
+        test_pipeline_worker_death_ordered,
+        test_pipeline_profile,
+        test_relation_writer_batch_failure,
+        test_incremental_clustering,
+    )]
+
+    logger.info(f"===== 打标流水线测试结束: {sum(results)}/{len(results)} 通过 =====")
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
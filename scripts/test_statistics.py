@@ -9,9 +9,13 @@
 import os
 import sys
 import json
+import random
+import time
 import logging
 from datetime import datetime, timedelta
+from contextlib import contextmanager
 from dotenv import load_dotenv
+import pandas as pd
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -27,7 +31,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # 导入需要测试的函数
-from auto_analysis import generate_statistics, seekdb_client
+import auto_analysis
+from auto_analysis import build_statistics_df, generate_statistics
+from stat_aggregation import EntityCombinationAggregator, iter_feedback_frames
 
 def test_statistics_generation():
     """
@@ -178,12 +184,269 @@ def test_coze_input_format():
         traceback.print_exc()
 
 
+def make_synthetic_relations(feedback_count=50000, seed=42):
+    """
+    生成按feedback_id排序的模拟关系行（feedback_id, entity_type, entity_value）
+    
+    Args:
+        feedback_count (int): 反馈数
+        seed (int): 随机种子
+        
+    Returns:
+        list: 行字典列表
+    """
+    rng = random.Random(seed)
+    entity_values = {
+        '业务类型': ['报障', '咨询', '投诉'],
+        '产品大类': ['净水器', '空气净化器'],
+        '具体产品': ['益之源净水器', '净水器X1', '净化器A3'],
+        '问题现象': ['滤芯换完报警', '漏水', '噪音大', '无法开机'],
+        '问题特征': ['新机', '保修期外']
+    }
+    rows = []
+    for index in range(feedback_count):
+        feedback_id = f"fb-{index:08d}"
+        for entity_type in rng.sample(list(entity_values), rng.randint(1, 4)):
+            rows.append({'feedback_id': feedback_id, 'entity_type': entity_type,
+                         'entity_value': rng.choice(entity_values[entity_type])})
+        # 少量无效或重复类型的行
+        if rng.random() < 0.01:
+            rows.append({'feedback_id': feedback_id, 'entity_type': '问题现象', 'entity_value': ''})
+        if rng.random() < 0.01:
+            rows.append({'feedback_id': feedback_id, 'entity_type': '业务类型', 'entity_value': '咨询'})
+    return rows
+
+
+def to_json_rows(rows):
+    """
+    将展开的关系行按反馈合并为JSON_ARRAYAGG格式的行（原统计SQL的返回格式）
+    
+    Args:
+        rows (list): 按feedback_id排序的关系行
+        
+    Returns:
+        list: {'feedback_id', 'entity_combinations'} 行列表
+    """
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row['feedback_id'], []).append(
+            {'entity_type': row['entity_type'], 'entity_value': row['entity_value']}
+        )
+    return [{'feedback_id': feedback_id, 'entity_combinations': json.dumps(entities, ensure_ascii=False)}
+            for feedback_id, entities in grouped.items()]
+
+
+def aggregate_with_dicts(json_rows):
+    """
+    逐行解析JSON并用字典聚合（列式聚合之前的实现），作为对照
+    
+    Args:
+        json_rows (list): JSON_ARRAYAGG格式的行
+        
+    Returns:
+        tuple: ({组合键: 反馈数}, 反馈总数)
+    """
+    combination_counts = {}
+    for row in json_rows:
+        entity_map = {}
+        for entity in json.loads(row['entity_combinations']):
+            if entity.get('entity_type') and entity.get('entity_value'):
+                entity_map[entity['entity_type']] = entity['entity_value']
+        if entity_map:
+            combination_key = str(sorted(entity_map.items()))
+            combination_counts[combination_key] = combination_counts.get(combination_key, 0) + 1
+    return combination_counts, len(json_rows)
+
+
+def test_vectorized_aggregation(chunk_size=7919):
+    """
+    对比列式聚合与逐行字典聚合的结果与耗时（模拟数据，不依赖数据库）
+    """
+    logger.info("开始测试列式实体组合聚合")
+    rows = make_synthetic_relations()
+    json_rows = to_json_rows(rows)
+    
+    start = time.perf_counter()
+    expected_counts, expected_total = aggregate_with_dicts(json_rows)
+    dict_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    aggregator = EntityCombinationAggregator()
+    row_chunks = (rows[offset:offset + chunk_size] for offset in range(0, len(rows), chunk_size))
+    for frame in iter_feedback_frames(row_chunks):
+        aggregator.add(frame)
+    stat_df = build_statistics_df(aggregator.combinations(), aggregator.total_feedbacks)
+    vectorized_seconds = time.perf_counter() - start
+    
+    actual_counts = {
+        str(sorted((entity['entity_type'], entity['entity_value']) for entity in row['entities'])): row['feedback_count']
+        for _, row in stat_df.iterrows()
+    }
+    assert aggregator.total_feedbacks == expected_total and actual_counts == expected_counts, \
+        (f"列式聚合结果不一致: 总数 {aggregator.total_feedbacks} / {expected_total}, "
+         f"组合数 {len(actual_counts)} / {len(expected_counts)}")
+    assert validate_statistics_format(stat_df), "列式聚合的统计结果格式错误"
+    
+    logger.info(f"列式聚合结果一致: {len(rows)} 行, {expected_total} 条反馈, {len(expected_counts)} 个组合; "
+                f"逐行JSON解析+字典 {dict_seconds:.3f}s, 列式 {vectorized_seconds:.3f}s")
+
+
+class FakeStatisticsClient:
+    """
+    只实现统计相关语句的内存数据库客户端（按SQL特征分派），用于对比增量统计与全量重算
+    关系行: feedback_id, entity_type, entity_value, feedback_time（反馈创建时间）, relation_time（打标时间）
+    """
+    
+    def __init__(self):
+        self.relations = []
+        self.now = datetime(2026, 1, 1)
+        self.watermark = None
+        self.feedback_state = {}
+        self.combination_state = {}
+    
+    def query_sql(self, sql, params=None):
+        if 'FROM feedback_stat_watermark' in sql:
+            return pd.DataFrame([{'watermark_time': self.watermark}] if self.watermark else [])
+        if 'AS upper_time' in sql:
+            return pd.DataFrame([{'upper_time': self.now - timedelta(seconds=params[0])}])
+        if 'FROM feedback_stat_feedback_state' in sql:
+            total = sum(1 for state in self.feedback_state.values() if state['stat_date'] == params[0])
+            return pd.DataFrame([{'total': total}])
+        if 'FROM feedback_stat_combination_state' in sql:
+            return pd.DataFrame([
+                {'entities': entities, 'feedback_count': count}
+                for (stat_date, _), (entities, count) in self.combination_state.items()
+                if stat_date == params[0] and count > 0
+            ])
+        raise AssertionError(f"未模拟的查询: {sql}")
+    
+    def stream_rows(self, sql, params=None, chunk_size=10000):
+        if 'JSON_ARRAYAGG' in sql:
+            lower, upper = params
+            changed = {r['feedback_id'] for r in self.relations if lower <= r['relation_time'].strftime('%Y-%m-%d %H:%M:%S') < upper}
+            grouped = {}
+            for r in self.relations:
+                if r['feedback_id'] in changed:
+                    grouped.setdefault(r['feedback_id'], []).append(r)
+            rows = [{
+                'feedback_id': feedback_id,
+                'feedback_time': relations[0]['feedback_time'],
+                'entity_combinations': json.dumps([{'entity_type': r['entity_type'], 'entity_value': r['entity_value']}
+                                                   for r in relations], ensure_ascii=False)
+            } for feedback_id, relations in grouped.items()]
+        else:
+            day_start, day_end = params
+            rows = sorted(
+                ({'feedback_id': r['feedback_id'], 'entity_type': r['entity_type'], 'entity_value': r['entity_value']}
+                 for r in self.relations
+                 if day_start <= r['feedback_time'].strftime('%Y-%m-%d %H:%M:%S') < day_end),
+                key=lambda row: row['feedback_id']
+            )
+        for offset in range(0, len(rows), chunk_size):
+            yield rows[offset:offset + chunk_size]
+    
+    def execute_sql(self, sql, params=None, idempotent=False):
+        assert 'INTO feedback_stat_watermark' in sql, sql
+        self.watermark = params[1]
+        return 1
+    
+    @contextmanager
+    def transaction(self):
+        yield FakeStatisticsCursor(self)
+
+
+class FakeStatisticsCursor:
+    """FakeStatisticsClient事务内的游标"""
+    
+    def __init__(self, client):
+        self.client = client
+        self._rows = []
+    
+    def execute(self, sql, params=None):
+        assert 'FROM feedback_stat_feedback_state' in sql, sql
+        self._rows = [dict(self.client.feedback_state[feedback_id]) for feedback_id in params
+                      if feedback_id in self.client.feedback_state]
+    
+    def fetchall(self):
+        return self._rows
+    
+    def executemany(self, sql, rows):
+        if 'INTO feedback_stat_feedback_state' in sql:
+            for feedback_id, stat_date, combination_key in rows:
+                self.client.feedback_state[feedback_id] = {
+                    'feedback_id': feedback_id, 'stat_date': stat_date, 'combination_key': combination_key
+                }
+        elif 'INTO feedback_stat_combination_state' in sql:
+            for stat_date, combination_key, entities, delta in rows:
+                old_entities, count = self.client.combination_state.get((stat_date, combination_key), (entities, 0))
+                self.client.combination_state[(stat_date, combination_key)] = (old_entities, count + delta)
+        else:
+            raise AssertionError(f"未模拟的写入: {sql}")
+
+
+def statistics_signature(stat_df):
+    """统计结果的可比较形式：{组合: (反馈数, 占比)}"""
+    if stat_df.empty:
+        return {}
+    return {
+        str(sorted((entity['entity_type'], entity['entity_value']) for entity in row['entities'])):
+            (row['feedback_count'], row['ratio'])
+        for _, row in stat_df.iterrows()
+    }
+
+
+def test_incremental_statistics(feedback_count=3000, waves=4, seed=7):
+    """
+    分多轮写入打标关系（含对已打标反馈的重新打标），每轮后增量刷新，
+    对比增量统计与全量重算在每个日期上的结果（模拟数据，不依赖数据库）
+    """
+    logger.info("开始测试增量统计与全量重算一致")
+    rng = random.Random(seed)
+    client = FakeStatisticsClient()
+    previous_client = auto_analysis.db_client
+    auto_analysis.db_client = client
+    
+    try:
+        dates = ['2025-12-29', '2025-12-30', '2025-12-31']
+        relations = make_synthetic_relations(feedback_count, seed=seed)
+        feedback_times = {
+            feedback_id: datetime.strptime(rng.choice(dates), '%Y-%m-%d') + timedelta(seconds=rng.randrange(86400))
+            for feedback_id in {row['feedback_id'] for row in relations}
+        }
+        for wave in range(waves):
+            # 每轮写入一部分新关系，并给部分已打标反馈追加关系（组合变化）
+            new_rows = relations[wave::waves]
+            tagged = [feedback_id for feedback_id in feedback_times if client.feedback_state.get(feedback_id)]
+            for feedback_id in rng.sample(tagged, min(len(tagged), 50)):
+                new_rows.append({'feedback_id': feedback_id, 'entity_type': '问题特征', 'entity_value': f"复现{wave}"})
+            for row in new_rows:
+                client.relations.append(dict(row, feedback_time=feedback_times[row['feedback_id']],
+                                             relation_time=client.now))
+            client.now += timedelta(minutes=10)
+            auto_analysis.refresh_statistics_state()
+        
+        for stat_date in dates:
+            expected = statistics_signature(auto_analysis.compute_statistics_full(stat_date))
+            actual = statistics_signature(auto_analysis.generate_statistics_incremental(stat_date))
+            mismatched = [key for key in set(actual) | set(expected) if actual.get(key) != expected.get(key)]
+            assert not mismatched, f"{stat_date} 增量统计与全量重算不一致: {len(mismatched)} 个组合, 如 {mismatched[:3]}"
+            logger.info(f"{stat_date} 增量统计与全量重算一致: {len(expected)} 个组合")
+    finally:
+        auto_analysis.db_client = previous_client
+
+
 def main():
     """
     主函数
     """
     logger.info("===== 统计功能测试开始 =====")
     
+    # 测试列式聚合与逐行聚合结果一致
+    test_vectorized_aggregation()
+    
+    # 测试增量统计与全量重算结果一致
+    test_incremental_statistics()
+    
     # 测试统计结果生成
     test_statistics_generation()
     
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+向量编解码
+- 应用内部统一使用float32数组传递向量
+- 入库时同时写二进制列（紧凑的float32/float16字节串），读取时用np.frombuffer零拷贝解码
+- SeekDB的VECTOR列只接受文本字面量，仅在SQL边界处生成 "[x1,x2,...]" 文本
+"""
+
+import numpy as np
+
+SUPPORTED_DTYPES = {
+    'float32': np.float32,
+    'float16': np.float16,
+}
+
+
+def encode_vector(vector, dtype='float32'):
+    """
+    将向量编码为紧凑字节串
+
+    Args:
+        vector (ndarray): 向量
+        dtype (str): 存储精度，float32或float16
+
+    Returns:
+        bytes: 小端序字节串
+    """
+    return np.asarray(vector, dtype=np.dtype(SUPPORTED_DTYPES[dtype]).newbyteorder('<')).tobytes()
+
+
+def decode_vector(buffer, dimension):
+    """
+    解码紧凑字节串，按长度识别float32/float16
+    float32直接返回缓冲区上的只读视图（零拷贝），float16需转换为float32
+
+    Args:
+        buffer (bytes): 字节串
+        dimension (int): 向量维度
+
+    Returns:
+        ndarray: float32向量，长度不匹配时返回None
+    """
+    if len(buffer) == dimension * 4:
+        return np.frombuffer(buffer, dtype='<f4')
+    if len(buffer) == dimension * 2:
+        return np.frombuffer(buffer, dtype='<f2').astype(np.float32)
+    return None
+
+
+def to_sql_vector(vector):
+    """
+    生成SeekDB VECTOR列的文本字面量（仅在SQL边界使用）
+    数组级转换，按float32最短表示格式化，避免逐元素的Python浮点格式化
+
+    Args:
+        vector (ndarray): 向量
+
+    Returns:
+        str: "[x1,x2,...]" 格式文本
+    """
+    return '[' + ','.join(np.asarray(vector, dtype=np.float32).astype(str)) + ']'
+
+
+def parse_sql_vector(text):
+    """
+    解析VECTOR列返回的文本（兼容 "[x1,...]" 与历史的 "x1,..." 格式）
+
+    Args:
+        text (str): 向量文本
+
+    Returns:
+        ndarray: float32向量，文本为空时返回None
+    """
+    text = text.strip().strip('[]')
+    if not text:
+        return None
+    return np.fromstring(text, dtype=np.float32, sep=',')
+
+
+def to_vector(value, dimension=None):
+    """
+    将任意来源的向量值统一为float32数组
+
+    Args:
+        value: ndarray、二进制字节串、向量文本或None
+        dimension (int): 向量维度，用于识别二进制字节串
+
+    Returns:
+        ndarray: float32向量，无法识别或为空时返回None
+    """
+    if value is None:
+        return None
+    if isinstance(value, np.ndarray):
+        return value if value.dtype == np.float32 else value.astype(np.float32)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value) if isinstance(value, memoryview) else value
+        is_text = value[:1] == b'[' and value[-1:] == b']'
+        if dimension is not None and not is_text:
+            vector = decode_vector(value, dimension)
+            if vector is not None:
+                return vector
+        value = value.decode('utf-8')
+    if isinstance(value, str):
+        return parse_sql_vector(value)
+    if isinstance(value, float):
+        # pandas中的缺失值为NaN
+        return None
+    return np.asarray(value, dtype=np.float32)
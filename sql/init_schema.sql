@@ -10,8 +10,11 @@ CREATE TABLE IF NOT EXISTS customer_feedback (
   feedback_text TEXT NOT NULL,
   user_id VARCHAR(64),
   create_time DATETIME DEFAULT NOW(),
-  feedback_vector VECTOR(384)
+  feedback_vector VECTOR(384),
+  -- 向量的紧凑二进制副本（小端float32/float16），应用层读取时零拷贝解码
+  feedback_vector_bin VARBINARY(1536)
 );
+-- 已有部署升级: ALTER TABLE customer_feedback ADD COLUMN feedback_vector_bin VARBINARY(1536);
 
 -- 注释掉向量索引，SeekDB/OceanBase不支持直接在向量列上创建索引
 -- CREATE INDEX IF NOT EXISTS idx_feedback_vector ON customer_feedback (feedback_vector);
@@ -19,6 +22,9 @@ CREATE TABLE IF NOT EXISTS customer_feedback (
 -- 创建文本索引（用于关键词匹配）
 CREATE FULLTEXT INDEX IF NOT EXISTS idx_feedback_text ON customer_feedback (feedback_text);
 
+-- 创建时间索引（用于积压清理的键集分页和按时间范围统计）
+CREATE INDEX IF NOT EXISTS idx_feedback_create_time ON customer_feedback (create_time, feedback_id);
+
 -- 2. 动态实体类型表（对应架构图中的“标签类型”）
 CREATE TABLE IF NOT EXISTS dynamic_entity_type (
   type_id VARCHAR(36) PRIMARY KEY DEFAULT (UUID()),
@@ -32,11 +38,14 @@ CREATE TABLE IF NOT EXISTS entity_vector_lib (
   type_id VARCHAR(36),
   entity_value VARCHAR(128) NOT NULL,
   entity_vector VECTOR(384),
+  -- 向量的紧凑二进制副本，加载实体索引时使用
+  entity_vector_bin VARBINARY(1536),
   confidence FLOAT DEFAULT 0.95,
   create_time DATETIME DEFAULT NOW(),
   FOREIGN KEY (type_id) REFERENCES dynamic_entity_type(type_id),
   UNIQUE (type_id, entity_value)
 );
+-- 已有部署升级: ALTER TABLE entity_vector_lib ADD COLUMN entity_vector_bin VARBINARY(1536);
 
 -- 注释掉向量索引，SeekDB/OceanBase不支持直接在向量列上创建索引
 -- CREATE INDEX IF NOT EXISTS idx_entity_vector ON entity_vector_lib (entity_vector);
@@ -44,6 +53,9 @@ CREATE TABLE IF NOT EXISTS entity_vector_lib (
 -- 创建文本索引
 CREATE FULLTEXT INDEX IF NOT EXISTS idx_entity_value ON entity_vector_lib (entity_value);
 
+-- 创建时间索引（用于按日统计新沉淀实体数）
+CREATE INDEX IF NOT EXISTS idx_entity_create_time ON entity_vector_lib (create_time);
+
 -- 4. 反馈-实体关联表（对应架构图中的“反馈明细+打标结果”）
 CREATE TABLE IF NOT EXISTS feedback_entity_relation (
   relation_id VARCHAR(36) PRIMARY KEY DEFAULT (UUID()),
@@ -58,6 +70,8 @@ CREATE TABLE IF NOT EXISTS feedback_entity_relation (
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_feedback_entity ON feedback_entity_relation (feedback_id);
 CREATE INDEX IF NOT EXISTS idx_entity_feedback ON feedback_entity_relation (entity_id);
+-- 创建时间索引（用于增量统计按打标时间扫描新增关系）
+CREATE INDEX IF NOT EXISTS idx_relation_create_time ON feedback_entity_relation (create_time);
 
 -- 5. 实体沉淀日志表（对应架构图中的“重新打标明细”）
 CREATE TABLE IF NOT EXISTS entity_precipitation_log (
@@ -73,6 +87,17 @@ CREATE TABLE IF NOT EXISTS entity_precipitation_log (
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_precipitation_feedback ON entity_precipitation_log (feedback_id);
 
+-- 5.1 打标认领租约表（多工作进程并行打标时认领待打标反馈）
+CREATE TABLE IF NOT EXISTS feedback_claim_lease (
+  feedback_id VARCHAR(36) PRIMARY KEY,
+  worker_id VARCHAR(128) NOT NULL,
+  lease_expire_time DATETIME NOT NULL,
+  create_time DATETIME DEFAULT NOW()
+);
+
+-- 创建索引
+CREATE INDEX IF NOT EXISTS idx_lease_worker ON feedback_claim_lease (worker_id, lease_expire_time);
+
 -- 6. 统计结果表（对应架构图中的“统计结果”）
 CREATE TABLE IF NOT EXISTS feedback_stat (
   stat_id VARCHAR(36) PRIMARY KEY DEFAULT (UUID()),
@@ -99,6 +124,59 @@ CREATE TABLE IF NOT EXISTS ai_analysis_result (
 -- 创建索引
 CREATE INDEX IF NOT EXISTS idx_analysis_date ON ai_analysis_result (stat_date);
 
+-- 8. 增量统计状态表（STAT_INCREMENTAL_ENABLED=true 时使用）
+-- 每条反馈当前计入的统计日期与实体组合（combination_key为空表示无有效实体组合，仍计入当天总数）
+CREATE TABLE IF NOT EXISTS feedback_stat_feedback_state (
+  feedback_id VARCHAR(36) PRIMARY KEY,
+  stat_date DATE NOT NULL,
+  combination_key CHAR(40),
+  update_time DATETIME DEFAULT NOW() ON UPDATE NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_feedback_state_date ON feedback_stat_feedback_state (stat_date);
+
+-- 每天每个实体组合的反馈数
+CREATE TABLE IF NOT EXISTS feedback_stat_combination_state (
+  stat_date DATE NOT NULL,
+  combination_key CHAR(40) NOT NULL,
+  entities JSON NOT NULL,
+  feedback_count INT NOT NULL DEFAULT 0,
+  update_time DATETIME DEFAULT NOW() ON UPDATE NOW(),
+  PRIMARY KEY (stat_date, combination_key)
+);
+
+-- 增量刷新水位（已处理到的打标关系创建时间）
+CREATE TABLE IF NOT EXISTS feedback_stat_watermark (
+  watermark_name VARCHAR(64) PRIMARY KEY,
+  watermark_time DATETIME NOT NULL,
+  update_time DATETIME DEFAULT NOW()
+);
+
+-- 9. 每日系统运行指标表（分析脚本按日期覆盖写入，看板与趋势查询直接读取）
+CREATE TABLE IF NOT EXISTS daily_system_metrics (
+  stat_date DATE PRIMARY KEY,
+  total_feedback INT NOT NULL,
+  tagged_feedback INT NOT NULL,
+  tag_rate FLOAT,
+  coze_call_count INT NOT NULL,
+  coze_call_rate FLOAT,
+  new_entity_count INT NOT NULL,
+  update_time DATETIME DEFAULT NOW()
+);
+
+-- 10. 实体趋势汇总立方（粒度 × 时间桶 × 实体类型 × 实体值 的反馈数，周/月由天粒度上卷）
+CREATE TABLE IF NOT EXISTS entity_stat_rollup (
+  grain VARCHAR(8) NOT NULL,
+  bucket_start DATETIME NOT NULL,
+  entity_type VARCHAR(64) NOT NULL,
+  entity_value VARCHAR(128) NOT NULL,
+  feedback_count INT NOT NULL,
+  PRIMARY KEY (grain, bucket_start, entity_type, entity_value)
+);
+
+-- 创建索引（按实体类型查询时间区间内的趋势与TopN）
+CREATE INDEX IF NOT EXISTS idx_rollup_type_time ON entity_stat_rollup (grain, entity_type, bucket_start);
+
 -- 插入示例数据（可选）
 INSERT INTO dynamic_entity_type (type_name) VALUES 
 ('业务类型'),